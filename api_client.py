@@ -0,0 +1,138 @@
+import asyncio
+import os
+import random
+import time
+from typing import Dict, Optional
+
+DEFAULT_API_URL = "https://gigaverse.io/api"
+# Worth retrying: rate limiting and server-side failures
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+def backoff_delay(attempt: int, base: float = 0.5, cap: float = 30.0) -> float:
+    """Exponential backoff with full jitter for the given retry attempt (1, 2, ...)"""
+    return random.uniform(0, min(cap, base * 2 ** (attempt - 1)))
+
+
+class GigaverseClient:
+    """
+    HTTP client for the Gigaverse API.
+
+    All requests share one requests.Session, so the TLS connection is kept
+    alive and pooled between polls instead of being set up every time.
+    Connection errors, timeouts, 429 and 5xx responses are retried with
+    exponential backoff and jitter; once the retries run out the last
+    response is returned (or the last error raised) for the caller to handle.
+
+    get() is for synchronous callers; aget() runs the same request on a
+    worker thread and waits between retries with asyncio.sleep, so it can be
+    awaited from an asyncio polling loop.
+
+    requests is imported on construction rather than with the module, so
+    replaying offline never pays for it.
+    """
+
+    def __init__(self,
+                 base_url: Optional[str] = None,
+                 headers: Optional[Dict] = None,
+                 timeout: float = 10.0,
+                 max_retries: int = 3,
+                 backoff_base: float = 0.5,
+                 backoff_cap: float = 30.0,
+                 pool_size: int = 4):
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.base_url = (base_url or os.getenv("GIGAVERSE_API_URL") or DEFAULT_API_URL).rstrip("/")
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.session = requests.Session()
+        self.session.headers.update(headers or {})
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.transient_errors = (requests.ConnectionError, requests.Timeout)
+        self.requests = 0
+        self.retries = 0
+
+    def url(self, path: str) -> str:
+        return f"{self.base_url}/{path.lstrip('/')}"
+
+    def _request(self, path: str, headers: Optional[Dict] = None) -> "requests.Response":
+        self.requests += 1
+        return self.session.get(self.url(path), headers=headers, timeout=self.timeout)
+
+    def _retry_delay(self, attempt: int, response: Optional["requests.Response"]) -> Optional[float]:
+        """Seconds to wait before retrying, or None if the result should be returned as is"""
+        if response is not None and response.status_code not in RETRY_STATUSES:
+            return None
+        if attempt > self.max_retries:
+            return None
+        self.retries += 1
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), self.backoff_cap)
+        return backoff_delay(attempt, self.backoff_base, self.backoff_cap)
+
+    def get(self, path: str, headers: Optional[Dict] = None) -> "requests.Response":
+        """
+        GET an API path (e.g. "game/dungeon/state"), retrying transient failures
+
+        `headers` are added to the session's for this request only, e.g. the
+        bearer token of one of several accounts sharing the client.
+        """
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                response = self._request(path, headers)
+            except self.transient_errors:
+                delay = self._retry_delay(attempt, None)
+                if delay is None:
+                    raise
+            else:
+                delay = self._retry_delay(attempt, response)
+                if delay is None:
+                    return response
+            time.sleep(delay)
+
+    async def aget(self, path: str, headers: Optional[Dict] = None) -> "requests.Response":
+        """Awaitable get(); the blocking request runs on a worker thread"""
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                response = await asyncio.to_thread(self._request, path, headers)
+            except self.transient_errors:
+                delay = self._retry_delay(attempt, None)
+                if delay is None:
+                    raise
+            else:
+                delay = self._retry_delay(attempt, response)
+                if delay is None:
+                    return response
+            await asyncio.sleep(delay)
+
+    def close(self):
+        self.session.close()
+
+
+class AdaptiveInterval:
+    """
+    Poll interval that speeds up while a fight is moving and backs off when
+    it isn't: a changed state resets it to `fast`, and every unchanged poll
+    multiplies it by `growth` up to `slow`.
+    """
+
+    def __init__(self, fast: float = 0.5, slow: float = 5.0, growth: float = 1.5):
+        self.fast = fast
+        self.slow = slow
+        self.growth = growth
+        self.current = fast
+
+    def update(self, changed: bool) -> float:
+        """Record whether the last poll saw a new state; returns the next delay"""
+        self.current = self.fast if changed else min(self.slow, self.current * self.growth)
+        return self.current
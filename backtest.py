@@ -0,0 +1,234 @@
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Optional
+
+from fight_solver import (ExpectimaxSolver, build_damage_table, encode_fight_state, enemy_move_distribution,
+                          enemy_odds_table)
+from gigaverse_calculator import API_MOVES, MOVES, FightState, GigaverseCalculator
+from history_journal import DEFAULT_JOURNAL_DIR, iter_history, state_signature
+
+# Per-process state set up by _init_worker
+_worker = {}
+
+
+def cases_from_history(records: Iterable[Dict]) -> List[Dict]:
+    """
+    Turn polled snapshots into (state, what the player did next) cases
+
+    Repeated polls of the same state are collapsed. The move played from a
+    state is the lastMove of the next distinct snapshot in the same run, and
+    the observed damage is the HP difference between the two. When the next
+    snapshot is already the following room, the enemy is taken to have died
+    and the player's HP change (healed between rooms) is not used.
+    """
+    cases = []
+    previous = None
+    previous_signature = None
+    for record in records:
+        signature = state_signature(record)
+        if signature == previous_signature:
+            continue
+        if previous is not None and record.get("enemy_id") == previous.get("enemy_id"):
+            actual = API_MOVES.get(record.get("last_player_move"))
+            if actual:
+                same_room = signature[1] == previous_signature[1]
+                cases.append({
+                    "state": previous,
+                    "actual_move": actual,
+                    "enemy_move": None,
+                    "observed_dealt": (previous["enemy_health"] - record["enemy_health"]
+                                       if same_room else previous["enemy_health"]),
+                    "observed_taken": previous["player_health"] - record["player_health"] if same_room else None,
+                })
+        previous, previous_signature = record, signature
+    return cases
+
+
+def cases_from_enhanced(records: Iterable[Dict]) -> List[Dict]:
+    """Cases from game_history_enhanced.json, whose action_history records real outcomes"""
+    skill_moves = {"sword": "Sword", "shield": "Shield", "spell": "Spell"}
+    cases = []
+    for record in records:
+        for action in record.get("action_history", []):
+            if action.get("round") != record.get("round_number"):
+                continue  # only the round the snapshot was taken before
+            player_action = action.get("player_action") or {}
+            enemy_action = action.get("enemy_action") or {}
+            actual = skill_moves.get(str(player_action.get("skill", "")).split("_")[0])
+            if not actual:
+                continue
+            cases.append({
+                "state": record,
+                "actual_move": actual,
+                "enemy_move": skill_moves.get(str(enemy_action.get("skill", "")).split("_")[0]),
+                "observed_dealt": player_action.get("damage_dealt"),
+                "observed_taken": enemy_action.get("damage_dealt"),
+            })
+    return cases
+
+
+def _init_worker(scorer: str, policy_tables: Optional[str], search_budget: float, enemy_model=None):
+    calculator = GigaverseCalculator(enemies={"entities": []})
+    # Score with the same learned enemy odds as the live loop
+    calculator.enemy_model = enemy_model
+    calculator.solver = ExpectimaxSolver(calculator, time_budget=search_budget)
+    if policy_tables:
+        calculator.use_policy_tables(policy_tables)
+    _worker["calculator"] = calculator
+    _worker["scorer"] = scorer
+
+
+def _score(calculator: GigaverseCalculator, scorer: str, fight_state: FightState) -> str:
+    if scorer == "search":
+        # Tables stand in for the search only, as in calculate_best_move
+        table_move = calculator.policy_tables.lookup(fight_state) if calculator.policy_tables else None
+        if table_move:
+            return table_move[0]
+        move_values = calculator.search_move_values(fight_state)
+    else:
+        move_values = {move: calculator._calculate_move_value(move, fight_state) for move in MOVES}
+    return max(move_values.items(), key=lambda x: x[1])[0]
+
+
+def _replay_shard(cases: List[Dict]) -> List[Dict]:
+    """Score every case in a shard; runs inside a pool worker"""
+    calculator = _worker["calculator"]
+    scorer = _worker["scorer"]
+    results = []
+    damage_tables = {}
+    for case in cases:
+        fight_state = FightState.from_dict(case["state"])
+        if not fight_state.enemy_stats:
+            continue
+        predicted = _score(calculator, scorer, fight_state)
+
+        # Damage the rules expect for the move that was actually played
+        stats_key = (json.dumps(case["state"]["player_skills"], sort_keys=True),
+                     tuple(fight_state.enemy_stats.move_pattern))
+        damage = damage_tables.get(stats_key)
+        if damage is None:
+            damage = damage_tables[stats_key] = build_damage_table(
+                calculator, fight_state.player_skills, fight_state.enemy_stats)
+        encoded = encode_fight_state(fight_state)
+        actual = MOVES.index(case["actual_move"])
+        if case["enemy_move"]:
+            odds = [(MOVES.index(case["enemy_move"]), 1.0)]
+        else:
+            odds = enemy_move_distribution(enemy_odds_table(calculator, fight_state.enemy_stats)[encoded[7]],
+                                           encoded[4], encoded[5])
+        expected_dealt = sum(p * damage[(actual, e, encoded[6], encoded[7])][0] for e, p in odds)
+        expected_taken = sum(p * damage[(actual, e, encoded[6], encoded[7])][1] for e, p in odds)
+
+        results.append({
+            "enemy": fight_state.enemy_stats.name,
+            "agree": predicted == case["actual_move"],
+            "dealt_error": (None if case["observed_dealt"] is None
+                            else abs(expected_dealt - case["observed_dealt"])),
+            "taken_error": (None if case["observed_taken"] is None
+                            else abs(expected_taken - case["observed_taken"])),
+        })
+    return results
+
+
+def backtest(cases: List[Dict],
+             scorer: str = "heuristic",
+             policy_tables: Optional[str] = None,
+             search_budget: float = 0.25,
+             workers: Optional[int] = None,
+             shard_size: int = 256,
+             enemy_model=None) -> Dict:
+    """
+    Replay cases through the move scorer across a process pool
+
+    enemy_model is the learned EnemyModel the live loop would score with;
+    without one, enemies are scored from their stats alone.
+
+    Returns a report with per-enemy agreement rates, mean absolute error of
+    predicted vs observed damage dealt/taken, and throughput.
+    """
+    started = time.perf_counter()
+    shards = [cases[i:i + shard_size] for i in range(0, len(cases), shard_size)]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(scorer, policy_tables, search_budget, enemy_model)) as pool:
+        results = [result for shard in pool.map(_replay_shard, shards) for result in shard]
+    elapsed = time.perf_counter() - started
+
+    def summarise(rows: List[Dict]) -> Dict:
+        dealt = [r["dealt_error"] for r in rows if r["dealt_error"] is not None]
+        taken = [r["taken_error"] for r in rows if r["taken_error"] is not None]
+        return {
+            "cases": len(rows),
+            "agreement": sum(r["agree"] for r in rows) / len(rows) if rows else 0.0,
+            "dealt_mae": sum(dealt) / len(dealt) if dealt else None,
+            "taken_mae": sum(taken) / len(taken) if taken else None,
+        }
+
+    by_enemy: Dict[str, List[Dict]] = {}
+    for result in results:
+        by_enemy.setdefault(result["enemy"], []).append(result)
+    return {
+        "scorer": scorer,
+        "overall": summarise(results),
+        "by_enemy": {enemy: summarise(rows) for enemy, rows in sorted(by_enemy.items())},
+        "seconds": elapsed,
+        "states_per_second": len(results) / elapsed if elapsed else 0.0,
+    }
+
+
+def print_report(report: Dict):
+    def fmt(value: Optional[float]) -> str:
+        return "   n/a" if value is None else f"{value:6.2f}"
+
+    print(f"\nBacktest ({report['scorer']} scorer)")
+    print(f"{'Enemy':<20} {'Cases':>6} {'Agree':>7} {'Dealt MAE':>10} {'Taken MAE':>10}")
+    rows = list(report["by_enemy"].items()) + [("All", report["overall"])]
+    for enemy, summary in rows:
+        print(f"{str(enemy):<20} {summary['cases']:>6} {summary['agreement']:>7.1%} "
+              f"{fmt(summary['dealt_mae']):>10} {fmt(summary['taken_mae']):>10}")
+    print(f"\n{report['overall']['cases']} states in {report['seconds']:.2f}s "
+          f"({report['states_per_second']:.0f} states/second)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded fights through the move scorer")
+    parser.add_argument("--history", default=DEFAULT_JOURNAL_DIR,
+                        help="history journal directory or legacy game_history.json "
+                             "(default: the journal, or game_history.json if there is none yet)")
+    parser.add_argument("--enhanced", default="game_history_enhanced.json")
+    parser.add_argument("--scorer", choices=["heuristic", "search"], default="heuristic")
+    parser.add_argument("--policy-tables", metavar="DIR",
+                        help="answer from policy tables where they cover the state (search scorer only)")
+    parser.add_argument("--search-budget", type=float, default=0.25,
+                        help="seconds the search scorer may spend per state")
+    parser.add_argument("--enemy-model", default="enemy_model.json", metavar="PATH",
+                        help="learned enemy move model, built from the history if the file is missing")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+    if args.policy_tables and args.scorer != "search":
+        parser.error("--policy-tables only applies to --scorer search")
+
+    from enemy_model import load_or_bootstrap
+
+    history = args.history
+    if history == DEFAULT_JOURNAL_DIR and not os.path.exists(history) and os.path.exists("game_history.json"):
+        history = "game_history.json"
+    cases = []
+    if os.path.exists(history):
+        cases.extend(cases_from_history(iter_history(history)))
+    if os.path.exists(args.enhanced):
+        cases.extend(cases_from_enhanced(iter_history(args.enhanced)))
+    enemy_model = load_or_bootstrap(args.enemy_model, [history, args.enhanced])
+    report = backtest(cases, args.scorer, args.policy_tables, args.search_budget, args.workers,
+                      enemy_model=enemy_model)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
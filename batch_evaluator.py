@@ -0,0 +1,232 @@
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from gigaverse_calculator import MOVES, EnemyStats, FightState, GigaverseCalculator
+
+# For each move, the move it counters (GigaverseCalculator.move_counter by index)
+BEATS = np.array([MOVES.index(target) for target in ("Spell", "Sword", "Shield")])
+# Fields a what-if grid can vary: state fields, and enemy stats as move_pattern slots
+GRID_FIELDS = ("enemy_health", "player_health", "player_shield")
+PATTERN_FIELDS = ("enemy_sword_atk", "enemy_sword_def", "enemy_shield_atk",
+                  "enemy_shield_def", "enemy_spell_atk", "enemy_spell_def")
+MOVE_LABELS = {"Sword": "Sw", "Shield": "Sh", "Spell": "Sp"}
+
+
+def state_columns(calculator: GigaverseCalculator, states: Sequence[FightState]) -> Dict[str, np.ndarray]:
+    """
+    The fields _calculate_move_value reads, as one array per field
+
+    Per-move fields are (n, 3) in MOVES order. enemy_probs is the first
+    three entries of the calculator's enemy move odds, worked out once per
+    enemy in the batch.
+    """
+    columns = empty_columns(len(states))
+    odds = {}
+    for i, fight_state in enumerate(states):
+        fill_row(calculator, columns, i, fight_state, odds)
+    return columns
+
+
+def empty_columns(n: int) -> Dict[str, np.ndarray]:
+    """Uninitialised state_columns arrays for n states"""
+    return {
+        "player_health": np.empty(n, dtype=np.int64),
+        "player_shield": np.empty(n, dtype=np.int64),
+        "enemy_health": np.empty(n, dtype=np.int64),
+        "player_atk": np.empty((n, 3), dtype=np.int64),
+        "player_def": np.empty((n, 3), dtype=np.int64),
+        "enemy_atk": np.empty((n, 3), dtype=np.int64),
+        "player_charges": np.empty((n, 3), dtype=np.int64),
+        "player_cooldowns": np.empty((n, 3), dtype=np.int64),
+        "enemy_charges": np.empty((n, 3), dtype=np.int64),
+        "enemy_cooldowns": np.empty((n, 3), dtype=np.int64),
+        "enemy_probs": np.zeros((n, 3)),
+    }
+
+
+def fill_row(calculator: GigaverseCalculator,
+             columns: Dict[str, np.ndarray],
+             i: int,
+             fight_state: FightState,
+             odds: Dict) -> None:
+    """
+    Write one state into row i of the columns. odds caches the enemy move
+    odds by enemy across calls. Raises (leaving the row half written) for a
+    state whose fields aren't numbers, so a caller can report that state
+    and reuse the row for the next one.
+    """
+    skills = fight_state.player_skills
+    enemy = fight_state.enemy_stats
+    columns["player_health"][i] = fight_state.player_health
+    columns["player_shield"][i] = fight_state.player_shield
+    columns["enemy_health"][i] = fight_state.enemy_health
+    columns["player_atk"][i] = (skills.sword_atk, skills.shield_atk, skills.spell_atk)
+    columns["player_def"][i] = (skills.sword_def, skills.shield_def, skills.spell_def)
+    columns["enemy_atk"][i] = (enemy.sword_atk, enemy.shield_atk, enemy.spell_atk)
+    columns["player_charges"][i] = [fight_state.player_move_charges[m] for m in MOVES]
+    columns["player_cooldowns"][i] = [fight_state.player_move_cooldowns[m] for m in MOVES]
+    columns["enemy_charges"][i] = [fight_state.enemy_move_charges[m] for m in MOVES]
+    columns["enemy_cooldowns"][i] = [fight_state.enemy_move_cooldowns[m] for m in MOVES]
+    key = (enemy.name, tuple(enemy.move_pattern))
+    probs = odds.get(key)
+    if probs is None:
+        probs = odds[key] = list(calculator._enemy_move_probabilities(fight_state))[:3]
+    columns["enemy_probs"][i] = 0.0
+    columns["enemy_probs"][i, :len(probs)] = probs
+
+
+def move_value_matrix(columns: Dict[str, np.ndarray]) -> np.ndarray:
+    """
+    _calculate_move_value for every state and move in one pass: an (n, 3)
+    matrix, -inf where the move can't be played
+
+    The arithmetic follows the scalar loop step for step (same operations,
+    same order), so the values are identical, not just close.
+    """
+    player_health = columns["player_health"]
+    player_shield = columns["player_shield"]
+    enemy_health = columns["enemy_health"]
+    enemy_atk = columns["enemy_atk"]
+    enemy_probs = columns["enemy_probs"]
+    enemy_ready = (columns["enemy_cooldowns"] <= 0) & (columns["enemy_charges"] > 0)
+    values = np.empty((len(player_health), len(MOVES)))
+
+    for m in range(len(MOVES)):
+        player_atk = columns["player_atk"][:, m]
+        player_def = columns["player_def"][:, m]
+        value = np.zeros(len(player_health))
+        for e in range(len(MOVES)):
+            prob = enemy_probs[:, e]
+            enemy_power = enemy_atk[:, e]
+            if BEATS[m] == e:
+                damage_dealt = np.minimum(enemy_health, enemy_power * np.maximum(1, player_atk))
+                shield_repair = np.minimum(100 - player_shield, enemy_power // 2 * np.maximum(1, player_def))
+                value = np.where(enemy_ready[:, e], value + prob * (damage_dealt * 2 + shield_repair), value)
+            elif BEATS[e] == m:
+                damage_taken = np.minimum(player_health, enemy_power // np.maximum(1, player_def))
+                value = np.where(enemy_ready[:, e], value - prob * damage_taken * 2, value)
+        if MOVES[m] == "Sword":
+            value = np.where((enemy_health <= 4) & (player_atk > 0), value + 5, value)
+        charges = columns["player_charges"][:, m]
+        value = value * (charges / 3)
+        playable = (columns["player_cooldowns"][:, m] <= 0) & (charges > 0)
+        values[:, m] = np.where(playable, value, -np.inf)
+    return values
+
+
+def evaluate_states(calculator: GigaverseCalculator, states: Sequence[FightState]) -> np.ndarray:
+    """(n, 3) move values for a batch of fight states, which all need enemy_stats"""
+    if not states:
+        return np.empty((0, len(MOVES)))
+    return move_value_matrix(state_columns(calculator, states))
+
+
+def best_moves(values: np.ndarray) -> List[Dict]:
+    """{"best_move", "value", "values"} for every row of a move value matrix"""
+    best = values.argmax(axis=1)
+    return [{"best_move": MOVES[b], "value": float(row[b]),
+             "values": {move: float(v) for move, v in zip(MOVES, row)}}
+            for row, b in zip(values.tolist(), best.tolist())]
+
+
+def what_if_grid(calculator: GigaverseCalculator,
+                 fight_state: FightState,
+                 row_field: str,
+                 row_values: Sequence[int],
+                 column_field: str,
+                 column_values: Sequence[int]) -> np.ndarray:
+    """
+    Move values for fight_state with two fields set to every pair of
+    values: a (rows, columns, 3) array, in one move_value_matrix pass
+
+    Fields are GRID_FIELDS or PATTERN_FIELDS. An enemy stat is changed in
+    the enemy's move_pattern, so the enemy move odds follow it as they
+    would for a state with that pattern.
+    """
+    for field in (row_field, column_field):
+        if field not in GRID_FIELDS and field not in PATTERN_FIELDS:
+            raise ValueError(f"can't vary {field!r}; choose from {', '.join(GRID_FIELDS + PATTERN_FIELDS)}")
+    rows, columns = len(row_values), len(column_values)
+    n = rows * columns
+    base = state_columns(calculator, [fight_state])
+    grid = {name: np.repeat(array, n, axis=0) for name, array in base.items()}
+    settings = [(row_field, np.repeat(np.asarray(row_values, dtype=np.int64), columns)),
+                (column_field, np.tile(np.asarray(column_values, dtype=np.int64), rows))]
+
+    patterns = None
+    for field, values in settings:
+        if field in GRID_FIELDS:
+            grid[field] = values
+            continue
+        if patterns is None:
+            patterns = np.tile(np.asarray(fight_state.enemy_stats.move_pattern, dtype=np.int64), (n, 1))
+        patterns[:, PATTERN_FIELDS.index(field)] = values
+    if patterns is not None:
+        grid["enemy_atk"] = patterns[:, 0:6:2]
+        unique, inverse = np.unique(patterns, axis=0, return_inverse=True)
+        enemy = fight_state.enemy_stats
+        odds = np.zeros((len(unique), 3))
+        for i, pattern in enumerate(unique.tolist()):
+            stats = EnemyStats(enemy.name, pattern, enemy.equipment_head_cid, enemy.equipment_body_cid)
+            probs = list(calculator._enemy_move_probabilities(fight_state.replace(enemy_stats=stats)))[:3]
+            odds[i, :len(probs)] = probs
+        grid["enemy_probs"] = odds[inverse.reshape(-1)]
+    return move_value_matrix(grid).reshape(rows, columns, len(MOVES))
+
+
+def field_value(fight_state: FightState, field: str) -> int:
+    """Current value of a GRID_FIELDS or PATTERN_FIELDS field"""
+    if field in PATTERN_FIELDS:
+        return fight_state.enemy_stats.move_pattern[PATTERN_FIELDS.index(field)]
+    return getattr(fight_state, field)
+
+
+def default_range(fight_state: FightState, field: str, limit: int = 24,
+                  max_enemy_health: Optional[int] = None) -> List[int]:
+    """
+    Values to show for a field: every enemy HP up to its maximum, player HP
+    up to the current value, shield from 0 up to twice the current value
+    (at least 10), and enemy stats 3 either side of the guess. Longer
+    ranges are thinned to `limit` evenly spaced values.
+    """
+    current = field_value(fight_state, field)
+    if field == "enemy_health":
+        values = range(1, max(current, max_enemy_health or 0) + 1)
+    elif field == "player_health":
+        values = range(1, max(current, 1) + 1)
+    elif field == "player_shield":
+        values = range(0, max(10, 2 * current) + 1)
+    else:
+        values = range(max(0, current - 3), current + 4)
+    values = list(values)
+    if len(values) > limit:
+        values = sorted(set(np.linspace(values[0], values[-1], limit).round().astype(int).tolist()) | {current})
+    return values
+
+
+def render_grid(grid: np.ndarray,
+                row_field: str,
+                row_values: Sequence[int],
+                column_field: str,
+                column_values: Sequence[int],
+                current: Optional[Sequence[int]] = None) -> List[str]:
+    """
+    Lines showing the best move in every cell of a what_if_grid result
+    (Sw/Sh/Sp, -- when nothing can be played); the cell matching
+    `current` (row value, column value) is starred
+    """
+    best = grid.argmax(axis=2)
+    playable = np.isfinite(grid.max(axis=2))
+    width = max(3, max(len(str(v)) for v in column_values) + 1)
+    label = max(len(str(v)) for v in row_values)
+    lines = [f"Best move by {row_field} (rows) and {column_field} (columns):",
+             " " * (label + 1) + "".join(f"{v:>{width}}" for v in column_values)]
+    for r, row_value in enumerate(row_values):
+        cells = []
+        for c, column_value in enumerate(column_values):
+            cell = MOVE_LABELS[MOVES[best[r, c]]] if playable[r, c] else "--"
+            mark = "*" if current is not None and (row_value, column_value) == tuple(current) else " "
+            cells.append(f"{cell + mark:>{width}}")
+        lines.append(f"{row_value:>{label}} " + "".join(cells))
+    return lines
@@ -0,0 +1,281 @@
+import argparse
+import contextlib
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional, Tuple
+
+from gigaverse_calculator import MOVES, FightState, GigaverseCalculator
+from history_journal import HistoryJournal, iter_history
+
+DEFAULT_BASELINE = "benchmark_baseline.json"
+DEFAULT_TOLERANCE = 0.25
+BASELINE_VERSION = 1
+# Metrics compared against the baseline, and which direction is worse
+REGRESSION_METRICS = {"p50_us": "higher", "p95_us": "higher", "ops_per_second": "lower", "peak_kb": "higher"}
+
+
+def load_fixtures(paths: List[str]) -> List[FightState]:
+    """Fight states from recorded history; records without enemy stats are skipped"""
+    states = []
+    for path in paths:
+        if not os.path.exists(path):
+            continue
+        for record in iter_history(path):
+            if "data" in record or not (record.get("enemy_stats") or {}).get("move_pattern"):
+                continue
+            states.append(FightState.from_dict(record))
+    return states
+
+
+def percentile(sorted_samples: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of already sorted samples"""
+    if not sorted_samples:
+        return 0.0
+    index = min(len(sorted_samples) - 1, max(0, round(fraction * len(sorted_samples)) - 1))
+    return sorted_samples[index]
+
+
+def measure(operation: Callable, items: List, warmup: int = 50, work: int = 1,
+            memory_items: Optional[List] = None, rounds: int = 3) -> Dict:
+    """
+    Time operation(item) for every item
+
+    Each call is timed on its own for the latency percentiles. The timing
+    pass is repeated `rounds` times and the fastest round is kept, as timeit
+    does, so a burst of load elsewhere on the machine doesn't count as a
+    regression. Throughput
+    counts `work` units (e.g. records saved) per call. Peak memory comes
+    from a second pass over memory_items (default: all items) under
+    tracemalloc, keeping every result alive as a caller collecting them
+    would, so its overhead doesn't skew the timings.
+    """
+    for item in items[:warmup]:
+        operation(item)
+
+    clock = time.perf_counter_ns
+    samples, elapsed = [], float("inf")
+    for _ in range(max(1, rounds)):
+        round_samples = []
+        started = clock()
+        for item in items:
+            call_started = clock()
+            operation(item)
+            round_samples.append(clock() - call_started)
+        round_elapsed = (clock() - started) / 1e9
+        if round_elapsed < elapsed:
+            samples, elapsed = round_samples, round_elapsed
+
+    tracemalloc.start()
+    kept = [operation(item) for item in (items if memory_items is None else memory_items)]
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del kept
+
+    samples.sort()
+    return {
+        "calls": len(items),
+        "p50_us": percentile(samples, 0.50) / 1e3,
+        "p95_us": percentile(samples, 0.95) / 1e3,
+        "p99_us": percentile(samples, 0.99) / 1e3,
+        "max_us": samples[-1] / 1e3 if samples else 0.0,
+        "ops_per_second": len(items) * work / elapsed if elapsed else 0.0,
+        "peak_kb": peak / 1024,
+    }
+
+
+def benchmark_paths(calculator: GigaverseCalculator,
+                    states: List[FightState],
+                    scale: int,
+                    scratch: str,
+                    devnull,
+                    save_repeats: int = 5) -> Dict[str, Tuple[Callable, List, int]]:
+    """
+    (operation, items, work per call) for every benchmarked path at `scale`
+    times the recorded volume. A history save writes every record, so only
+    one is timed at scales above 1.
+    """
+    volume = states * scale
+    # Deterministic round inputs: every player/enemy move pairing in turn
+    rounds = [(state, MOVES[i % 3], MOVES[(i // 3) % 3]) for i, state in enumerate(volume)]
+    value_calls = [(move, state) for state in volume for move in MOVES]
+    records = [state.to_dict() for state in states] * scale
+
+    def best_move(state: FightState):
+        # calculate_best_move prints its move values; keep that cost but not the output
+        with contextlib.redirect_stdout(devnull):
+            return calculator.calculate_best_move(state)
+
+    def save_history(directory: str):
+        # A whole history written the way the live loop writes it: batched
+        # appends and fsync'd flushes into a fresh journal
+        shutil.rmtree(directory, ignore_errors=True)
+        with HistoryJournal(directory) as journal:
+            for record in records:
+                journal.append(record)
+
+    return {
+        "calculate_best_move": (best_move, volume, 1),
+        "_calculate_move_value": (lambda call: calculator._calculate_move_value(*call), value_calls, 1),
+        "update_fight_state": (lambda call: calculator.update_fight_state(*call), rounds, 1),
+        "FightState.to_dict": (FightState.to_dict, volume, 1),
+        "history_save": (save_history,
+                         [os.path.join(scratch, f"save-{i}") for i in range(save_repeats if scale == 1 else 1)],
+                         len(records)),
+    }
+
+
+def run_benchmarks(states: List[FightState],
+                   scales: List[int],
+                   only: Optional[List[str]] = None,
+                   save_repeats: int = 5,
+                   rounds: int = 3) -> Dict:
+    """Measure every path at every scale; returns {"<path>@<scale>x": metrics}"""
+    calculator = GigaverseCalculator(enemies={"entities": []})
+    results = {}
+    scratch = tempfile.mkdtemp(prefix="gigaverse-bench-")
+    devnull = open(os.devnull, "w")
+    try:
+        for scale in scales:
+            paths = benchmark_paths(calculator, states, scale, scratch, devnull, save_repeats)
+            for name, (operation, items, work) in paths.items():
+                if only and name not in only:
+                    continue
+                if name == "history_save":
+                    # Saves are long enough to time once
+                    metrics = measure(operation, items, warmup=0, work=work, memory_items=items[:1], rounds=1)
+                else:
+                    metrics = measure(operation, items, rounds=rounds)
+                metrics["scale"] = scale
+                results[f"{name}@{scale}x"] = metrics
+                print(f"  {name}@{scale}x: p50 {metrics['p50_us']:.1f}us, {metrics['ops_per_second']:.0f}/s",
+                      file=sys.stderr)
+    finally:
+        devnull.close()
+        shutil.rmtree(scratch, ignore_errors=True)
+    return results
+
+
+def environment() -> Dict:
+    return {"python": platform.python_version(), "platform": platform.platform(), "machine": platform.machine()}
+
+
+def load_baseline(path: str) -> Optional[Dict]:
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def save_baseline(path: str, results: Dict, fixtures: int, tolerance: float,
+                  previous: Optional[Dict] = None):
+    """Write results as the new baseline, keeping any per-path tolerances already configured"""
+    data = {
+        "version": BASELINE_VERSION,
+        "created_at": time.time(),
+        "environment": environment(),
+        "fixtures": fixtures,
+        "tolerance": tolerance,
+        "tolerances": (previous or {}).get("tolerances", {}),
+        "results": results,
+    }
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w") as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+    os.replace(temp_path, path)
+
+
+def compare(results: Dict, baseline: Dict, tolerance: Optional[float] = None) -> List[Dict]:
+    """
+    Regressions of results against a baseline
+
+    A metric regresses when it is worse than the baseline by more than the
+    tolerance (0.25 = 25%). The tolerance comes from the argument, else the
+    baseline's per-path "tolerances" entry (keyed by path name, e.g.
+    "history_save"), else the baseline's "tolerance".
+    """
+    regressions = []
+    for key, metrics in results.items():
+        reference = baseline.get("results", {}).get(key)
+        if not reference:
+            continue
+        path = key.split("@")[0]
+        allowed = tolerance
+        if allowed is None:
+            allowed = baseline.get("tolerances", {}).get(path, baseline.get("tolerance", DEFAULT_TOLERANCE))
+        for metric, worse in REGRESSION_METRICS.items():
+            old, new = reference.get(metric), metrics.get(metric)
+            if not old or new is None:
+                continue
+            change = new / old - 1 if worse == "higher" else old / new - 1 if new else float("inf")
+            if change > allowed:
+                regressions.append({"benchmark": key, "metric": metric, "baseline": old,
+                                    "current": new, "change": change, "tolerance": allowed})
+    return regressions
+
+
+def print_report(results: Dict, baseline: Optional[Dict], regressions: List[Dict]):
+    print(f"\n{'Benchmark':<30} {'Calls':>8} {'p50 us':>9} {'p95 us':>9} {'p99 us':>9} "
+          f"{'per sec':>10} {'Peak KB':>9} {'vs base':>8}")
+    for key, metrics in results.items():
+        reference = (baseline or {}).get("results", {}).get(key)
+        delta = f"{metrics['p50_us'] / reference['p50_us'] - 1:+.0%}" if reference and reference["p50_us"] else ""
+        print(f"{key:<30} {metrics['calls']:>8} {metrics['p50_us']:>9.1f} {metrics['p95_us']:>9.1f} "
+              f"{metrics['p99_us']:>9.1f} {metrics['ops_per_second']:>10.0f} {metrics['peak_kb']:>9.1f} {delta:>8}")
+    if baseline and baseline.get("environment") != environment():
+        print(f"\nNote: the baseline was recorded on {baseline.get('environment')}")
+    for regression in regressions:
+        print(f"REGRESSION {regression['benchmark']} {regression['metric']}: "
+              f"{regression['baseline']:.1f} -> {regression['current']:.1f} "
+              f"({regression['change']:+.0%}, tolerance {regression['tolerance']:.0%})")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the calculator's hot paths against a saved baseline")
+    parser.add_argument("--history", nargs="+", default=["game_history.json", "game_history_enhanced.json"],
+                        help="history journal directories or JSON files to build fixtures from")
+    parser.add_argument("--scales", default="1,100",
+                        help="comma-separated multiples of the recorded volume to run at")
+    parser.add_argument("--only", help="comma-separated paths to run, e.g. calculate_best_move,history_save")
+    parser.add_argument("--save-repeats", type=int, default=5, help="full history saves timed at 1x")
+    parser.add_argument("--rounds", type=int, default=3, help="timing passes per path; the fastest is kept")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--tolerance", type=float, default=None,
+                        help=f"allowed slowdown as a fraction (default: from the baseline, else {DEFAULT_TOLERANCE})")
+    parser.add_argument("--save-baseline", action="store_true", help="record this run as the new baseline")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args(argv)
+
+    states = load_fixtures(args.history)
+    if not states:
+        print("No fixtures: none of the history files have fight states with enemy stats")
+        return 2
+    scales = [int(scale) for scale in args.scales.split(",")]
+    only = args.only.split(",") if args.only else None
+    print(f"Benchmarking {len(states)} recorded states at {', '.join(f'{s}x' for s in scales)}",
+          file=sys.stderr)
+
+    results = run_benchmarks(states, scales, only, args.save_repeats, args.rounds)
+    baseline = load_baseline(args.baseline)
+    regressions = compare(results, baseline, args.tolerance) if baseline and not args.save_baseline else []
+    if args.json:
+        print(json.dumps({"results": results, "regressions": regressions}, indent=2))
+    else:
+        print_report(results, None if args.save_baseline else baseline, regressions)
+
+    if args.save_baseline:
+        tolerance = args.tolerance if args.tolerance is not None else (baseline or {}).get("tolerance", DEFAULT_TOLERANCE)
+        save_baseline(args.baseline, results, len(states), tolerance, baseline)
+        print(f"\nSaved baseline to {args.baseline}")
+    elif baseline is None:
+        print(f"\nNo baseline at {args.baseline}; run with --save-baseline to record one")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
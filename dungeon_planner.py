@@ -0,0 +1,375 @@
+import argparse
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from fight_solver import ExpectimaxSolver, encode_fight_state, enemy_odds_table
+from gigaverse_calculator import MOVES, EnemyStats, FightState, GigaverseCalculator, PlayerSkills
+
+Room = Tuple[EnemyStats, int]  # (enemy, enemy HP at the start of the fight)
+
+
+class RoomSolver:
+    """
+    Exact values of one fight for every HP pair, by dynamic programming.
+
+    Positions are (player HP, enemy HP, context), with contexts (charges,
+    cooldowns, last moves) expanded by ExpectimaxSolver so the damage and
+    charge rules are the calculator's. HP never goes up during a fight, so
+    HP pairs are solved from the lowest up; rounds where neither side takes
+    damage stay on the same HP pair and are settled by value iteration. Each
+    HP pair is one set of NumPy operations over all contexts.
+
+    Winning with h HP is worth continuation[h] (the chance of clearing the
+    rooms after this one) rather than 1; a fight that never ends is lost.
+    Enemy moves follow `odds`, an enemy_odds_table() fixed for the solver's
+    lifetime (by default the calculator's odds when it is created).
+    """
+
+    def __init__(self, calculator, player_skills: PlayerSkills, enemy_stats: EnemyStats,
+                 odds: Optional[Tuple] = None, tolerance: float = 1e-9, max_iterations: int = 1000,
+                 max_tables: int = 4):
+        self.rules = ExpectimaxSolver(calculator, time_budget=0)
+        self.player_skills = player_skills
+        self.enemy_stats = enemy_stats
+        self.odds = odds or enemy_odds_table(calculator, enemy_stats)
+        self.tolerance = tolerance
+        self.max_iterations = max_iterations
+        self.max_tables = max_tables
+        # Expanded contexts in column order; index maps context id -> column
+        self.order: List[int] = []
+        self.index: Dict[int, int] = {}
+        self.arrays = None
+        # continuation -> values, most recently used last
+        self.solved: "OrderedDict[Tuple, np.ndarray]" = OrderedDict()
+
+    def _probe(self, player_health: int = 1, enemy_health: int = 1) -> FightState:
+        return FightState(enemy_id=self.enemy_stats.name, enemy_health=enemy_health,
+                          player_health=player_health, player_shield=0,
+                          player_skills=self.player_skills, enemy_stats=self.enemy_stats)
+
+    def context(self, fight_state: Optional[FightState] = None) -> int:
+        """Context id of a position (a fresh room by default), expanding what it reaches if new"""
+        fight_state = fight_state or self._probe()
+        if self.rules._prepare(fight_state, self.odds):
+            self.order, self.index, self.arrays = [], {}, None
+            self.solved.clear()
+        context_id = self.rules._context_id(encode_fight_state(fight_state)[2:])
+        if context_id not in self.index:
+            self._extend(context_id)
+        return context_id
+
+    def _extend(self, root: int):
+        """Append transition columns for the contexts reachable from root that have none yet"""
+        start = len(self.order)
+        pending = [root]
+        while pending:
+            context_id = pending.pop()
+            if context_id in self.index:
+                continue
+            self.index[context_id] = len(self.order)
+            self.order.append(context_id)
+            for _, outcomes in self.rules._expand(context_id):
+                pending.extend(child for _, _, _, child in outcomes if child not in self.index)
+
+        # Indexed [player move, enemy outcome, context] so every slice is one
+        # contiguous vector over contexts
+        shape = (len(MOVES), len(MOVES), len(self.order) - start)
+        prob = np.zeros(shape)
+        dealt = np.zeros(shape, dtype=np.int64)
+        taken = np.zeros(shape, dtype=np.int64)
+        child = np.zeros(shape, dtype=np.int64)
+        legal = np.zeros(shape[1:], dtype=bool)
+        for i, context_id in enumerate(self.order[start:]):
+            for player_move, outcomes in self.rules._expand(context_id):
+                legal[player_move, i] = True
+                for k, (p, d, t, c) in enumerate(outcomes):
+                    prob[player_move, k, i] = p
+                    dealt[player_move, k, i] = d
+                    taken[player_move, k, i] = t
+                    child[player_move, k, i] = self.index[c]
+        columns = (prob, dealt, taken, child, legal)
+        if self.arrays is None:
+            self.arrays = columns
+        else:
+            self.arrays = tuple(np.concatenate((old, new), axis=-1) for old, new in zip(self.arrays, columns))
+
+    def solve(self, max_player_health: int, max_enemy_health: int,
+              continuation: Sequence[float] = ()) -> np.ndarray:
+        """
+        values[player HP, enemy HP, context index] for the optimal policy,
+        where the context index is self.index[context id], covering at
+        least the given HP. Tables are kept for the last max_tables
+        continuations. Contexts never lead back to earlier ones, so when
+        context() has expanded new ones a kept table only gains their
+        columns; asking again between rounds of a fight is a lookup.
+        """
+        continuation = tuple(continuation)
+        contexts = len(self.order)
+        values = self.solved.pop(continuation, None)
+        if values is not None and (values.shape[0] <= max_player_health or values.shape[1] <= max_enemy_health):
+            max_player_health = max(max_player_health, values.shape[0] - 1)
+            max_enemy_health = max(max_enemy_health, values.shape[1] - 1)
+            values = None
+        if values is None:
+            start = 0
+            values = np.zeros((max_player_health + 1, max_enemy_health + 1, contexts))
+        else:
+            start = values.shape[2]
+            if start < contexts:
+                values = np.concatenate((values, np.zeros(values.shape[:2] + (contexts - start,))), axis=2)
+        if start < contexts:
+            self._fill(values, start, continuation)
+        self.solved[continuation] = values
+        while len(self.solved) > self.max_tables:
+            self.solved.popitem(last=False)
+        return values
+
+    def _fill(self, values: np.ndarray, start: int, continuation: Tuple[float, ...]):
+        """Solve the columns from `start` on, reading the (final) earlier ones where they lead"""
+        prob, dealt, taken, child, legal = (a[..., start:] for a in self.arrays)
+        max_player_health, max_enemy_health, contexts = values.shape[0] - 1, values.shape[1] - 1, values.shape[2]
+        for player_health in range(1, max_player_health + 1):
+            carry = continuation[min(player_health, len(continuation) - 1)] if len(continuation) else 1.0
+            values[player_health, 0, start:] = carry
+        flat = values.reshape(-1)
+        # Zero-damage outcomes stay on the HP pair being solved; only those
+        # into columns being solved are iterated, the rest are already final
+        stay = (dealt == 0) & (taken == 0) & (prob > 0) & (child >= start)
+        stay_moves, _, stay_contexts = np.nonzero(stay)
+        stay_rows = stay_moves * legal.shape[1] + stay_contexts
+        stay_prob, stay_child = prob[stay], child[stay]
+
+        def best(move_values: np.ndarray) -> np.ndarray:
+            # Explicit maxima over the three moves: NumPy reduces short axes slowly
+            move_values = np.where(legal, move_values, -np.inf)
+            return np.maximum(np.maximum(np.maximum(move_values[0], move_values[1]), move_values[2]), 0.0)
+
+        for player_health in range(1, max_player_health + 1):
+            next_player = np.maximum(player_health - taken, 0) * (max_enemy_health + 1)
+            for enemy_health in range(1, max_enemy_health + 1):
+                targets = (next_player + np.maximum(enemy_health - dealt, 0)) * contexts + child
+                layer = values[player_health, enemy_health]
+                # The columns being solved are still zero here, so this is every other outcome's share
+                weighted = prob * flat[targets]
+                settled = weighted[:, 0] + weighted[:, 1] + weighted[:, 2]
+                layer[start:] = best(settled)
+                for _ in range(self.max_iterations if len(stay_rows) else 0):
+                    looped = np.bincount(stay_rows, stay_prob * layer[stay_child], minlength=settled.size)
+                    updated = best(settled + looped.reshape(settled.shape))
+                    change = np.abs(updated - layer[start:]).max()
+                    layer[start:] = updated
+                    if change <= self.tolerance:
+                        break
+
+    def move_values(self, values: np.ndarray, fight_state: FightState) -> Dict[str, float]:
+        """Value of each move from a position, using a table from solve()"""
+        prob, dealt, taken, child, legal = self.arrays
+        i = self.index[self.context(fight_state)]
+        max_enemy_health = values.shape[1] - 1
+        result = {}
+        for m, move in enumerate(MOVES):
+            if not legal[m, i]:
+                result[move] = float("-inf")
+                continue
+            next_player = np.maximum(fight_state.player_health - taken[m, :, i], 0)
+            next_enemy = np.maximum(min(fight_state.enemy_health, max_enemy_health) - dealt[m, :, i], 0)
+            result[move] = float((prob[m, :, i] * values[next_player, next_enemy, child[m, :, i]]).sum())
+        return result
+
+
+class DungeonPlanner:
+    """
+    Plans a whole run of rooms rather than the current fight alone.
+
+    The HP a fight ends with is the next room's starting HP (plus `heal`,
+    up to max_health), so the rooms are solved backwards: the last room's
+    table is the chance of winning it from each starting HP, and each
+    earlier room's table is the chance of clearing it and everything after,
+    with RoomSolver valuing a win by the next room's table. Shield is
+    carried over unchanged; the damage rules never touch it.
+
+    Rooms start with full charges and no last moves. Solvers are kept per
+    player build and enemy, so rooms against the same enemy share their
+    expanded contexts, and finished tables are memoized on (build, enemy,
+    enemy HP, max HP, continuation): replanning after every round only
+    re-solves the room being fought, and within a round it is a lookup.
+
+    max_health is the player's maximum HP; it can be given per call
+    instead, e.g. from DungeonSnapshot.player_max_health.
+    """
+
+    def __init__(self,
+                 calculator: Optional[GigaverseCalculator] = None,
+                 max_health: Optional[int] = None,
+                 heal: int = 0):
+        self.calculator = calculator or GigaverseCalculator(enemies={"entities": []})
+        self.max_health = max_health
+        self.heal = heal
+        self.solvers: Dict[Tuple, RoomSolver] = {}
+        self.tables: Dict[Tuple, Tuple[float, ...]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _build_key(skills: PlayerSkills, enemy_stats: EnemyStats) -> Tuple:
+        return (skills.sword_atk, skills.sword_def, skills.shield_atk, skills.shield_def,
+                skills.spell_atk, skills.spell_def, tuple(enemy_stats.move_pattern))
+
+    def _odds(self, enemy_stats: EnemyStats) -> Tuple:
+        """
+        The calculator's enemy odds, rounded so small updates to the enemy
+        model don't throw away solved rooms
+        """
+        return tuple(tuple(round(p, 2) for p in row) for row in enemy_odds_table(self.calculator, enemy_stats))
+
+    def _solver(self, skills: PlayerSkills, enemy_stats: EnemyStats) -> RoomSolver:
+        odds = self._odds(enemy_stats)
+        key = (self._build_key(skills, enemy_stats), odds)
+        solver = self.solvers.get(key)
+        if solver is None:
+            solver = self.solvers[key] = RoomSolver(self.calculator, skills, enemy_stats, odds)
+        return solver
+
+    def _healed(self, continuation: Sequence[float]) -> Tuple[float, ...]:
+        """Continuation by HP at the end of a fight, given one by HP at the start of the next room"""
+        if not self.heal:
+            return tuple(continuation)
+        top = len(continuation) - 1
+        return tuple(continuation[min(top, h + self.heal)] if h > 0 else 0.0 for h in range(len(continuation)))
+
+    def _max_health(self, max_health: Optional[int]) -> int:
+        max_health = max_health or self.max_health
+        if not max_health:
+            raise ValueError("The player's max HP is unknown; pass max_health")
+        return max_health
+
+    def room_table(self,
+                   skills: PlayerSkills,
+                   room: Room,
+                   continuation: Optional[Sequence[float]] = None,
+                   max_health: Optional[int] = None) -> Tuple[float, ...]:
+        """
+        Chance of clearing `room` and the rooms behind it, for every starting
+        HP from 0 to max_health. continuation is the next room's table
+        (None for the last room).
+        """
+        max_health = self._max_health(max_health)
+        enemy_stats, enemy_health = room
+        carry = self._healed(continuation) if continuation is not None else ()
+        key = (self._build_key(skills, enemy_stats), self._odds(enemy_stats), enemy_health, max_health, carry)
+        table = self.tables.get(key)
+        if table is not None:
+            self.hits += 1
+            return table
+        self.misses += 1
+        solver = self._solver(skills, enemy_stats)
+        root = solver.context()
+        values = solver.solve(max_health, enemy_health, carry)
+        table = self.tables[key] = tuple(float(v) for v in values[:max_health + 1, enemy_health, solver.index[root]])
+        return table
+
+    def plan(self,
+             skills: PlayerSkills,
+             rooms: Sequence[Room],
+             max_health: Optional[int] = None) -> List[Tuple[float, ...]]:
+        """room_table() for every room, solved from the last room back to the first"""
+        tables: List[Tuple[float, ...]] = []
+        continuation = None
+        for room in reversed(rooms):
+            continuation = self.room_table(skills, room, continuation, max_health)
+            tables.append(continuation)
+        return tables[::-1]
+
+    def move_values(self,
+                    fight_state: FightState,
+                    remaining: Sequence[Room],
+                    max_health: Optional[int] = None) -> Dict[str, float]:
+        """
+        Chance of clearing the run after each move from the current position,
+        where `remaining` are the rooms after the current one
+        """
+        max_health = max(self._max_health(max_health), fight_state.player_health)
+        skills = fight_state.player_skills
+        tables = self.plan(skills, remaining, max_health)
+        solver = self._solver(skills, fight_state.enemy_stats)
+        solver.context(fight_state)
+        values = solver.solve(max_health, max(1, fight_state.enemy_health),
+                              self._healed(tables[0]) if tables else ())
+        return solver.move_values(values, fight_state)
+
+
+def remaining_rooms(catalog, enemy_name: Optional[str]) -> List[Room]:
+    """The catalog rooms after the one holding enemy_name, in room order"""
+    roster = [enemy for enemy in catalog.roster() if enemy["max_health"]]
+    names = [enemy["name"] for enemy in roster]
+    start = names.index(enemy_name) + 1 if enemy_name in names else 0
+    return [(catalog.stats(enemy["name"]), enemy["max_health"]) for enemy in roster[start:]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Plan a whole dungeon run, carrying HP from room to room")
+    parser.add_argument("--history", nargs="+", default=["game_history", "game_history.json",
+                                                          "game_history_enhanced.json"],
+                        help="history journal directories or JSON files to take enemies and skills from")
+    parser.add_argument("--catalog", default="enemy_catalog.json")
+    parser.add_argument("--rooms", help="comma-separated enemy names in fight order (default: every room in order)")
+    parser.add_argument("--health", type=int, help="HP at the start of the run (default: the highest seen)")
+    parser.add_argument("--heal", type=int, default=0, help="HP restored between rooms")
+    parser.add_argument("--json", action="store_true", help="print the plan as JSON")
+    args = parser.parse_args()
+
+    from enemy_catalog import EnemyCatalog
+    from history_journal import iter_history
+
+    skills, best_health = None, 0
+    for source in args.history:
+        if not os.path.exists(source):
+            continue
+        for record in iter_history(source):
+            if record.get("player_skills"):
+                skills = record["player_skills"]
+                best_health = max(best_health, record.get("player_health") or 0)
+    catalog = EnemyCatalog(args.catalog)
+    catalog.observe_history(args.history)
+    if args.rooms:
+        names = [name.strip() for name in args.rooms.split(",")]
+        missing = [name for name in names if catalog.get(name) is None]
+        if missing:
+            print(f"Unknown enemies: {', '.join(missing)}")
+            return
+        rooms = [(catalog.stats(name), catalog.get(name)["max_health"]) for name in names]
+    else:
+        rooms = remaining_rooms(catalog, None)
+    if not rooms or skills is None:
+        print("Need recorded fights to take enemies and player skills from")
+        return
+
+    health = args.health or best_health or 20
+    player_skills = PlayerSkills(**skills)
+    planner = DungeonPlanner(max_health=health, heal=args.heal)
+    started = time.perf_counter()
+    tables = planner.plan(player_skills, rooms)
+    elapsed = time.perf_counter() - started
+
+    plan = [{"room": index + 1, "enemy": enemy.name, "enemy_health": enemy_health,
+             "clear_chance_at_full_health": table[health], "table": list(table)}
+            for index, ((enemy, enemy_health), table) in enumerate(zip(rooms, tables))]
+    if args.json:
+        print(json.dumps({"health": health, "seconds": elapsed, "rooms": plan}, indent=2))
+        return
+    print(f"\nRun of {len(rooms)} rooms from {health} HP, planned in {elapsed:.2f}s "
+          f"({planner.misses} room tables solved, {planner.hits} reused)")
+    print(f"{'Room':>4} {'Enemy':<16} {'Enemy HP':>8} {'Clear rest from full HP':>24}")
+    for room in plan:
+        print(f"{room['room']:>4} {room['enemy']:<16} {room['enemy_health']:>8} "
+              f"{room['clear_chance_at_full_health']:>24.1%}")
+    print(f"\nChance of clearing the whole run: {tables[0][health]:.1%}")
+
+
+if __name__ == "__main__":
+    main()
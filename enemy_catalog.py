@@ -0,0 +1,312 @@
+import base64
+import html
+import json
+import os
+import quopri
+import re
+import time
+from typing import Dict, Iterable, List, Optional
+
+DEFAULT_CATALOG_PATH = "enemy_catalog.json"
+DEFAULT_DOCS_DIR = "gigaversedocs"
+DEFAULT_TTL = 24 * 60 * 60
+CATALOG_VERSION = 2
+
+_NUMBER_WORDS = {"one": 1, "two": 2, "three": 3, "four": 4, "five": 5,
+                 "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10}
+_ROOM_NAME = re.compile(r"Room (\d+)$")
+
+
+def _number(text: str) -> int:
+    return int(text) if text.isdigit() else _NUMBER_WORDS[text.lower()]
+
+
+def _page_text(path: str) -> str:
+    """Visible text of a saved .mhtml page"""
+    with open(path, "rb") as f:
+        raw = f.read()
+    # Only the HTML part is needed, so split the MIME parts by hand rather
+    # than parsing every embedded image and font
+    boundary = re.search(rb'boundary="?([^";\r\n]+)"?', raw)
+    parts = raw.split(b"--" + boundary.group(1)) if boundary else [raw]
+    for part in parts:
+        head, _, body = part.lstrip().partition(b"\r\n\r\n")
+        if not body:
+            head, _, body = part.lstrip().partition(b"\n\n")
+        if not re.search(rb"content-type:\s*text/html", head, re.I):
+            continue
+        if b"quoted-printable" in head.lower():
+            body = quopri.decodestring(body)
+        elif b"base64" in head.lower():
+            body = base64.b64decode(body)
+        markup = body.decode("utf-8", "replace")
+        markup = re.sub(r"<(script|style)\b.*?</\1>", " ", markup, flags=re.S)
+        return re.sub(r"\s+", " ", html.unescape(re.sub(r"<[^>]+>", " ", markup)))
+    return ""
+
+
+def parse_dungeon_docs(directory: str = DEFAULT_DOCS_DIR) -> List[Dict]:
+    """
+    Dungeon facts from the bundled GitBook pages (Normal Dungeon, Gigus
+    Dungeon, ...): entry energy, daily run limit and, where a page states
+    it, the floor/room layout. The pages list no enemy stats; those come
+    from observed API payloads.
+    """
+    dungeons = []
+    if not os.path.isdir(directory):
+        return dungeons
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith(".mhtml") or "Dungeon" not in name:
+            continue
+        text = _page_text(os.path.join(directory, name))
+        dungeon = {"name": text.split(" | ")[0].strip()}
+        layout = re.search(r"There are (\w+) rooms to each of the (\w+) floors", text)
+        if layout:
+            dungeon["rooms_per_floor"] = _number(layout.group(1))
+            dungeon["floors"] = _number(layout.group(2))
+        energy = re.search(r"(\d+) energy must be spent", text)
+        if energy:
+            dungeon["energy"] = int(energy.group(1))
+        runs = re.search(r"(\d+) runs per day", text)
+        if runs:
+            dungeon["daily_runs"] = int(runs.group(1))
+        dungeons.append(dungeon)
+    return dungeons
+
+
+class EnemyCatalog:
+    """
+    Every enemy seen so far, indexed by name and by ID.
+
+    Entries are keyed by enemy name ("Enemy Room 3"); IDs (the API reports
+    the dungeon run ID) are aliases to the enemy most recently seen under
+    them. Lookups are dict hits, and stats() hands out one interned
+    EnemyStats per enemy. Each entry keeps its move pattern, the highest HP
+    it was seen with and its room number, placed on a floor using the
+    layout from parse_dungeon_docs().
+
+    The file holds one column per field, is read the first time the catalog
+    is used, and counts as fresh for `ttl` seconds after the last update
+    (from the API or a poll). A catalog with no path lives in memory only.
+    """
+
+    def __init__(self, path: Optional[str] = DEFAULT_CATALOG_PATH,
+                 ttl: float = DEFAULT_TTL,
+                 docs_directory: str = DEFAULT_DOCS_DIR):
+        self.path = path
+        self.ttl = ttl
+        self.docs_directory = docs_directory
+        self.updated_at = 0.0
+        self.dungeons: List[Dict] = []
+        self.enemies: Optional[List[Dict]] = None
+        self.by_name: Dict[str, int] = {}
+        self.by_id: Dict[str, int] = {}
+        self._stats: Dict[int, object] = {}
+
+    @classmethod
+    def from_entities(cls, entities: Iterable[Dict]) -> "EnemyCatalog":
+        """An in-memory catalog of GigaverseCalculator.enemies["entities"]-style dicts"""
+        catalog = cls(path=None)
+        catalog.update(entities)
+        return catalog
+
+    def _load(self):
+        if self.enemies is not None:
+            return
+        self.enemies = []
+        data = {}
+        if self.path and os.path.exists(self.path):
+            try:
+                with open(self.path, "r") as f:
+                    data = json.load(f)
+            except (json.JSONDecodeError, OSError):
+                data = {}
+        self.dungeons = data.get("dungeons") or parse_dungeon_docs(self.docs_directory)
+        if data.get("version") == CATALOG_VERSION:
+            columns = data["enemies"]
+            for index, name in enumerate(columns["name"]):
+                self._add({field: values[index] for field, values in columns.items()})
+            self.by_id = {enemy_id: index for enemy_id, index in data.get("ids", {}).items()}
+        else:
+            # Earlier catalogs were a plain list of entities
+            self.update(data.get("entities", []))
+        self.updated_at = data.get("updated_at", 0.0)
+
+    def _add(self, enemy: Dict) -> int:
+        index = len(self.enemies)
+        self.enemies.append(enemy)
+        self.by_name[enemy["name"]] = index
+        return index
+
+    def _floor(self, room: Optional[int]) -> Optional[int]:
+        rooms_per_floor = next((d["rooms_per_floor"] for d in self.dungeons if d.get("rooms_per_floor")), None)
+        if room is None or not rooms_per_floor:
+            return None
+        return (room - 1) // rooms_per_floor + 1
+
+    def is_fresh(self) -> bool:
+        """True while the catalog doesn't need refreshing from the API"""
+        self._load()
+        if self.path is None:
+            return True
+        return bool(self.enemies) and time.time() - self.updated_at < self.ttl
+
+    def __len__(self) -> int:
+        self._load()
+        return len(self.enemies)
+
+    def __contains__(self, key) -> bool:
+        return self._index(key) is not None
+
+    def _index(self, key) -> Optional[int]:
+        self._load()
+        index = self.by_id.get(str(key))
+        return self.by_name.get(key) if index is None else index
+
+    def get(self, key) -> Optional[Dict]:
+        """Catalog entry for an enemy name or ID"""
+        index = self._index(key)
+        return None if index is None else self.enemies[index]
+
+    def stats(self, key):
+        """The interned EnemyStats for an enemy name or ID, or None"""
+        index = self._index(key)
+        if index is None:
+            return None
+        stats = self._stats.get(index)
+        if stats is None:
+            from gigaverse_calculator import EnemyStats
+
+            enemy = self.enemies[index]
+            stats = self._stats[index] = EnemyStats(
+                name=enemy["name"],
+                move_pattern=list(enemy["move_pattern"]),
+                equipment_head_cid=enemy["equipment_head"],
+                equipment_body_cid=enemy["equipment_body"]
+            )
+        return stats
+
+    def roster(self) -> List[Dict]:
+        """Every enemy, in room order where known"""
+        self._load()
+        return sorted(self.enemies, key=lambda e: (e["room"] is None, e["room"] or 0, e["name"]))
+
+    def observe(self, name: str, move_pattern: List[int], enemy_id=None, health: Optional[int] = None,
+                equipment_head: int = 0, equipment_body: int = 0) -> bool:
+        """Record an enemy seen in a payload; returns True if the catalog changed"""
+        self._load()
+        changed = False
+        index = self.by_name.get(name)
+        if index is None:
+            match = _ROOM_NAME.search(name or "")
+            room = int(match.group(1)) if match else None
+            index = self._add({
+                "name": name, "move_pattern": list(move_pattern), "max_health": health,
+                "room": room, "floor": self._floor(room),
+                "equipment_head": equipment_head, "equipment_body": equipment_body,
+            })
+            changed = True
+        else:
+            enemy = self.enemies[index]
+            if list(move_pattern) != enemy["move_pattern"]:
+                enemy["move_pattern"] = list(move_pattern)
+                self._stats.pop(index, None)
+                changed = True
+            if health is not None and (enemy["max_health"] is None or health > enemy["max_health"]):
+                enemy["max_health"] = health
+                changed = True
+        if enemy_id is not None and self.by_id.get(str(enemy_id)) != index:
+            self.by_id[str(enemy_id)] = index
+            changed = True
+        self.updated_at = time.time()
+        return changed
+
+    def update(self, entities: Iterable[Dict]) -> bool:
+        """observe() each entity in GigaverseCalculator.enemies form; returns True if anything changed"""
+        changed = False
+        for entity in entities:
+            changed |= self.observe(entity["NAME_CID"], entity["MOVE_STATS_CID_array"],
+                                    entity.get("ID_CID"), entity.get("HEALTH"),
+                                    entity.get("EQUIPMENT_HEAD_CID", 0), entity.get("EQUIPMENT_BODY_CID", 0))
+        return changed
+
+    def observe_history(self, sources: Iterable[str]) -> bool:
+        """observe() every enemy in history/payload files; returns True if anything changed"""
+        from history_journal import iter_history
+
+        changed = False
+        for source in sources:
+            if not os.path.exists(source):
+                continue
+            for record in iter_history(source):
+                if "data" in record:
+                    from gigaverse_calculator import parse_dungeon_state
+
+                    snapshot = parse_dungeon_state(record)
+                    if snapshot:
+                        changed |= self.update([snapshot.enemy_entity()])
+                    continue
+                enemy = record.get("enemy_stats") or {}
+                if enemy.get("name") and enemy.get("move_pattern"):
+                    changed |= self.observe(enemy["name"], enemy["move_pattern"], record.get("enemy_id"),
+                                            record.get("enemy_health"))
+        return changed
+
+    def entities(self) -> List[Dict]:
+        """All enemies in GigaverseCalculator.enemies["entities"] form, under their latest ID"""
+        self._load()
+        latest_id = {index: enemy_id for enemy_id, index in self.by_id.items()}
+        return [{
+            "ID_CID": latest_id.get(index, enemy["name"]),
+            "NAME_CID": enemy["name"],
+            "MOVE_STATS_CID_array": enemy["move_pattern"],
+            "EQUIPMENT_HEAD_CID": enemy["equipment_head"],
+            "EQUIPMENT_BODY_CID": enemy["equipment_body"]
+        } for index, enemy in enumerate(self.enemies)]
+
+    def save(self):
+        """Write the catalog atomically, one column per field"""
+        self._load()
+        if self.path is None:
+            return
+        fields = ("name", "move_pattern", "max_health", "room", "floor", "equipment_head", "equipment_body")
+        data = {
+            "version": CATALOG_VERSION,
+            "updated_at": self.updated_at,
+            "dungeons": self.dungeons,
+            "enemies": {field: [enemy[field] for enemy in self.enemies] for field in fields},
+            "ids": self.by_id,
+        }
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(data, f, separators=(",", ":"))
+        os.replace(temp_path, self.path)
+
+
+def build_catalog(sources: Iterable[str],
+                  path: str = DEFAULT_CATALOG_PATH,
+                  docs_directory: str = DEFAULT_DOCS_DIR) -> EnemyCatalog:
+    """Add every enemy in the given history/payload files to the catalog at path"""
+    catalog = EnemyCatalog(path, docs_directory=docs_directory)
+    catalog._load()
+    catalog.dungeons = parse_dungeon_docs(docs_directory) or catalog.dungeons
+    catalog.observe_history(sources)
+    catalog.save()
+    return catalog
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build the enemy catalog from the docs and recorded payloads")
+    parser.add_argument("sources", nargs="*", default=["game_history", "game_history.json"],
+                        help="history journal directories, history JSON files or raw payload lists")
+    parser.add_argument("--out", default=DEFAULT_CATALOG_PATH)
+    parser.add_argument("--docs", default=DEFAULT_DOCS_DIR)
+    args = parser.parse_args()
+
+    built = build_catalog(args.sources, args.out, args.docs)
+    for dungeon in built.dungeons:
+        print(f"{dungeon['name']}: {dungeon}")
+    for enemy in built.roster():
+        print(f"{enemy['name']:<16} floor {enemy['floor']}  HP {enemy['max_health']}  {enemy['move_pattern']}")
@@ -0,0 +1,195 @@
+import json
+import os
+from collections import deque
+from typing import Deque, Dict, Iterable, List, Optional, Sequence
+
+from gigaverse_calculator import API_MOVES, MOVES, attack_prior
+from history_journal import iter_history, state_signature
+
+SKILL_MOVES = {"sword": "Sword", "shield": "Shield", "spell": "Spell"}
+DEFAULT_MODEL_PATH = "enemy_model.json"
+
+
+def _move_name(move: Optional[str]) -> Optional[str]:
+    """Accept game names ("Sword") as well as API names ("rock")"""
+    if move in MOVES:
+        return move
+    return API_MOVES.get(move)
+
+
+class EnemyModel:
+    """
+    Per-enemy Markov model of the enemy's next move.
+
+    For each enemy name it counts which move followed each context, where a
+    context is the enemy's previous `order` moves. Predictions back off from
+    the context counts to the enemy's overall move counts, and from those to
+    attack_prior(), odds in proportion to the enemy's ATK for each move.
+    observe() and predict() are a handful of dict lookups, cheap enough for
+    the poll loop.
+    """
+
+    def __init__(self, order: int = 1, context_weight: float = 3.0, prior_weight: float = 3.0):
+        self.order = order
+        self.context_weight = context_weight
+        self.prior_weight = prior_weight
+        # counts[enemy][context] -> [sword, shield, spell]; context "" holds overall counts
+        self.counts: Dict[str, Dict[str, List[int]]] = {}
+        self.recent: Dict[str, Deque[str]] = {}
+        self.dirty = False
+
+    def _context(self, moves: Sequence[str]) -> str:
+        return ",".join(list(moves)[-self.order:]) if len(moves) >= self.order else ""
+
+    @staticmethod
+    def _stream_key(enemy: str, stream: Optional[str]) -> str:
+        return enemy if stream is None else f"{stream}:{enemy}"
+
+    def observe(self, enemy: str, move: str, stream: Optional[str] = None):
+        """
+        Record that `enemy` just played `move`
+
+        `stream` keeps separate recent-move sequences for fights that run at
+        the same time (e.g. one per account); the counts are shared.
+        """
+        move = _move_name(move)
+        if move is None:
+            return
+        recent = self.recent.setdefault(self._stream_key(enemy, stream), deque(maxlen=self.order))
+        tables = self.counts.setdefault(enemy, {})
+        index = MOVES.index(move)
+        tables.setdefault("", [0, 0, 0])[index] += 1
+        context = self._context(recent)
+        if context:
+            tables.setdefault(context, [0, 0, 0])[index] += 1
+        recent.append(move)
+        self.dirty = True
+
+    def reset_sequence(self, enemy: str, stream: Optional[str] = None):
+        """Forget the recent moves, e.g. when a new fight with this enemy starts"""
+        self.recent.pop(self._stream_key(enemy, stream), None)
+
+    def sequence(self, enemy: str, stream: Optional[str] = None) -> List[str]:
+        """The recent moves predictions for `enemy` are based on"""
+        return list(self.recent.get(self._stream_key(enemy, stream), ()))
+
+    def restore_sequence(self, enemy: str, moves: Sequence[str], stream: Optional[str] = None):
+        """Set the recent moves, e.g. from a session checkpoint, without counting them again"""
+        moves = [m for m in (_move_name(m) for m in moves) if m]
+        self.recent[self._stream_key(enemy, stream)] = deque(moves, maxlen=self.order)
+
+    def predict(self,
+                enemy: str,
+                move_pattern: Optional[Sequence[int]] = None,
+                last_moves: Optional[Sequence[str]] = None,
+                stream: Optional[str] = None) -> List[float]:
+        """
+        Probabilities of [Sword, Shield, Spell] for the enemy's next move
+
+        last_moves defaults to the moves observed for this enemy (in `stream`) so far.
+        """
+        prior = attack_prior(move_pattern)
+
+        tables = self.counts.get(enemy)
+        if not tables:
+            return prior
+        overall = tables.get("", [0, 0, 0])
+        overall_total = sum(overall)
+        base = [(c + self.prior_weight * p) / (overall_total + self.prior_weight) for c, p in zip(overall, prior)]
+
+        moves = [m for m in (_move_name(m) for m in last_moves) if m] if last_moves is not None \
+            else list(self.recent.get(self._stream_key(enemy, stream), ()))
+        counts = tables.get(self._context(moves)) if moves else None
+        if not counts:
+            return base
+        context_total = sum(counts)
+        return [(c + self.context_weight * b) / (context_total + self.context_weight) for c, b in zip(counts, base)]
+
+    def to_dict(self) -> Dict:
+        return {
+            "order": self.order,
+            "context_weight": self.context_weight,
+            "prior_weight": self.prior_weight,
+            "counts": self.counts
+        }
+
+    def save(self, path: str = DEFAULT_MODEL_PATH):
+        """Write the model atomically so a crash never leaves half a file"""
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(self.to_dict(), f)
+        os.replace(temp_path, path)
+        self.dirty = False
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_MODEL_PATH) -> "EnemyModel":
+        with open(path, "r") as f:
+            data = json.load(f)
+        model = cls(data.get("order", 1), data.get("context_weight", 3.0), data.get("prior_weight", 3.0))
+        model.counts = data.get("counts", {})
+        return model
+
+    def bootstrap(self, records: Iterable[Dict]) -> int:
+        """
+        Learn from recorded history; returns the number of moves observed
+
+        Uses last_enemy_move from polled snapshots (one observation per
+        distinct round) and enemy_action from game_history_enhanced.json
+        style action_history entries. Sequences restart for every room.
+        """
+        observed = 0
+        previous_signature = None
+        previous_room = None
+        for record in records:
+            enemy = (record.get("enemy_stats") or {}).get("name")
+            if not enemy:
+                continue
+            room = (record.get("enemy_id"), enemy)
+            if room != previous_room:
+                self.reset_sequence(enemy)
+                previous_room = room
+
+            for action in record.get("action_history", []):
+                skill = str((action.get("enemy_action") or {}).get("skill", "")).split("_")[0]
+                if skill in SKILL_MOVES:
+                    self.observe(enemy, SKILL_MOVES[skill])
+                    observed += 1
+
+            signature = state_signature(record)
+            if signature != previous_signature and _move_name(record.get("last_enemy_move")):
+                self.observe(enemy, record["last_enemy_move"])
+                observed += 1
+            previous_signature = signature
+        return observed
+
+
+def load_or_bootstrap(path: str = DEFAULT_MODEL_PATH, sources: Iterable[str] = ()) -> EnemyModel:
+    """Load the saved model, or build one from the given history sources"""
+    if os.path.exists(path):
+        return EnemyModel.load(path)
+    model = EnemyModel()
+    for source in sources:
+        if os.path.exists(source):
+            model.bootstrap(iter_history(source))
+    model.recent.clear()
+    return model
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build the enemy move model from recorded history")
+    parser.add_argument("sources", nargs="*", default=["game_history", "game_history_enhanced.json"],
+                        help="history journal directories or JSON history files")
+    parser.add_argument("--out", default=DEFAULT_MODEL_PATH)
+    parser.add_argument("--order", type=int, default=1, help="number of previous moves per context")
+    args = parser.parse_args()
+
+    enemy_model = EnemyModel(order=args.order)
+    total = 0
+    for source in args.sources:
+        if os.path.exists(source):
+            total += enemy_model.bootstrap(iter_history(source))
+    enemy_model.recent.clear()
+    enemy_model.save(args.out)
+    print(f"Learned from {total} enemy moves across {len(enemy_model.counts)} enemies -> {args.out}")
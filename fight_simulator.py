@@ -0,0 +1,243 @@
+from typing import Callable, Dict, Optional
+
+import numpy as np
+
+from fight_solver import build_damage_table, enemy_odds_table
+from gigaverse_calculator import MOVES, NO_MOVE, encode_move
+
+# A policy picks one move index per lane: policy(lanes, legal, rng) -> int array.
+# `lanes` maps field names to the live per-lane arrays and `legal` is an
+# (n, 3) bool array of the moves each lane can play this round.
+Policy = Callable[[Dict[str, np.ndarray], np.ndarray, np.random.Generator], np.ndarray]
+
+
+def _sample(weights: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    """Draw one column index per row of a non-negative (n, k) weight matrix"""
+    cumulative = np.cumsum(weights, axis=1)
+    draws = rng.random(len(weights)) * cumulative[:, -1]
+    return (cumulative <= draws[:, None]).sum(axis=1).clip(max=weights.shape[1] - 1)
+
+
+def uniform_policy(lanes: Dict[str, np.ndarray], legal: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    """Play any legal move with equal probability"""
+    return _sample(legal.astype(np.float64), rng)
+
+
+def priority_policy(order) -> Policy:
+    """Always play the first legal move in `order` (move names)"""
+    ranks = np.array([len(MOVES) - order.index(m) if m in order else 0 for m in MOVES], dtype=np.int8)
+
+    def policy(lanes: Dict[str, np.ndarray], legal: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+        return np.argmax(np.where(legal, ranks, -1), axis=1)
+
+    return policy
+
+
+class SimulationResult:
+    def __init__(self,
+                 fights: int,
+                 wins: int,
+                 losses: int,
+                 player_health: np.ndarray,
+                 enemy_health: np.ndarray,
+                 rounds: np.ndarray):
+        self.fights = fights
+        self.wins = wins
+        self.losses = losses
+        self.unfinished = fights - wins - losses
+        self.win_probability = wins / fights if fights else 0.0
+        self.expected_player_health = float(np.clip(player_health, 0, None).mean()) if fights else 0.0
+        self.player_health_std = float(np.clip(player_health, 0, None).std()) if fights else 0.0
+        self.expected_enemy_health = float(np.clip(enemy_health, 0, None).mean()) if fights else 0.0
+        # round_counts[r] is the number of fights that ended after r rounds
+        self.round_counts = np.bincount(rounds, minlength=1)
+
+    @property
+    def win_probability_error(self) -> float:
+        """Half-width of the 95% confidence interval on win_probability"""
+        if not self.fights:
+            return 0.0
+        p = self.win_probability
+        return 1.96 * (p * (1 - p) / self.fights) ** 0.5
+
+    @property
+    def expected_rounds(self) -> float:
+        total = self.round_counts.sum()
+        return float((np.arange(len(self.round_counts)) * self.round_counts).sum() / total) if total else 0.0
+
+    def round_percentile(self, q: float) -> int:
+        """Smallest round count covering a q (0-1) share of the fights"""
+        cumulative = np.cumsum(self.round_counts)
+        return int(np.searchsorted(cumulative, q * cumulative[-1]))
+
+    def to_dict(self) -> Dict:
+        return {
+            "fights": self.fights,
+            "wins": self.wins,
+            "losses": self.losses,
+            "unfinished": self.unfinished,
+            "win_probability": self.win_probability,
+            "win_probability_error": self.win_probability_error,
+            "expected_player_health": self.expected_player_health,
+            "player_health_std": self.player_health_std,
+            "expected_enemy_health": self.expected_enemy_health,
+            "expected_rounds": self.expected_rounds,
+            "round_counts": self.round_counts.tolist()
+        }
+
+
+class FightSimulator:
+    """
+    Runs many copies of one fight at once as NumPy arrays.
+
+    Each lane holds one fight's health, charges, cooldowns and last moves.
+    Every round the policy picks the player's moves, enemy moves are drawn
+    from the calculator's enemy odds after the lane's last enemy move,
+    over the enemy's legal moves (as in ExpectimaxSolver),
+    and damage and charges are looked up from tables built through
+    GigaverseCalculator._calculate_damage and _advance_charges, so lanes
+    follow the same rules as update_fight_state. Finished lanes are dropped
+    so late rounds only pay for fights that are still going.
+    """
+
+    def __init__(self,
+                 calculator,
+                 max_rounds: int = 100,
+                 max_charges: int = 3,
+                 seed: Optional[int] = None):
+        self.calculator = calculator
+        self.max_rounds = max_rounds
+        self.max_charges = max_charges
+        self.rng = np.random.default_rng(seed)
+
+    def _damage_arrays(self, fight_state):
+        """(dealt, taken) arrays indexed [player move, enemy move, last player, last enemy]"""
+        table = build_damage_table(self.calculator, fight_state.player_skills, fight_state.enemy_stats)
+        size = (len(MOVES), len(MOVES), NO_MOVE + 1, NO_MOVE + 1)
+        dealt = np.zeros(size, dtype=np.int32)
+        taken = np.zeros(size, dtype=np.int32)
+        for key, (player_damage, enemy_damage) in table.items():
+            dealt[key] = player_damage
+            taken[key] = enemy_damage
+        return dealt, taken
+
+    def _charge_arrays(self):
+        """
+        Next charge count for a move that was used / rested, indexed by
+        current charges + 1 (charges run from -1 to max_charges)
+        """
+        counts = range(-1, self.max_charges + 1)
+        used = []
+        rested = []
+        for count in counts:
+            after_use, _ = self.calculator._advance_charges({"used": count, "rested": count},
+                                                            {}, "used", self.max_charges)
+            used.append(after_use["used"])
+            rested.append(after_use["rested"])
+        return np.array(used, dtype=np.int8), np.array(rested, dtype=np.int8)
+
+    def _lanes(self, fight_state, n_fights: int) -> Dict[str, np.ndarray]:
+        def repeat(values, dtype=np.int8):
+            return np.tile(np.array(values, dtype=dtype), (n_fights, 1))
+
+        lanes = {
+            "player_health": np.full(n_fights, fight_state.player_health, dtype=np.int32),
+            "enemy_health": np.full(n_fights, fight_state.enemy_health, dtype=np.int32),
+            "player_charges": repeat([fight_state.player_move_charges[m] for m in MOVES]),
+            "player_cooldowns": repeat([fight_state.player_move_cooldowns[m] for m in MOVES]),
+            "enemy_charges": repeat([fight_state.enemy_move_charges[m] for m in MOVES]),
+            "enemy_cooldowns": repeat([fight_state.enemy_move_cooldowns[m] for m in MOVES]),
+            "last_player_move": np.full(n_fights, encode_move(fight_state.last_player_move), dtype=np.int8),
+            "last_enemy_move": np.full(n_fights, encode_move(fight_state.last_enemy_move), dtype=np.int8),
+        }
+        for side in ("player_charges", "enemy_charges"):
+            np.clip(lanes[side], -1, self.max_charges, out=lanes[side])
+        return lanes
+
+    @staticmethod
+    def _legal(charges: np.ndarray, cooldowns: np.ndarray) -> np.ndarray:
+        legal = (charges > 0) & (cooldowns <= 0)
+        # A side with nothing playable may use any move, as the solver assumes for the enemy
+        legal[~legal.any(axis=1)] = True
+        return legal
+
+    def simulate(self,
+                 fight_state,
+                 policy: Optional[Policy] = None,
+                 n_fights: int = 100_000,
+                 first_move: Optional[str] = None) -> SimulationResult:
+        """
+        Play n_fights copies of the fight to the end (or max_rounds)
+
+        Args:
+            policy: Chooses the player's moves; defaults to uniform_policy.
+            first_move: Force this move in the first round, e.g. to estimate
+                the win chance of playing it now.
+        """
+        policy = policy or uniform_policy
+        dealt_table, taken_table = self._damage_arrays(fight_state)
+        after_use, after_rest = self._charge_arrays()
+        # Enemy odds by last enemy move, NO_MOVE row included
+        odds = np.array(enemy_odds_table(self.calculator, fight_state.enemy_stats), dtype=np.float64).clip(min=0)
+        columns = np.arange(len(MOVES))
+
+        lanes = self._lanes(fight_state, n_fights)
+        lane_ids = np.arange(n_fights)
+        final_player = np.empty(n_fights, dtype=np.int32)
+        final_enemy = np.empty(n_fights, dtype=np.int32)
+        rounds = np.full(n_fights, self.max_rounds, dtype=np.int32)
+
+        for round_index in range(self.max_rounds):
+            if not len(lane_ids):
+                break
+            player_legal = self._legal(lanes["player_charges"], lanes["player_cooldowns"])
+            if round_index == 0 and first_move is not None:
+                player_moves = np.full(len(lane_ids), MOVES.index(first_move))
+            else:
+                player_moves = policy(lanes, player_legal, self.rng)
+
+            enemy_legal = self._legal(lanes["enemy_charges"], lanes["enemy_cooldowns"])
+            enemy_weights = np.where(enemy_legal, odds[lanes["last_enemy_move"]], 0.0)
+            no_weight = enemy_weights.sum(axis=1) <= 0
+            enemy_weights[no_weight] = enemy_legal[no_weight]
+            enemy_moves = _sample(enemy_weights, self.rng)
+
+            index = (player_moves, enemy_moves, lanes["last_player_move"], lanes["last_enemy_move"])
+            lanes["enemy_health"] -= dealt_table[index]
+            lanes["player_health"] -= taken_table[index]
+
+            for side, moves in (("player", player_moves), ("enemy", enemy_moves)):
+                charges = lanes[f"{side}_charges"]
+                used = columns == moves[:, None]
+                lanes[f"{side}_charges"] = np.where(used, after_use[charges + 1], after_rest[charges + 1])
+                np.maximum(lanes[f"{side}_cooldowns"] - 1, 0, out=lanes[f"{side}_cooldowns"])
+            lanes["last_player_move"] = player_moves.astype(np.int8)
+            lanes["last_enemy_move"] = enemy_moves.astype(np.int8)
+
+            done = (lanes["player_health"] <= 0) | (lanes["enemy_health"] <= 0)
+            if done.any():
+                finished = lane_ids[done]
+                final_player[finished] = lanes["player_health"][done]
+                final_enemy[finished] = lanes["enemy_health"][done]
+                rounds[finished] = round_index + 1
+                alive = ~done
+                lane_ids = lane_ids[alive]
+                lanes = {name: values[alive] for name, values in lanes.items()}
+
+        final_player[lane_ids] = lanes["player_health"]
+        final_enemy[lane_ids] = lanes["enemy_health"]
+        wins = int(((final_enemy <= 0) & (final_player > 0)).sum())
+        losses = int((final_player <= 0).sum())
+        return SimulationResult(n_fights, wins, losses, final_player, final_enemy, rounds)
+
+    def win_chance_per_move(self,
+                            fight_state,
+                            policy: Optional[Policy] = None,
+                            n_fights: int = 20_000) -> Dict[str, Optional[SimulationResult]]:
+        """Simulate the fight once per playable opening move (None if unplayable)"""
+        results = {}
+        for move in MOVES:
+            playable = (fight_state.player_move_charges[move] > 0
+                        and fight_state.player_move_cooldowns[move] <= 0)
+            results[move] = self.simulate(fight_state, policy, n_fights, move) if playable else None
+        return results
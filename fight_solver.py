@@ -0,0 +1,331 @@
+import time
+from collections import OrderedDict
+from types import SimpleNamespace
+from typing import Dict, Hashable, List, Optional, Tuple
+
+from gigaverse_calculator import MOVES, NO_MOVE, encode_move
+
+
+def encode_fight_state(fight_state) -> Tuple:
+    """
+    Hashable encoding of the parts of a FightState that affect the outcome:
+    (player HP, enemy HP, player charges, player cooldowns, enemy charges,
+    enemy cooldowns, last player move, last enemy move)
+    """
+    return (
+        fight_state.player_health,
+        fight_state.enemy_health,
+        tuple(fight_state.player_move_charges[m] for m in MOVES),
+        tuple(fight_state.player_move_cooldowns[m] for m in MOVES),
+        tuple(fight_state.enemy_move_charges[m] for m in MOVES),
+        tuple(fight_state.enemy_move_cooldowns[m] for m in MOVES),
+        encode_move(fight_state.last_player_move),
+        encode_move(fight_state.last_enemy_move),
+    )
+
+
+def build_damage_table(calculator, player_skills, enemy_stats) -> Dict[Tuple[int, int, int, int], Tuple[int, int]]:
+    """
+    Resolve every (player move, enemy move, last player move, last enemy move)
+    combination through calculator._calculate_damage once.
+
+    Returns a dict mapping those move indices (NO_MOVE for no last move) to
+    (damage dealt to the enemy, damage taken by the player).
+    """
+    last_moves = MOVES + (None,)
+    damage = {}
+    for last_player in range(len(last_moves)):
+        for last_enemy in range(len(last_moves)):
+            probe = SimpleNamespace(
+                player_skills=player_skills,
+                enemy_stats=enemy_stats,
+                last_player_move=last_moves[last_player],
+                last_enemy_move=last_moves[last_enemy],
+            )
+            for p, player_move in enumerate(MOVES):
+                for e, enemy_move in enumerate(MOVES):
+                    damage[(p, e, last_player, last_enemy)] = (
+                        calculator._calculate_damage(player_move, enemy_move, probe),
+                        calculator._calculate_damage(enemy_move, player_move, probe),
+                    )
+    return damage
+
+
+def enemy_odds_table(calculator, enemy_stats) -> Tuple[Tuple[float, ...], ...]:
+    """
+    calculator.enemy_move_odds() after each possible last enemy move,
+    indexed by encode_move(); the NO_MOVE row is the enemy's odds with no
+    recognised last move
+    """
+    return tuple(tuple(calculator.enemy_move_odds(enemy_stats, [MOVES[last]] if last < NO_MOVE else []))
+                 for last in range(NO_MOVE + 1))
+
+
+def enemy_move_distribution(odds, charges: Tuple, cooldowns: Tuple) -> List[Tuple[int, float]]:
+    """
+    (move index, probability) pairs for the enemy's next move
+
+    odds are [Sword, Shield, Spell] probabilities, e.g. a row of
+    enemy_odds_table(), renormalised over the moves the enemy can play.
+    With nothing playable every move is allowed; with no weight left the
+    playable moves are equally likely.
+    """
+    legal = [i for i in range(len(MOVES)) if cooldowns[i] <= 0 and charges[i] > 0] or list(range(len(MOVES)))
+    weights = [max(0, odds[i]) if i < len(odds) else 0 for i in legal]
+    total = sum(weights)
+    if total <= 0:
+        return [(i, 1.0 / len(legal)) for i in legal]
+    return [(i, w / total) for i, w in zip(legal, weights) if w > 0]
+
+
+class TranspositionTable:
+    """Bounded LRU map from search states to (value, depth, exact) entries"""
+
+    def __init__(self, max_entries: int = 500_000):
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[Hashable, Tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[Tuple]:
+        value = self.entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return value
+
+    def put(self, key: Hashable, value: Tuple):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+
+class _SearchTimeout(Exception):
+    pass
+
+
+class ExpectimaxSolver:
+    """
+    Plays a fight out turn by turn instead of scoring a single ply.
+
+    Every turn is a max node over the player's legal moves followed by a
+    chance node over the enemy's legal moves, weighted by the calculator's
+    enemy odds given the enemy's last move. Damage comes from
+    GigaverseCalculator._calculate_damage and charges from
+    GigaverseCalculator._advance_charges, so a search step applies exactly
+    what update_fight_state would. Values are win probabilities; positions
+    cut off by the depth limit are scored by each side's share of the
+    remaining health.
+
+    Internally a position is (player HP, enemy HP, context id), where the
+    context id interns everything else (charges, cooldowns, last moves).
+    Health is the only part that varies freely, so each context is expanded
+    into its successor contexts once and then reused at every HP.
+    """
+
+    def __init__(self,
+                 calculator,
+                 max_depth: int = 12,
+                 time_budget: float = 1.5,
+                 table_size: int = 500_000):
+        self.calculator = calculator
+        self.max_depth = max_depth
+        self.time_budget = time_budget
+        self.table = TranspositionTable(table_size)
+        self.completed_depth = 0
+        # Whether the last search saw every line end, so its values hold at any depth
+        self.exact = False
+        self.nodes = 0
+        self._rules_key = None
+        self._odds = None
+        self._damage = {}
+        self._context_ids: Dict[Tuple, int] = {}
+        self._contexts: List[Tuple] = []
+        self._expansions: List[Optional[Tuple]] = []
+        # Charge rules don't depend on stats, so these survive _prepare()
+        self._advances: Dict[Tuple, Tuple[Tuple, Tuple]] = {}
+        self._deadline = None
+
+    def _prepare(self, fight_state, odds: Optional[Tuple] = None) -> bool:
+        """
+        (Re)build the rule tables when the fighters' stats or the enemy odds
+        change; True when they were rebuilt. odds is an enemy_odds_table(),
+        by default the calculator's current one.
+        """
+        skills = fight_state.player_skills
+        enemy = fight_state.enemy_stats
+        odds = odds or enemy_odds_table(self.calculator, enemy)
+        rules_key = (
+            skills.sword_atk, skills.sword_def, skills.shield_atk,
+            skills.shield_def, skills.spell_atk, skills.spell_def,
+            tuple(enemy.move_pattern), odds,
+        )
+        if rules_key == self._rules_key:
+            return False
+        self._rules_key = rules_key
+        self._odds = odds
+        self.table.clear()
+        self._context_ids.clear()
+        self._contexts.clear()
+        self._expansions.clear()
+
+        self._damage = build_damage_table(self.calculator, skills, enemy)
+        return True
+
+    def _context_id(self, context: Tuple) -> int:
+        context_id = self._context_ids.get(context)
+        if context_id is None:
+            context_id = len(self._contexts)
+            self._context_ids[context] = context_id
+            self._contexts.append(context)
+            self._expansions.append(None)
+        return context_id
+
+    def _advance(self, charges: Tuple, cooldowns: Tuple, move: int) -> Tuple[Tuple, Tuple]:
+        key = (charges, cooldowns, move)
+        advanced = self._advances.get(key)
+        if advanced is None:
+            new_charges, new_cooldowns = self.calculator._advance_charges(
+                dict(zip(MOVES, charges)), dict(zip(MOVES, cooldowns)), MOVES[move]
+            )
+            advanced = self._advances[key] = (tuple(new_charges[m] for m in MOVES),
+                                              tuple(new_cooldowns[m] for m in MOVES))
+        return advanced
+
+    @staticmethod
+    def _legal_moves(charges: Tuple, cooldowns: Tuple) -> List[int]:
+        return [i for i in range(len(MOVES)) if cooldowns[i] <= 0 and charges[i] > 0]
+
+    def _expand(self, context_id: int) -> Tuple:
+        """
+        Successors of a context: for each legal player move, a tuple of
+        (probability, damage dealt, damage taken, next context id)
+        """
+        expansion = self._expansions[context_id]
+        if expansion is None:
+            pc, pcd, ec, ecd, last_player, last_enemy = self._contexts[context_id]
+            enemy_odds = enemy_move_distribution(self._odds[last_enemy], ec, ecd)
+            expansion = []
+            for player_move in self._legal_moves(pc, pcd):
+                next_pc, next_pcd = self._advance(pc, pcd, player_move)
+                outcomes = []
+                for enemy_move, prob in enemy_odds:
+                    dealt, taken = self._damage[(player_move, enemy_move, last_player, last_enemy)]
+                    next_ec, next_ecd = self._advance(ec, ecd, enemy_move)
+                    child = self._context_id((next_pc, next_pcd, next_ec, next_ecd, player_move, enemy_move))
+                    outcomes.append((prob, dealt, taken, child))
+                expansion.append((player_move, tuple(outcomes)))
+            expansion = tuple(expansion)
+            self._expansions[context_id] = expansion
+        return expansion
+
+    @staticmethod
+    def _leaf_value(player_health: int, enemy_health: int) -> float:
+        if enemy_health <= 0:
+            return 1.0 if player_health > 0 else 0.0
+        if player_health <= 0:
+            return 0.0
+        return player_health / (player_health + enemy_health)
+
+    def _move_value(self,
+                    player_health: int,
+                    enemy_health: int,
+                    outcomes: Tuple,
+                    depth: int) -> Tuple[float, bool]:
+        value = 0.0
+        exact = True
+        for prob, dealt, taken, child in outcomes:
+            child_value, child_exact = self._value(player_health - taken, enemy_health - dealt, child, depth - 1)
+            value += prob * child_value
+            exact = exact and child_exact
+        return value, exact
+
+    def _value(self, player_health: int, enemy_health: int, context_id: int, depth: int) -> Tuple[float, bool]:
+        """Return (value, exact); exact values reached only terminal positions"""
+        if player_health <= 0 or enemy_health <= 0:
+            return self._leaf_value(player_health, enemy_health), True
+        if depth <= 0:
+            return self._leaf_value(player_health, enemy_health), False
+
+        # Exact values hold at any depth; estimates only when searched at least as deep
+        key = (player_health, enemy_health, context_id)
+        cached = self.table.get(key)
+        if cached is not None and (cached[2] or cached[1] >= depth):
+            return cached[0], cached[2]
+
+        self.nodes += 1
+        if self._deadline is not None and not self.nodes & 0x3FF and time.perf_counter() > self._deadline:
+            raise _SearchTimeout()
+
+        expansion = self._expand(context_id)
+        if not expansion:
+            # Nothing playable this turn: let the position stand as it is
+            value, exact = self._leaf_value(player_health, enemy_health), False
+        else:
+            value, exact = float('-inf'), True
+            for _, outcomes in expansion:
+                move_value, move_exact = self._move_value(player_health, enemy_health, outcomes, depth)
+                if move_value > value:
+                    value = move_value
+                exact = exact and move_exact
+
+        self.table.put(key, (value, depth, exact))
+        return value, exact
+
+    def move_values(self, fight_state, depth: Optional[int] = None) -> Dict[str, float]:
+        """
+        Search the fight and return the win probability of each move
+
+        Iteratively deepens up to max_depth (or the given depth) and keeps the
+        result of the deepest search that finished inside the time budget.
+        Moves that cannot be played are reported as -inf.
+        """
+        self._prepare(fight_state)
+        root = encode_fight_state(fight_state)
+        player_health, enemy_health = root[0], root[1]
+        expansion = self._expand(self._context_id(root[2:]))
+        values = {move: float('-inf') for move in MOVES}
+        self.completed_depth = 0
+        self.exact = not expansion
+        self.nodes = 0
+        if not expansion:
+            return values
+
+        max_depth = depth or self.max_depth
+        self._deadline = time.perf_counter() + self.time_budget if self.time_budget else None
+        try:
+            for current_depth in range(1, max_depth + 1):
+                exact = True
+                iteration = {}
+                for move, outcomes in expansion:
+                    iteration[MOVES[move]], move_exact = self._move_value(
+                        player_health, enemy_health, outcomes, current_depth
+                    )
+                    exact = exact and move_exact
+                values.update(iteration)
+                self.completed_depth = current_depth
+                if exact:
+                    # Every line ends in a win or a loss; deeper search changes nothing
+                    self.exact = True
+                    break
+        except _SearchTimeout:
+            pass
+        finally:
+            self._deadline = None
+        return values
+
+    def best_move(self, fight_state, depth: Optional[int] = None) -> Tuple[str, float]:
+        """Return (best move, win probability) from a full search"""
+        values = self.move_values(fight_state, depth)
+        return max(values.items(), key=lambda x: x[1])
@@ -1,15 +1,181 @@
-import requests
+import copy
 import json
-from typing import Dict, List, Tuple, Optional
-from dotenv import load_dotenv
+import argparse
+from typing import Dict, List, Sequence, Tuple, Optional
 import os
 import time
+from history_journal import DEFAULT_JOURNAL_DIR, HistoryJournal, migrate_json_history
+from tick_metrics import TickMetrics
+
+# Reference point for measuring cold start to the first recommendation
+STARTED_AT = time.perf_counter()
+
+
+def auth_headers(bearer_token: Optional[str] = None) -> Dict[str, str]:
+    """Bearer auth for a token, by default GIGAVERSE_BEARER (reading .env when it is first needed)"""
+    if bearer_token is None:
+        from dotenv import load_dotenv
+        load_dotenv()
+        bearer_token = os.getenv("GIGAVERSE_BEARER")
+    return {"Authorization": f"Bearer {bearer_token}"} if bearer_token else {}
+
+# The API names moves after rock/paper/scissors
+API_MOVES = {"rock": "Sword", "paper": "Shield", "scissor": "Spell"}
+
+# Moves are stored as small ints. Codes 0-2 follow MOVES and NO_MOVE means
+# no move; any other label (e.g. the API's "rock", or "") is interned after
+# them so it still round-trips through to_dict().
+MOVES = ("Sword", "Shield", "Spell")
+NO_MOVE = len(MOVES)
+MOVE_INDEX = {move: i for i, move in enumerate(MOVES)}
+_move_names: List[Optional[str]] = list(MOVES) + [None]
+_move_codes: Dict[Optional[str], int] = {name: code for code, name in enumerate(_move_names)}
+
+
+def move_code(move: Optional[str]) -> int:
+    """Integer code for a move label, interning labels seen for the first time"""
+    code = _move_codes.get(move)
+    if code is None:
+        code = _move_codes[move] = len(_move_names)
+        _move_names.append(move)
+    return code
+
+
+def move_name(code: int) -> Optional[str]:
+    return _move_names[code]
+
+
+def encode_move(move: Optional[str]) -> int:
+    """Index of a move in MOVES, NO_MOVE for anything else (e.g. the API's "rock")"""
+    return MOVE_INDEX.get(move, NO_MOVE)
+
+
+def attack_prior(move_pattern: Optional[Sequence[int]]) -> List[float]:
+    """
+    Enemy move odds before anything has been learned about the enemy:
+    [Sword, Shield, Spell] in proportion to its ATK for each move
+    (move_pattern holds ATK/DEF pairs), or all equal when it has no attack
+    """
+    pattern = list(move_pattern or ())
+    attack = [max(0, pattern[2 * i]) if 2 * i < len(pattern) else 0 for i in range(len(MOVES))]
+    total = sum(attack)
+    return [a / total for a in attack] if total else [1.0 / len(MOVES)] * len(MOVES)
+
+
+class MoveCounts(tuple):
+    """
+    Immutable per-move counters (charges or cooldowns) in MOVES order.
+
+    Indexes by move name like the dicts it replaces (counts["Sword"]) as
+    well as by position, and is hashable.
+    """
+    __slots__ = ()
+
+    def __new__(cls, counts=None, default: int = 0) -> "MoveCounts":
+        if isinstance(counts, MoveCounts):
+            return counts
+        if counts is None:
+            return tuple.__new__(cls, (default,) * len(MOVES))
+        if isinstance(counts, dict):
+            return tuple.__new__(cls, (counts.get(move, default) for move in MOVES))
+        return tuple.__new__(cls, counts)
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            key = MOVE_INDEX[key]
+        return tuple.__getitem__(self, key)
+
+    def get(self, move: str, default=None):
+        return self[move] if move in MOVE_INDEX else default
+
+    def keys(self):
+        return MOVES
+
+    def values(self):
+        return tuple(self)
+
+    def items(self):
+        return zip(MOVES, self)
+
+    def to_dict(self) -> Dict[str, int]:
+        return dict(zip(MOVES, self))
+
+    def __repr__(self) -> str:
+        return f"MoveCounts({self.to_dict()})"
+
+
+class MoveHistory:
+    """
+    Persistent (immutable, linked) list: push() returns a new history that
+    shares every earlier entry with this one, so successive fight states
+    extend their history in O(1) without copying it.
+    """
+    __slots__ = ("entry", "parent", "length")
+
+    def __init__(self, entry=None, parent: Optional["MoveHistory"] = None):
+        self.entry = entry
+        self.parent = parent
+        self.length = parent.length + 1 if parent is not None else 0
+
+    @classmethod
+    def from_iterable(cls, entries) -> "MoveHistory":
+        if isinstance(entries, MoveHistory):
+            return entries
+        history = EMPTY_HISTORY
+        for entry in entries or ():
+            history = history.push(entry)
+        return history
+
+    def push(self, entry) -> "MoveHistory":
+        return MoveHistory(entry, self)
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __bool__(self) -> bool:
+        return self.length > 0
+
+    def __iter__(self):
+        return iter(self.to_list())
+
+    def __getitem__(self, index: int):
+        if index < 0:
+            index += self.length
+        if not 0 <= index < self.length:
+            raise IndexError("move history index out of range")
+        node = self
+        for _ in range(self.length - 1 - index):
+            node = node.parent
+        return node.entry
+
+    def to_list(self) -> List:
+        entries = []
+        node = self
+        while node.length:
+            entries.append(node.entry)
+            node = node.parent
+        entries.reverse()
+        return entries
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, MoveHistory):
+            return self is other or self.to_list() == other.to_list()
+        return isinstance(other, list) and self.to_list() == other
+
+    def __hash__(self) -> int:
+        return hash(tuple(map(id, self.to_list())))
+
+    def __repr__(self) -> str:
+        return f"MoveHistory({self.to_list()})"
+
+
+EMPTY_HISTORY = MoveHistory()
 
-load_dotenv()
-BEARER_TOKEN = os.getenv("GIGAVERSE_BEARER")
-HEADERS = {"Authorization": f"Bearer {BEARER_TOKEN}"} if BEARER_TOKEN else {}
 
 class PlayerSkills:
+    __slots__ = ("sword_atk", "sword_def", "shield_atk", "shield_def",
+                 "spell_atk", "spell_def", "base_hp", "base_armor")
+
     def __init__(self, 
                  sword_atk: int = 1,
                  sword_def: int = 1,
@@ -29,6 +195,9 @@ class PlayerSkills:
         self.base_armor = base_armor
 
 class EnemyStats:
+    __slots__ = ("name", "move_pattern", "equipment_head_cid", "equipment_body_cid",
+                 "sword_atk", "sword_def", "shield_atk", "shield_def", "spell_atk", "spell_def")
+
     def __init__(self,
                  name: str,
                  move_pattern: List[int],
@@ -48,7 +217,22 @@ class EnemyStats:
         self.spell_atk = move_pattern[4]
         self.spell_def = move_pattern[5]
 
+
 class FightState:
+    """
+    One moment of a fight. Immutable and hashable: moves are stored as
+    integer codes, charges/cooldowns as MoveCounts and the move history as a
+    shared MoveHistory, so a successor state costs a handful of references.
+    Use replace() to derive a changed copy.
+
+    Two states are equal when the fight would continue identically from
+    them; round number, history and timestamp are not compared.
+    """
+    __slots__ = ("enemy_id", "enemy_health", "player_health", "player_shield",
+                 "player_skills", "enemy_stats", "last_player_code", "last_enemy_code",
+                 "player_move_charges", "player_move_cooldowns", "enemy_move_charges",
+                 "enemy_move_cooldowns", "round_number", "move_history", "move_outcomes", "timestamp")
+
     def __init__(self,
                  enemy_id: int,
                  enemy_health: int,
@@ -66,22 +250,78 @@ class FightState:
                  move_history: Optional[List[Dict[str, str]]] = None,  # Track sequence of moves
                  move_outcomes: Optional[List[Dict[str, int]]] = None,  # Track damage/healing outcomes
                  timestamp: Optional[float] = None):  # Track when move was made
-        self.enemy_id = enemy_id
-        self.enemy_health = enemy_health
-        self.player_health = player_health
-        self.player_shield = player_shield
-        self.player_skills = player_skills
-        self.enemy_stats = enemy_stats
-        self.last_player_move = last_player_move
-        self.last_enemy_move = last_enemy_move
-        self.player_move_charges = player_move_charges or {"Sword": 3, "Shield": 3, "Spell": 3}
-        self.player_move_cooldowns = player_move_cooldowns or {"Sword": 0, "Shield": 0, "Spell": 0}
-        self.enemy_move_charges = enemy_move_charges or {"Sword": 3, "Shield": 3, "Spell": 3}
-        self.enemy_move_cooldowns = enemy_move_cooldowns or {"Sword": 0, "Shield": 0, "Spell": 0}
-        self.round_number = round_number
-        self.move_history = move_history or []  # Initialize empty list for move history
-        self.move_outcomes = move_outcomes or []  # Initialize empty list for move outcomes
-        self.timestamp = timestamp or time.time()  # Current timestamp if not provided
+        init = object.__setattr__
+        init(self, "enemy_id", enemy_id)
+        init(self, "enemy_health", enemy_health)
+        init(self, "player_health", player_health)
+        init(self, "player_shield", player_shield)
+        init(self, "player_skills", player_skills)
+        init(self, "enemy_stats", enemy_stats)
+        init(self, "last_player_code", move_code(last_player_move))
+        init(self, "last_enemy_code", move_code(last_enemy_move))
+        init(self, "player_move_charges", MoveCounts(player_move_charges or None, 3))
+        init(self, "player_move_cooldowns", MoveCounts(player_move_cooldowns or None, 0))
+        init(self, "enemy_move_charges", MoveCounts(enemy_move_charges or None, 3))
+        init(self, "enemy_move_cooldowns", MoveCounts(enemy_move_cooldowns or None, 0))
+        init(self, "round_number", round_number)
+        init(self, "move_history", MoveHistory.from_iterable(move_history))
+        init(self, "move_outcomes", MoveHistory.from_iterable(move_outcomes))
+        init(self, "timestamp", timestamp or time.time())  # Current timestamp if not provided
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"FightState is immutable; use replace({name}=...)")
+
+    @property
+    def last_player_move(self) -> Optional[str]:
+        return _move_names[self.last_player_code]
+
+    @property
+    def last_enemy_move(self) -> Optional[str]:
+        return _move_names[self.last_enemy_code]
+
+    def replace(self, **changes) -> "FightState":
+        """A copy with the given constructor arguments changed; everything else is shared"""
+        fields = {
+            "enemy_id": self.enemy_id,
+            "enemy_health": self.enemy_health,
+            "player_health": self.player_health,
+            "player_shield": self.player_shield,
+            "player_skills": self.player_skills,
+            "enemy_stats": self.enemy_stats,
+            "last_player_move": self.last_player_move,
+            "last_enemy_move": self.last_enemy_move,
+            "player_move_charges": self.player_move_charges,
+            "player_move_cooldowns": self.player_move_cooldowns,
+            "enemy_move_charges": self.enemy_move_charges,
+            "enemy_move_cooldowns": self.enemy_move_cooldowns,
+            "round_number": self.round_number,
+            "move_history": self.move_history,
+            "move_outcomes": self.move_outcomes,
+            "timestamp": self.timestamp
+        }
+        fields.update(changes)
+        return FightState(**fields)
+
+    def key(self) -> Tuple:
+        """Everything that decides how the fight continues, as a flat hashable tuple"""
+        skills = self.player_skills
+        return (
+            self.enemy_id, self.player_health, self.enemy_health, self.player_shield,
+            self.last_player_code, self.last_enemy_code,
+            self.player_move_charges, self.player_move_cooldowns,
+            self.enemy_move_charges, self.enemy_move_cooldowns,
+            skills.sword_atk, skills.sword_def, skills.shield_atk, skills.shield_def,
+            skills.spell_atk, skills.spell_def, skills.base_hp, skills.base_armor,
+            (self.enemy_stats.name, tuple(self.enemy_stats.move_pattern)) if self.enemy_stats else None,
+        )
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, FightState):
+            return NotImplemented
+        return self.key() == other.key()
+
+    def __hash__(self) -> int:
+        return hash(self.key())
 
     def to_dict(self) -> Dict:
         """Convert fight state to dictionary for saving"""
@@ -112,59 +352,258 @@ class FightState:
             },
             "last_player_move": self.last_player_move,
             "last_enemy_move": self.last_enemy_move,
-            "player_move_charges": self.player_move_charges,
-            "player_move_cooldowns": self.player_move_cooldowns,
-            "enemy_move_charges": self.enemy_move_charges,
-            "enemy_move_cooldowns": self.enemy_move_cooldowns,
+            "player_move_charges": self.player_move_charges.to_dict(),
+            "player_move_cooldowns": self.player_move_cooldowns.to_dict(),
+            "enemy_move_charges": self.enemy_move_charges.to_dict(),
+            "enemy_move_cooldowns": self.enemy_move_cooldowns.to_dict(),
             "round_number": self.round_number,
-            "move_history": self.move_history,
-            "move_outcomes": self.move_outcomes,
+            "move_history": self.move_history.to_list(),
+            "move_outcomes": self.move_outcomes.to_list(),
             "timestamp": self.timestamp
         }
 
+    @classmethod
+    def from_dict(cls, data: Dict) -> "FightState":
+        """Rebuild a fight state saved with to_dict (missing fields fall back to defaults)"""
+        skills = data.get("player_skills") or {}
+        enemy = data.get("enemy_stats") or {}
+        enemy_stats = None
+        if enemy.get("move_pattern"):
+            enemy_stats = EnemyStats(
+                name=enemy.get("name"),
+                move_pattern=enemy["move_pattern"],
+                equipment_head_cid=0,
+                equipment_body_cid=0
+            )
+        return cls(
+            enemy_id=data.get("enemy_id"),
+            enemy_health=data["enemy_health"],
+            player_health=data["player_health"],
+            player_shield=data.get("player_shield", 0),
+            player_skills=PlayerSkills(**skills),
+            enemy_stats=enemy_stats,
+            last_player_move=data.get("last_player_move"),
+            last_enemy_move=data.get("last_enemy_move"),
+            player_move_charges=data.get("player_move_charges"),
+            player_move_cooldowns=data.get("player_move_cooldowns"),
+            enemy_move_charges=data.get("enemy_move_charges"),
+            enemy_move_cooldowns=data.get("enemy_move_cooldowns"),
+            round_number=data.get("round_number", 0),
+            move_history=data.get("move_history"),
+            move_outcomes=data.get("move_outcomes"),
+            timestamp=data.get("timestamp")
+        )
+
+class DungeonSnapshot:
+    """One dungeon/state response, parsed once into typed objects"""
+
+    def __init__(self,
+                 fight_state: FightState,
+                 enemy_shield: int,
+                 move_max_charges: Dict[str, int],
+                 raw: Dict,
+                 player_max_health: Optional[int] = None):
+        self.fight_state = fight_state
+        self.enemy_shield = enemy_shield
+        self.move_max_charges = move_max_charges
+        self.raw = raw
+        self.player_max_health = player_max_health or fight_state.player_health
+        # Set by the polling pipeline: whether this poll shows a new round
+        self.changed = True
+
+    @property
+    def signature(self) -> Tuple:
+        """
+        Fields that change when a round is played; repeated polls of one
+        round share them. Last moves are labels, not move_code()s, so a
+        signature saved by one process (a session checkpoint) still
+        matches in the next.
+        """
+        fs = self.fight_state
+        return (
+            fs.enemy_id, fs.enemy_stats.name, fs.player_health, fs.player_shield, fs.enemy_health,
+            fs.last_player_move, fs.last_enemy_move, fs.player_move_charges
+        )
+
+    def enemy_entity(self) -> Dict:
+        """The enemy in GigaverseCalculator.enemies["entities"] form"""
+        return {
+            "ID_CID": self.fight_state.enemy_id,
+            "NAME_CID": self.fight_state.enemy_stats.name,
+            "MOVE_STATS_CID_array": self.fight_state.enemy_stats.move_pattern,
+            "EQUIPMENT_HEAD_CID": 0,
+            "EQUIPMENT_BODY_CID": 0,
+            "HEALTH": self.fight_state.enemy_health
+        }
+
+
+def parse_dungeon_state(game_state: Optional[Dict], round_number: int = 0) -> Optional[DungeonSnapshot]:
+    """Parse a dungeon/state response; None when there is no active run"""
+    if not game_state or not game_state.get("data", {}).get("run"):
+        return None
+
+    run_data = game_state["data"]["run"]
+    players = run_data["players"]
+
+    # Identify player and enemy
+    player_data = next(p for p in players if p["id"].startswith("0x"))
+    enemy_data = next(p for p in players if not p["id"].startswith("0x"))
+
+    # Parse player stats
+    player_hp = player_data["health"]["current"]
+    player_shield = player_data["shield"]["current"]
+    player_skills = PlayerSkills(
+        sword_atk=player_data["rock"]["currentATK"],
+        sword_def=player_data["rock"]["currentDEF"],
+        shield_atk=player_data["paper"]["currentATK"],
+        shield_def=player_data["paper"]["currentDEF"],
+        spell_atk=player_data["scissor"]["currentATK"],
+        spell_def=player_data["scissor"]["currentDEF"],
+        base_hp=player_hp,
+        base_armor=player_shield
+    )
+
+    # Parse move charges
+    move_charges = {
+        "Sword": player_data["rock"]["currentCharges"],
+        "Shield": player_data["paper"]["currentCharges"],
+        "Spell": player_data["scissor"]["currentCharges"]
+    }
+    move_max_charges = {
+        "Sword": player_data["rock"]["maxCharges"],
+        "Shield": player_data["paper"]["maxCharges"],
+        "Spell": player_data["scissor"]["maxCharges"]
+    }
+
+    # Parse enemy stats
+    enemy_move_pattern = [
+        enemy_data["rock"]["currentATK"], enemy_data["rock"]["currentDEF"],
+        enemy_data["paper"]["currentATK"], enemy_data["paper"]["currentDEF"],
+        enemy_data["scissor"]["currentATK"], enemy_data["scissor"]["currentDEF"]
+    ]
+    enemy_stats = EnemyStats(
+        name=enemy_data["id"],
+        move_pattern=enemy_move_pattern,
+        equipment_head_cid=0,
+        equipment_body_cid=0
+    )
+
+    fight_state = FightState(
+        enemy_id=run_data["_id"],
+        enemy_health=enemy_data["health"]["current"],
+        player_health=player_hp,
+        player_shield=player_shield,
+        player_skills=player_skills,
+        enemy_stats=enemy_stats,
+        last_player_move=player_data.get("lastMove", ""),
+        last_enemy_move=enemy_data.get("lastMove") or None,
+        player_move_charges=move_charges,
+        round_number=round_number
+    )
+    return DungeonSnapshot(fight_state, enemy_data["shield"]["current"], move_max_charges, game_state,
+                           player_data["health"].get("currentMax"))
+
 class GigaverseCalculator:
-    def __init__(self):
-        self.enemies = self._fetch_enemies()
+    def __init__(self,
+                 enemies: Optional[Dict] = None,
+                 client=None,
+                 catalog=None,
+                 offline: bool = False):
+        # Nothing here touches the network: the API client and the enemy
+        # catalog are loaded on first use. Pass enemies (e.g. {"entities": []})
+        # to use an in-memory catalog instead of enemy_catalog.json, as
+        # offline tools do.
+        self._client = client
+        if catalog is None and enemies is not None:
+            from enemy_catalog import EnemyCatalog
+            catalog = EnemyCatalog.from_entities(enemies["entities"])
+        self.catalog = catalog
+        self._catalog_ready = False
+        self.offline = offline
         self.move_counter = {
             "Sword": "Spell",
             "Spell": "Shield",
             "Shield": "Sword"
         }
         self.move_counter_reverse = {v: k for k, v in self.move_counter.items()}
+        self.solver = None
+        self.policy_tables = None
+        self.enemy_model = None
+        # move_cache.MoveCache consulted by move_values(), if set
+        self.move_cache = None
+        # Print every raw API response (--debug)
+        self.debug = False
+        # Per-stage timings; disabled unless main() turns on an export
+        self.metrics = TickMetrics(enabled=False)
+        # Set by for_account() when several accounts share one calculator
+        self.account = None
+        self.request_headers = None
+
+    @property
+    def client(self):
+        """api_client.GigaverseClient, created on first use"""
+        if self._client is None:
+            from api_client import GigaverseClient
+            self._client = GigaverseClient(headers=auth_headers())
+        return self._client
+
+    @property
+    def enemies(self) -> Dict:
+        """Every known enemy as {"entities": [...]}, from the enemy catalog"""
+        return {"entities": self.enemy_catalog().entities()}
+
+    def enemy_catalog(self):
+        """enemy_catalog.EnemyCatalog, loaded on first use and refreshed from the API once stale"""
+        if self.catalog is None:
+            from enemy_catalog import EnemyCatalog
+            self.catalog = EnemyCatalog()
+        if not self._catalog_ready:
+            self._catalog_ready = True
+            if not (self.offline or self.catalog.is_fresh()):
+                try:
+                    fetched = self._fetch_enemies()
+                except Exception as e:
+                    print(f"Could not refresh enemy data ({e}); using the cached catalog")
+                else:
+                    self.catalog.update(fetched["entities"])
+                    self.catalog.save()
+        return self.catalog
+
+    def for_account(self, account: str, headers: Dict[str, str]) -> "GigaverseCalculator":
+        """
+        A calculator for one of several accounts polled together
+
+        It shares this calculator's HTTP client, enemy catalog, enemy model,
+        policy tables and move cache, sends `headers` with its requests, and
+        keeps its own enemy move sequence in the model. It gets its own
+        search solver: the solver's tables are cleared whenever the loadout
+        or enemy changes, so accounts sharing one would keep clearing them.
+        """
+        self.enemy_catalog()
+        session = copy.copy(self)
+        session.account = account
+        session.request_headers = headers
+        session.solver = None
+        return session
 
     def _fetch_enemies(self) -> Dict:
         """Fetch enemy data from the API"""
-        response = requests.get("https://gigaverse.io/api/game/dungeon/state", headers=HEADERS)
-        if response.status_code == 200:
-            game_state = response.json()
-            if not game_state or not game_state.get("data", {}).get("run"):
-                return {"entities": []}
-            
-            run_data = game_state["data"]["run"]
-            players = run_data["players"]
-            enemy_data = next((p for p in players if not p["id"].startswith("0x")), None)
-            
-            if not enemy_data:
-                return {"entities": []}
-                
-            return {
-                "entities": [{
-                    "ID_CID": run_data["_id"],
-                    "NAME_CID": enemy_data["id"],
-                    "MOVE_STATS_CID_array": [
-                        enemy_data["rock"]["currentATK"], enemy_data["rock"]["currentDEF"],
-                        enemy_data["paper"]["currentATK"], enemy_data["paper"]["currentDEF"],
-                        enemy_data["scissor"]["currentATK"], enemy_data["scissor"]["currentDEF"]
-                    ],
-                    "EQUIPMENT_HEAD_CID": 0,
-                    "EQUIPMENT_BODY_CID": 0
-                }]
-            }
-        else:
+        response = self.client.get("game/dungeon/state", headers=self.request_headers)
+        if response.status_code != 200:
             raise Exception(f"Failed to fetch enemy data: {response.status_code}")
+        snapshot = parse_dungeon_state(response.json())
+        return {"entities": [snapshot.enemy_entity()] if snapshot else []}
+
+    def remember_enemy(self, snapshot: DungeonSnapshot):
+        """Record a polled enemy in the catalog so get_enemy_stats can find it"""
+        if self.catalog is None:
+            from enemy_catalog import EnemyCatalog
+            self.catalog = EnemyCatalog()
+        if self.catalog.update([snapshot.enemy_entity()]) and not self.offline:
+            self.catalog.save()
 
     def fetch_player_state(self) -> PlayerSkills:
-        response = requests.get("https://gigaverse.io/api/user/me", headers=HEADERS)
+        response = self.client.get("user/me", headers=self.request_headers)
         if response.status_code != 200:
             raise Exception(f"Failed to fetch player data: {response.status_code}")
         player_data = response.json()
@@ -196,14 +635,10 @@ class GigaverseCalculator:
         )
 
     def fetch_enemy_state(self, enemy_id: int, enemy_hp: int = None, enemy_arm: int = None) -> EnemyStats:
-        enemy = next(e for e in self.enemies['entities'] if e['ID_CID'] == str(enemy_id))
+        enemy_stats = self.get_enemy_stats(enemy_id)
+        if enemy_stats is None:
+            raise Exception(f"Unknown enemy: {enemy_id}")
         # If you have a live endpoint for enemy HP/ARM, use it here
-        enemy_stats = EnemyStats(
-            name=enemy["NAME_CID"],
-            move_pattern=enemy["MOVE_STATS_CID_array"],
-            equipment_head_cid=enemy["EQUIPMENT_HEAD_CID"],
-            equipment_body_cid=enemy["EQUIPMENT_BODY_CID"]
-        )
         
         print(f"\nEnemy Stats from API:")
         print(f"Name: {enemy_stats.name}")
@@ -214,35 +649,37 @@ class GigaverseCalculator:
         return enemy_stats
 
     def get_enemy_stats(self, enemy_id: int) -> Optional[EnemyStats]:
-        """Get the stats for a specific enemy"""
-        enemy = next((e for e in self.enemies["entities"] if e["ID_CID"] == str(enemy_id)), None)
-        if enemy:
-            return EnemyStats(
-                name=enemy["NAME_CID"],
-                move_pattern=enemy["MOVE_STATS_CID_array"],
-                equipment_head_cid=enemy["EQUIPMENT_HEAD_CID"],
-                equipment_body_cid=enemy["EQUIPMENT_BODY_CID"]
-            )
-        return None
+        """Get the (shared) stats for an enemy by ID or name"""
+        return self.enemy_catalog().stats(enemy_id)
 
-    def calculate_best_move(self, fight_state: FightState) -> Tuple[str, float]:
+    def calculate_best_move(self, fight_state: FightState, search: bool = False) -> Tuple[str, float]:
         """
         Calculate the best move based on current game state
         
+        Args:
+            search: Play the fight out with the expectimax solver instead of
+                scoring one turn ahead. Values are then win probabilities,
+                and a policy table covering the state answers instead.
+        
         Returns:
-            Tuple[str, float]: (Best move, Expected value)
+            Tuple[str, float]: (Best move, Expected value), or (Best move,
+                Win probability) with search
         """
         if not fight_state.enemy_stats:
-            fight_state.enemy_stats = self.get_enemy_stats(fight_state.enemy_id)
-            if not fight_state.enemy_stats:
+            enemy_stats = self.get_enemy_stats(fight_state.enemy_id)
+            if not enemy_stats:
                 return "Unknown", 0.0
+            fight_state = fight_state.replace(enemy_stats=enemy_stats)
+
+        # A precomputed policy table answers in O(1) when it covers this state.
+        # Its values are win probabilities, so only when those were asked for
+        if search and self.policy_tables:
+            table_move = self.policy_tables.lookup(fight_state)
+            if table_move:
+                return table_move
 
         # Calculate expected value for each move
-        move_values = {
-            "Sword": self._calculate_move_value("Sword", fight_state),
-            "Shield": self._calculate_move_value("Shield", fight_state),
-            "Spell": self._calculate_move_value("Spell", fight_state)
-        }
+        move_values = self.move_values(fight_state, search)
         
         print(f"\nMove Values:")
         for move, value in move_values.items():
@@ -252,6 +689,56 @@ class GigaverseCalculator:
         best_move = max(move_values.items(), key=lambda x: x[1])
         return best_move
 
+    def move_values(self,
+                    fight_state: FightState,
+                    search: bool = False,
+                    depth: Optional[int] = None) -> Dict[str, float]:
+        """
+        Value of each move: expected value one turn ahead, or with search
+        the solver's win probabilities. With a move cache set, a position
+        scored before costs a digest and a lookup; a search result only
+        counts if its search reached the requested depth.
+        """
+        cache = self.move_cache
+        digest = None
+        if cache is not None:
+            from move_cache import state_digest
+            if search:
+                from fight_solver import enemy_odds_table
+                odds = enemy_odds_table(self, fight_state.enemy_stats)
+                digest = state_digest(fight_state, [p for row in odds for p in row], mode="search")
+                cached = cache.get(digest, min_depth=depth or self._search_solver().max_depth)
+            else:
+                digest = state_digest(fight_state, self._enemy_move_probabilities(fight_state))
+                cached = cache.get(digest)
+            if cached is not None:
+                return cached
+        if search:
+            move_values = self.search_move_values(fight_state, depth)
+            reached = None if self.solver.exact else self.solver.completed_depth
+        else:
+            move_values = {move: self._calculate_move_value(move, fight_state) for move in MOVES}
+            reached = None
+        if digest is not None:
+            cache.put(digest, move_values, reached)
+        return move_values
+
+    def use_policy_tables(self, directory: str):
+        """Consult tables built by policy_table.py before scoring moves"""
+        from policy_table import PolicyTableStore
+        self.policy_tables = PolicyTableStore(directory, self)
+
+    def _search_solver(self):
+        """fight_solver.ExpectimaxSolver, created on first use"""
+        if self.solver is None:
+            from fight_solver import ExpectimaxSolver
+            self.solver = ExpectimaxSolver(self)
+        return self.solver
+
+    def search_move_values(self, fight_state: FightState, depth: Optional[int] = None) -> Dict[str, float]:
+        """Win probability of each move from a multi-turn expectimax search"""
+        return self._search_solver().move_values(fight_state, depth)
+
     def _calculate_move_value(self, 
                             move: str, 
                             fight_state: FightState) -> float:
@@ -271,9 +758,7 @@ class GigaverseCalculator:
         player_def = getattr(fight_state.player_skills, f"{move.lower()}_def")
         
         # Calculate probability of each enemy move based on pattern and cooldowns
-        move_pattern = fight_state.enemy_stats.move_pattern
-        total_moves = sum(move_pattern)
-        move_probabilities = [m/total_moves for m in move_pattern]
+        move_probabilities = self._enemy_move_probabilities(fight_state)
         
         # For each possible enemy move
         move_types = ["Sword", "Shield", "Spell"]
@@ -333,53 +818,100 @@ class GigaverseCalculator:
         
         return value
 
+    def enemy_move_odds(self, enemy_stats: EnemyStats, last_moves: Optional[Sequence[str]] = None) -> List[float]:
+        """
+        [Sword, Shield, Spell] odds for the enemy's next move: the learned
+        model's prediction after last_moves (default: the moves seen so far
+        in this fight), or attack_prior() for an enemy it hasn't seen. The
+        scorer, solver, simulator and planner all take their odds from here.
+        """
+        if self.enemy_model is not None:
+            return self.enemy_model.predict(enemy_stats.name, enemy_stats.move_pattern, last_moves,
+                                            stream=self.account)
+        return attack_prior(enemy_stats.move_pattern)
+
+    def _enemy_move_probabilities(self, fight_state: FightState) -> List[float]:
+        """Enemy move odds for the one-turn scorer (see enemy_move_odds)"""
+        return self.enemy_move_odds(fight_state.enemy_stats)
+
     def update_fight_state(self, 
                           fight_state: FightState,
                           player_move: str,
                           enemy_move: str) -> FightState:
         """Update the fight state with new moves and calculate outcomes"""
-        # Create new fight state with updated moves
-        new_state = FightState(
+        # Calculate move outcomes
+        player_damage = self._calculate_damage(player_move, enemy_move, fight_state)
+        enemy_damage = self._calculate_damage(enemy_move, player_move, fight_state)
+
+        # Spend the charges used this round
+        player_charges, player_cooldowns = self._advance_charges(
+            fight_state.player_move_charges, fight_state.player_move_cooldowns, player_move
+        )
+        enemy_charges, enemy_cooldowns = self._advance_charges(
+            fight_state.enemy_move_charges, fight_state.enemy_move_cooldowns, enemy_move
+        )
+
+        # Extend the shared move history and outcomes without copying them
+        round_number = fight_state.round_number + 1
+        return FightState(
             enemy_id=fight_state.enemy_id,
-            enemy_health=fight_state.enemy_health,
-            player_health=fight_state.player_health,
+            enemy_health=fight_state.enemy_health - player_damage,
+            player_health=fight_state.player_health - enemy_damage,
             player_shield=fight_state.player_shield,
             player_skills=fight_state.player_skills,
             enemy_stats=fight_state.enemy_stats,
             last_player_move=player_move,
             last_enemy_move=enemy_move,
-            player_move_charges=fight_state.player_move_charges,
-            player_move_cooldowns=fight_state.player_move_cooldowns,
-            enemy_move_charges=fight_state.enemy_move_charges,
-            enemy_move_cooldowns=fight_state.enemy_move_cooldowns,
-            round_number=fight_state.round_number + 1,
-            move_history=fight_state.move_history.copy() if fight_state.move_history else [],
-            move_outcomes=fight_state.move_outcomes.copy() if fight_state.move_outcomes else [],
+            player_move_charges=player_charges,
+            player_move_cooldowns=player_cooldowns,
+            enemy_move_charges=enemy_charges,
+            enemy_move_cooldowns=enemy_cooldowns,
+            round_number=round_number,
+            move_history=fight_state.move_history.push({
+                "player_move": player_move,
+                "enemy_move": enemy_move,
+                "round": round_number
+            }),
+            move_outcomes=fight_state.move_outcomes.push({
+                "player_damage": player_damage,
+                "enemy_damage": enemy_damage,
+                "round": round_number
+            }),
             timestamp=time.time()
         )
 
-        # Calculate move outcomes
-        player_damage = self._calculate_damage(player_move, enemy_move, fight_state)
-        enemy_damage = self._calculate_damage(enemy_move, player_move, fight_state)
-
-        # Update health based on outcomes
-        new_state.enemy_health -= player_damage
-        new_state.player_health -= enemy_damage
-
-        # Record move history and outcomes
-        new_state.move_history.append({
-            "player_move": player_move,
-            "enemy_move": enemy_move,
-            "round": new_state.round_number
-        })
-        
-        new_state.move_outcomes.append({
-            "player_damage": player_damage,
-            "enemy_damage": enemy_damage,
-            "round": new_state.round_number
-        })
+    @staticmethod
+    def _advance_charges(charges: Dict[str, int],
+                         cooldowns: Dict[str, int],
+                         used_move: str,
+                         max_charges: int = 3) -> Tuple[Dict[str, int], Dict[str, int]]:
+        """
+        Apply one round of charge bookkeeping and return new dicts
 
-        return new_state
+        The used move spends a charge; spending the last one drops it to -1,
+        so it needs two rounds to become playable again. Every other move
+        recovers one charge up to max_charges, and cooldowns tick down.
+        FightState's MoveCounts come back as MoveCounts, other mappings as dicts.
+        """
+        if isinstance(charges, MoveCounts):
+            used = MOVE_INDEX.get(used_move)
+            new_charges = MoveCounts([
+                (-1 if count <= 1 else count - 1) if i == used else min(max_charges, count + 1)
+                for i, count in enumerate(charges)
+            ])
+            # Idle cooldowns are shared rather than rebuilt
+            if isinstance(cooldowns, MoveCounts) and not any(cooldowns):
+                return new_charges, cooldowns
+            return new_charges, MoveCounts([max(0, turns - 1) for turns in MoveCounts(cooldowns)])
+        new_charges = {}
+        for move, count in charges.items():
+            if move == used_move:
+                count -= 1
+                new_charges[move] = -1 if count <= 0 else count
+            else:
+                new_charges[move] = min(max_charges, count + 1)
+        new_cooldowns = {move: max(0, turns - 1) for move, turns in cooldowns.items()}
+        return new_charges, new_cooldowns
 
     def _calculate_damage(self, attack_move: str, defense_move: str, state: FightState) -> int:
         """Calculate damage based on moves and stats"""
@@ -400,154 +932,346 @@ class GigaverseCalculator:
 
     def fetch_game_state(self):
         """Fetch the current dungeon state from the API and extract player and enemy info."""
-        response = requests.get("https://gigaverse.io/api/game/dungeon/state", headers=HEADERS)
+        with self.metrics.stage("http"):
+            response = self.client.get("game/dungeon/state", headers=self.request_headers)
+        return self._game_state_from_response(response)
+
+    async def fetch_game_state_async(self):
+        """fetch_game_state() for the asyncio polling loop"""
+        with self.metrics.stage("http"):
+            response = await self.client.aget("game/dungeon/state", headers=self.request_headers)
+        return self._game_state_from_response(response)
+
+    def _game_state_from_response(self, response):
         if response.status_code != 200:
+            self.metrics.count("errors", "http")
             raise Exception(f"Failed to fetch game state: {response.status_code}")
-        game_state = response.json()
-        print("\nRaw game state response:")
-        print(json.dumps(game_state, indent=2))
+        with self.metrics.stage("decode"):
+            game_state = response.json()
+        if self.debug:
+            print("\nRaw game state response:")
+            print(json.dumps(game_state, indent=2))
         return game_state
 
-def main():
-    calculator = GigaverseCalculator()
-    
-    # Load existing game history if it exists
-    try:
-        with open("game_history.json", "r") as f:
-            game_history = json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        game_history = []
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Gigaverse combat calculator")
+    parser.add_argument("--search", action="store_true",
+                        help="score moves by searching the fight to the end instead of one turn ahead")
+    parser.add_argument("--depth", type=int, default=12,
+                        help="maximum number of rounds the search looks ahead")
+    parser.add_argument("--plan", action="store_true",
+                        help="also show each move's chance of clearing the rest of the run (see dungeon_planner.py)")
+    parser.add_argument("--grid", metavar="ROW,COLUMN",
+                        help="show the best move across two varied fields, e.g. enemy_health,player_shield "
+                             "or enemy_sword_atk,enemy_spell_atk (see batch_evaluator.py)")
+    parser.add_argument("--simulate", type=int, default=0, metavar="N",
+                        help="also show each move's win chance from N simulated fights")
+    parser.add_argument("--policy-tables", metavar="DIR",
+                        help="look up best moves in tables built by policy_table.py")
+    parser.add_argument("--move-cache", default="move_cache.json", metavar="PATH",
+                        help="file the move value cache is kept in between runs")
+    parser.add_argument("--move-cache-size", type=int, default=20_000, metavar="N",
+                        help="most positions to keep in the move value cache (0 turns it off)")
+    parser.add_argument("--enemy-model", default="enemy_model.json", metavar="PATH",
+                        help="learned enemy move model, built from history if the file is missing")
+    parser.add_argument("--checkpoint", default="session_checkpoint.json", metavar="PATH",
+                        help="file the live session is checkpointed to and resumed from")
+    parser.add_argument("--checkpoint-interval", type=float, default=10.0, metavar="SECONDS",
+                        help="seconds between session checkpoints")
+    parser.add_argument("--api-url", default=None,
+                        help="API base URL, e.g. a local stub_server.py (default: $GIGAVERSE_API_URL or gigaverse.io)")
+    parser.add_argument("--fast-interval", type=float, default=0.5,
+                        help="seconds between polls while the fight is changing")
+    parser.add_argument("--slow-interval", type=float, default=5.0,
+                        help="longest wait between polls while nothing changes")
+    parser.add_argument("--debug", action="store_true",
+                        help="print every raw dungeon/state response")
+    parser.add_argument("--offline", nargs="?", const=DEFAULT_JOURNAL_DIR, metavar="SOURCE",
+                        help="replay recorded states instead of polling the API (default source: game_history)")
+    parser.add_argument("--startup-target", type=float, default=1.0, metavar="SECONDS",
+                        help="warn when the first recommendation takes longer than this")
+    parser.add_argument("--metrics-port", type=int, metavar="PORT",
+                        help="serve per-stage timings in Prometheus format at http://127.0.0.1:PORT/metrics")
+    parser.add_argument("--metrics-file", metavar="PATH",
+                        help="write the same metrics to PATH every --metrics-interval seconds")
+    parser.add_argument("--metrics-interval", type=float, default=15.0, metavar="SECONDS")
+    parser.add_argument("--accounts", nargs="?", const="", metavar="FILE",
+                        help="monitor several accounts: one name=token per line in FILE, "
+                             "or $GIGAVERSE_BEARERS if no file is given")
+    args = parser.parse_args(argv)
+    grid_fields = None
+    if args.grid:
+        from batch_evaluator import GRID_FIELDS, PATTERN_FIELDS
+        grid_fields = [field.strip() for field in args.grid.split(",")]
+        if len(grid_fields) != 2 or any(f not in GRID_FIELDS + PATTERN_FIELDS for f in grid_fields):
+            parser.error(f"--grid takes two of {', '.join(GRID_FIELDS + PATTERN_FIELDS)}")
+
+    if args.accounts is not None:
+        from multi_session import load_accounts, run_accounts
+        accounts = load_accounts(args.accounts or None)
+        if not accounts:
+            print("No accounts found; list name=token lines in the file or set GIGAVERSE_BEARERS")
+            return
+        run_accounts(accounts, args.api_url, args.fast_interval, args.slow_interval,
+                     args.enemy_model, args.search, args.depth, args.policy_tables,
+                     args.move_cache, args.move_cache_size)
+        return
+
+    # Nothing below touches the network until the first poll
+    client = None
+    if not args.offline:
+        from api_client import GigaverseClient
+        client = GigaverseClient(base_url=args.api_url, headers=auth_headers())
+    calculator = GigaverseCalculator(client=client, offline=bool(args.offline))
+    calculator.debug = args.debug
+    metrics = calculator.metrics
+    if args.metrics_port is not None or args.metrics_file:
+        metrics.enabled = True
+        metrics.snapshot_path = args.metrics_file
+        metrics.snapshot_interval = args.metrics_interval
+        if client is not None:
+            metrics.track("http_requests", "HTTP requests sent, retries included", lambda: client.requests)
+            metrics.track("http_retries", "HTTP requests retried after a failure", lambda: client.retries)
+        if args.metrics_port is not None:
+            metrics.serve(args.metrics_port)
+            print(f"Serving metrics at http://127.0.0.1:{args.metrics_port}/metrics")
+    if args.policy_tables:
+        calculator.use_policy_tables(args.policy_tables)
+    simulator = None
+    if args.simulate:
+        from fight_simulator import FightSimulator
+        simulator = FightSimulator(calculator)
+    planner = None
+    if args.plan:
+        from dungeon_planner import DungeonPlanner
+        planner = DungeonPlanner(calculator)
     
-    def update_and_show_best_move():
-        try:
-            # Fetch current game state from API
-            game_state = calculator.fetch_game_state()
-            
-            # Check if game is over (null state)
-            if not game_state or not game_state.get("data", {}).get("run"):
-                print("\nGame Over - Player has died or game has ended")
-                # Append game history to file
-                with open("game_history.json", "w") as f:
-                    json.dump(game_history, f, indent=2)
-                return False
-            
-            run_data = game_state["data"]["run"]
-            players = run_data["players"]
-
-            # Identify player and enemy
-            player_data = next(p for p in players if p["id"].startswith("0x"))
-            enemy_data = next(p for p in players if not p["id"].startswith("0x"))
-
-            # Parse player stats
-            player_hp = player_data["health"]["current"]
-            player_shield = player_data["shield"]["current"]
-            player_skills = PlayerSkills(
-                sword_atk=player_data["rock"]["currentATK"],
-                sword_def=player_data["rock"]["currentDEF"],
-                shield_atk=player_data["paper"]["currentATK"],
-                shield_def=player_data["paper"]["currentDEF"],
-                spell_atk=player_data["scissor"]["currentATK"],
-                spell_def=player_data["scissor"]["currentDEF"],
-                base_hp=player_hp,
-                base_armor=player_shield
-            )
+    # A checkpoint from the last session lets the journal skip recounting
+    # the history and picks the fight back up where it was
+    checkpoint = None
+    if not args.offline:
+        from session_checkpoint import SessionCheckpoint
+        checkpoint = SessionCheckpoint.load(args.checkpoint)
 
-            # Parse move charges
-            move_charges = {
-                "Sword": player_data["rock"]["currentCharges"],
-                "Shield": player_data["paper"]["currentCharges"],
-                "Spell": player_data["scissor"]["currentCharges"]
-            }
-            move_max_charges = {
-                "Sword": player_data["rock"]["maxCharges"],
-                "Shield": player_data["paper"]["maxCharges"],
-                "Spell": player_data["scissor"]["maxCharges"]
-            }
-
-            # Parse enemy stats
-            enemy_hp = enemy_data["health"]["current"]
-            enemy_shield = enemy_data["shield"]["current"]
-            enemy_id = run_data["_id"]
-            enemy_move_pattern = [
-                enemy_data["rock"]["currentATK"], enemy_data["rock"]["currentDEF"],
-                enemy_data["paper"]["currentATK"], enemy_data["paper"]["currentDEF"],
-                enemy_data["scissor"]["currentATK"], enemy_data["scissor"]["currentDEF"]
-            ]
-            enemy_stats = EnemyStats(
-                name=enemy_data["id"],
-                move_pattern=enemy_move_pattern,
-                equipment_head_cid=0,
-                equipment_body_cid=0
-            )
+    # Append every polled state to the history journal, carrying over the
+    # legacy game_history.json the first time. Replays are not recorded again.
+    journal = None
+    if not args.offline:
+        journal = HistoryJournal(resume=checkpoint.journal if checkpoint else None)
+        migrated = migrate_json_history("game_history.json", journal)
+        if migrated:
+            print(f"Migrated {migrated} records from game_history.json into {journal.directory}/")
 
-            last_move = player_data.get("lastMove", "")
-            move_history = [last_move] * 3 if last_move else []
-
-            fight_state = FightState(
-                enemy_id=enemy_id,
-                enemy_health=enemy_hp,
-                player_health=player_hp,
-                player_shield=player_shield,
-                player_skills=player_skills,
-                enemy_stats=enemy_stats,
-                last_player_move=last_move,
-                player_move_charges=move_charges,
-                round_number=len(game_history)
-            )
+    # Learn each enemy's move habits as rounds are observed
+    from enemy_model import load_or_bootstrap
+    enemy_model = load_or_bootstrap(args.enemy_model, [DEFAULT_JOURNAL_DIR, "game_history_enhanced.json"])
+    calculator.enemy_model = enemy_model
 
-            # Save current state to history
-            game_history.append(fight_state.to_dict())
+    # Skip rescoring positions already scored this run or a previous one
+    move_cache = None
+    if args.move_cache_size > 0:
+        from move_cache import MoveCache
+        move_cache = MoveCache.load(args.move_cache, args.move_cache_size)
+        calculator.move_cache = move_cache
+        if metrics.enabled:
+            metrics.track("move_cache_hits", "Move scores served from the move cache", lambda: move_cache.hits)
+            metrics.track("move_cache_misses", "Move scores computed and added to the move cache",
+                          lambda: move_cache.misses)
 
-            move_names = ["Sword", "Shield", "Spell"]
-            move_values = {}
-            for move in move_names:
-                move_values[move] = calculator._calculate_move_value(move, fight_state)
+    from state_pipeline import StatePipeline
+    fetch = None
+    if args.offline:
+        from stub_server import load_payloads
+        payloads = iter(load_payloads(args.offline))
+
+        async def fetch():
+            return next(payloads, None)
+    pipeline = StatePipeline(calculator, round_number=journal.record_count if journal else 0, fetch=fetch)
+    seen = {"room": None, "saved": time.monotonic(), "startup": None,
+            "checkpointed": time.monotonic(), "snapshot": None, "resumed": None}
+    if checkpoint:
+        seen["room"] = checkpoint.resume(pipeline, journal, enemy_model)
+
+    def save_enemy_model():
+        if enemy_model.dirty and not args.offline:
+            enemy_model.save(args.enemy_model)
+        if move_cache is not None and move_cache.dirty and not args.offline:
+            move_cache.save(args.move_cache)
+
+    def save_checkpoint():
+        # The journal (flushed by capture) and the model go to disk first,
+        # so the checkpoint never points past them
+        if enemy_model.dirty:
+            enemy_model.save(args.enemy_model)
+        SessionCheckpoint.capture(pipeline, journal, seen["snapshot"], enemy_model).save(args.checkpoint)
+        seen["checkpointed"] = time.monotonic()
+
+    @pipeline.subscribe
+    def reconcile_checkpoint(snapshot: DungeonSnapshot):
+        # The first poll after a resume, checked against the checkpoint
+        if checkpoint and seen["resumed"] is None:
+            seen["resumed"] = checkpoint.reconcile(snapshot) or ""
+        seen["snapshot"] = snapshot
+
+    @pipeline.subscribe
+    def record_history(snapshot: DungeonSnapshot):
+        with metrics.stage("history"):
+            # Repeated polls of a round aren't recorded again
+            if journal and snapshot.changed:
+                journal.append(snapshot.fight_state.to_dict())
+            calculator.remember_enemy(snapshot)
+
+    @pipeline.subscribe
+    def learn_enemy_moves(snapshot: DungeonSnapshot):
+        # Feed the enemy's move to the model once per played round
+        fight_state = snapshot.fight_state
+        name = fight_state.enemy_stats.name
+        room = (fight_state.enemy_id, name)
+        if room != seen["room"]:
+            enemy_model.reset_sequence(name)
+            seen["room"] = room
+        if snapshot.changed and fight_state.last_enemy_move:
+            enemy_model.observe(name, fight_state.last_enemy_move)
+        if time.monotonic() - seen["saved"] >= 30:
+            save_enemy_model()
+            seen["saved"] = time.monotonic()
+
+    @pipeline.subscribe
+    def show_best_move(snapshot: DungeonSnapshot):
+        fight_state = snapshot.fight_state
+        with metrics.stage("score"):
+            move_values = calculator.move_values(fight_state, args.search, args.depth)
 
             best_move = max(move_values.items(), key=lambda x: x[1])
+            table_move = calculator.policy_tables.lookup(fight_state) if calculator.policy_tables else None
+            win_chances = simulator.win_chance_per_move(fight_state, n_fights=args.simulate) if simulator else {}
+            run_chances = {}
+            if planner:
+                from dungeon_planner import remaining_rooms
+                rooms = remaining_rooms(calculator.enemy_catalog(), fight_state.enemy_stats.name)
+                run_chances = planner.move_values(fight_state, rooms, snapshot.player_max_health)
+
+        grid_lines = []
+        if grid_fields:
+            with metrics.stage("grid"):
+                grid_lines = what_if_lines(fight_state)
+
+        with metrics.stage("render"):
+            render_state(snapshot, move_values, best_move, table_move, win_chances, run_chances, grid_lines)
+
+    def what_if_lines(fight_state: FightState) -> List[str]:
+        from batch_evaluator import default_range, field_value, render_grid, what_if_grid
+
+        row_field, column_field = grid_fields
+        known = calculator.enemy_catalog().get(fight_state.enemy_stats.name) or {}
+        row_values, column_values = (default_range(fight_state, field, max_enemy_health=known.get("max_health"))
+                                     for field in grid_fields)
+        grid = what_if_grid(calculator, fight_state, row_field, row_values, column_field, column_values)
+        current = (field_value(fight_state, row_field), field_value(fight_state, column_field))
+        return render_grid(grid, row_field, row_values, column_field, column_values, current)
+
+    def render_state(snapshot: DungeonSnapshot, move_values, best_move, table_move, win_chances, run_chances,
+                     grid_lines):
+        fight_state = snapshot.fight_state
+        player_skills = fight_state.player_skills
+        enemy_stats = fight_state.enemy_stats
+        move_charges = fight_state.player_move_charges
+        move_max_charges = snapshot.move_max_charges
 
-            # Clear screen and print current state
-            print("\033[H\033[J")  # Clear screen
-            print(f"\nCurrent Game State (Round {fight_state.round_number}):")
-            print(f"Player Stats:")
-            print(f"  Health: {player_hp}")
-            print(f"  Shield: {player_shield}")
-            print(f"  Sword ATK: {player_skills.sword_atk}, DEF: {player_skills.sword_def}, Charges: {move_charges['Sword']}/{move_max_charges['Sword']}")
-            print(f"  Shield ATK: {player_skills.shield_atk}, DEF: {player_skills.shield_def}, Charges: {move_charges['Shield']}/{move_max_charges['Shield']}")
-            print(f"  Spell ATK: {player_skills.spell_atk}, DEF: {player_skills.spell_def}, Charges: {move_charges['Spell']}/{move_max_charges['Spell']}")
-            print(f"\nEnemy Stats:")
-            print(f"  Name: {enemy_stats.name}")
-            print(f"  Health: {enemy_hp}")
-            print(f"  Shield: {enemy_shield}")
-            print(f"  Sword ATK: {enemy_stats.sword_atk}, DEF: {enemy_stats.sword_def}")
-            print(f"  Shield ATK: {enemy_stats.shield_atk}, DEF: {enemy_stats.shield_def}")
-            print(f"  Spell ATK: {enemy_stats.spell_atk}, DEF: {enemy_stats.spell_def}")
+        # Clear screen and print current state
+        print("\033[H\033[J")  # Clear screen
+        print(f"\nCurrent Game State (Round {fight_state.round_number}):")
+        print(f"Player Stats:")
+        print(f"  Health: {fight_state.player_health}")
+        print(f"  Shield: {fight_state.player_shield}")
+        print(f"  Sword ATK: {player_skills.sword_atk}, DEF: {player_skills.sword_def}, Charges: {move_charges['Sword']}/{move_max_charges['Sword']}")
+        print(f"  Shield ATK: {player_skills.shield_atk}, DEF: {player_skills.shield_def}, Charges: {move_charges['Shield']}/{move_max_charges['Shield']}")
+        print(f"  Spell ATK: {player_skills.spell_atk}, DEF: {player_skills.spell_def}, Charges: {move_charges['Spell']}/{move_max_charges['Spell']}")
+        print(f"\nEnemy Stats:")
+        print(f"  Name: {enemy_stats.name}")
+        print(f"  Health: {fight_state.enemy_health}")
+        print(f"  Shield: {snapshot.enemy_shield}")
+        print(f"  Sword ATK: {enemy_stats.sword_atk}, DEF: {enemy_stats.sword_def}")
+        print(f"  Shield ATK: {enemy_stats.shield_atk}, DEF: {enemy_stats.shield_def}")
+        print(f"  Spell ATK: {enemy_stats.spell_atk}, DEF: {enemy_stats.spell_def}")
+        if args.search and calculator.solver is None:
+            print(f"\nWin probability for each move (from the move cache):")
+        elif args.search:
+            print(f"\nWin probability for each move (searched {calculator.solver.completed_depth} rounds ahead):")
+        else:
             print(f"\nExpected value for each move:")
-            for move, value in move_values.items():
-                if value == float('-inf'):
-                    print(f"  {move}: ON COOLDOWN (no charges left)")
-                else:
-                    print(f"  {move}: {value:.2f} (Charges left: {move_charges[move]})")
-            print(f"\nBest move: {best_move[0]}")
-            print(f"Expected value: {best_move[1]:.2f}")
-            print("\nPress Ctrl+C to exit")
-            
-            return True
-            
-        except Exception as e:
-            print(f"Error updating game state: {e}")
-            time.sleep(5)  # Wait before retrying
-            return True
+        for move, value in move_values.items():
+            if value == float('-inf'):
+                print(f"  {move}: ON COOLDOWN (no charges left)")
+            elif win_chances.get(move):
+                result = win_chances[move]
+                print(f"  {move}: {value:.2f} (Charges left: {move_charges[move]}) "
+                      f"Win chance: {result.win_probability:.1%} +/-{result.win_probability_error:.1%}, "
+                      f"HP left: {result.expected_player_health:.1f}")
+            else:
+                print(f"  {move}: {value:.2f} (Charges left: {move_charges[move]})")
+        print(f"\nBest move: {best_move[0]}")
+        print(f"Expected value: {best_move[1]:.2f}")
+        if table_move:
+            print(f"Policy table: {table_move[0]} (win chance {table_move[1]:.1%})")
+        if run_chances:
+            chances = ", ".join(f"{move} {chance:.1%}" for move, chance in run_chances.items()
+                                if chance != float("-inf"))
+            print(f"Chance of clearing the rest of the run: {chances}")
+        if grid_lines:
+            print()
+            print("\n".join(grid_lines))
+        if seen["startup"] is None:
+            seen["startup"] = time.perf_counter() - STARTED_AT
+        slow = " - slower than the target" if seen["startup"] > args.startup_target else ""
+        if move_cache is not None:
+            print(f"Move cache: {move_cache.hits} hits, {move_cache.misses} misses "
+                  f"({move_cache.hit_rate:.0%}), {len(move_cache)} positions")
+        print(f"\nFirst recommendation {seen['startup'] * 1000:.0f} ms after start "
+              f"(target {args.startup_target * 1000:.0f} ms){slow}")
+        if seen["resumed"]:
+            print(seen["resumed"])
+        print("\nPress Ctrl+C to exit")
 
-    try:
+    async def poll():
+        from api_client import AdaptiveInterval, backoff_delay
+
+        # Poll quickly while rounds are being played, back off while idle,
+        # and back off exponentially after failed fetches
+        interval = AdaptiveInterval(args.fast_interval, args.slow_interval)
+        failures = 0
         while True:
-            if not update_and_show_best_move():
+            metrics.maybe_write_snapshot()
+            try:
+                snapshot = await pipeline.tick()
+            except Exception as e:
+                failures += 1
+                delay = backoff_delay(failures, base=1.0, cap=60.0)
+                print(f"Error updating game state: {e} (retrying in {delay:.1f}s)")
+                await asyncio.sleep(delay)
+                continue
+            failures = 0
+            if snapshot is None:
+                print("\nGame Over - Player has died or game has ended")
+                seen["snapshot"] = None
                 break
-            time.sleep(2)  # Update every 2 seconds
+            if journal and time.monotonic() - seen["checkpointed"] >= args.checkpoint_interval:
+                save_checkpoint()
+            await asyncio.sleep(interval.update(snapshot.changed))
+
+    import asyncio
+    try:
+        asyncio.run(poll())
     except KeyboardInterrupt:
         print("\nExiting...")
-        # Append game history to file
-        with open("game_history.json", "w") as f:
-            json.dump(game_history, f, indent=2)
+    finally:
+        if journal:
+            journal.close()
+            save_checkpoint()
+        save_enemy_model()
+        metrics.close()
+        if calculator._client is not None:
+            calculator._client.close()
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
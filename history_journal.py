@@ -0,0 +1,424 @@
+import json
+import os
+import struct
+import time
+import zlib
+from typing import Dict, Iterator, List, Optional, Tuple
+
+DEFAULT_JOURNAL_DIR = "game_history"
+SEGMENT_PREFIX = "history-"
+# Plain JSON-Lines segments written by earlier versions; still read
+SEGMENT_SUFFIX = ".jsonl"
+COMPRESSED_SUFFIX = ".jsonl.zz"
+# Each flushed block: compressed length and record count, then the zlib bytes
+BLOCK_HEADER = struct.Struct("<II")
+# Fields that differ between polls of the same round
+VOLATILE_FIELDS = frozenset(("timestamp", "round_number"))
+
+
+def unchanged(previous: Dict, record: Dict) -> bool:
+    """Whether record repeats previous apart from its timestamp and round number"""
+    if previous.keys() != record.keys():
+        return False
+    return all(value == previous[key] for key, value in record.items() if key not in VOLATILE_FIELDS)
+
+
+def encode_delta(previous: Dict, record: Dict) -> Dict:
+    """
+    What changed from previous to record: {"set": {...}} for new values,
+    {"append": {...}} for lists that only grew (move_history), and
+    {"unset": [...]} for fields that are gone
+    """
+    delta = {}
+    for key, value in record.items():
+        old = previous.get(key)
+        if key in previous and value == old:
+            continue
+        if isinstance(value, list) and isinstance(old, list) and len(old) < len(value) and value[:len(old)] == old:
+            delta.setdefault("append", {})[key] = value[len(old):]
+        else:
+            delta.setdefault("set", {})[key] = value
+    removed = [key for key in previous if key not in record]
+    if removed:
+        delta["unset"] = removed
+    return delta
+
+
+def apply_delta(previous: Dict, delta: Dict) -> Dict:
+    """The record encode_delta(previous, record) was made from"""
+    record = dict(previous)
+    for key in delta.get("unset", ()):
+        record.pop(key, None)
+    record.update(delta.get("set", {}))
+    for key, tail in delta.get("append", {}).items():
+        record[key] = record[key] + tail
+    return record
+
+
+class HistoryJournal:
+    """
+    Append-only log of polled fight states.
+
+    A poll that repeats the last record (apart from its timestamp and round
+    number) is skipped. Every other record is stored as a delta against the
+    one before it, with a full keyframe at the start of each segment and
+    every keyframe_every records. Records are buffered and written in
+    batches: the buffer is flushed (and fsync'd) as one compressed block
+    once it holds flush_every records or flush_interval seconds have passed
+    since the last flush, so a crash loses at most that window. Blocks of a
+    segment share one zlib stream, cut with a sync flush at each block.
+
+    Each session writes its own segments, rolling over once a segment
+    reaches segment_bytes. A torn final block left by a crash is trimmed
+    the next time the journal opens. iter_records() decodes everything back
+    into full records, including plain .jsonl segments from older versions.
+    Opening counts the records already stored, unless `resume` is a
+    position() from an earlier session, in which case only records written
+    after it are counted.
+    """
+
+    def __init__(self,
+                 directory: str = DEFAULT_JOURNAL_DIR,
+                 segment_bytes: int = 8 * 1024 * 1024,
+                 flush_every: int = 10,
+                 flush_interval: float = 5.0,
+                 fsync: bool = True,
+                 keyframe_every: int = 256,
+                 skip_unchanged: bool = True,
+                 resume: Optional[Dict] = None):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.keyframe_every = keyframe_every
+        self.skip_unchanged = skip_unchanged
+        self.buffer: List[Dict] = []
+        self.last_flush = time.monotonic()
+        self.file = None
+        self.segment_size = 0
+        self.compressor = None
+        # Last record accepted, and last record written (what the next delta is against)
+        self.previous: Optional[Dict] = None
+        self.base: Optional[Dict] = None
+        self.since_keyframe = 0
+        self.skipped = 0
+        self.bytes_written = 0
+
+        os.makedirs(directory, exist_ok=True)
+        segments = self.segments()
+        if segments:
+            self._repair_tail(segments[-1])
+        self.record_count = self._resumed_count(segments, resume) if resume else None
+        if self.record_count is None:
+            self.record_count = sum(self._count_records(path) for path in segments)
+        # A zlib stream can't be resumed, so every session starts a new segment
+        self.segment_index = self._segment_number(segments[-1]) if segments else 0
+
+    @staticmethod
+    def _segment_number(path: str) -> int:
+        name = os.path.basename(path)
+        return int(name[len(SEGMENT_PREFIX):].split(".")[0])
+
+    def _segment_path(self, index: int) -> str:
+        return os.path.join(self.directory, f"{SEGMENT_PREFIX}{index:06d}{COMPRESSED_SUFFIX}")
+
+    def segments(self) -> List[str]:
+        """Segment paths in write order"""
+        return _segment_paths(self.directory)
+
+    @staticmethod
+    def _count_records(path: str, start: int = 0) -> int:
+        """Records in a segment from byte offset `start`, which has to be a record or block boundary"""
+        count = 0
+        with open(path, "rb") as f:
+            f.seek(start)
+            if path.endswith(SEGMENT_SUFFIX):
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    count += chunk.count(b"\n")
+                return count
+            # Only the block headers are read
+            while True:
+                header = f.read(BLOCK_HEADER.size)
+                if len(header) < BLOCK_HEADER.size:
+                    return count
+                length, records = BLOCK_HEADER.unpack(header)
+                f.seek(length, os.SEEK_CUR)
+                count += records
+
+    def _resumed_count(self, segments: List[str], position: Dict) -> Optional[int]:
+        """
+        The record count from a position() taken earlier, counting only what
+        was written after it; None if the journal no longer matches it
+        (e.g. it was compacted or truncated since)
+        """
+        names = [os.path.basename(path) for path in segments]
+        if position.get("segment") not in names:
+            return None
+        index = names.index(position["segment"])
+        size = position.get("size", 0)
+        if os.path.getsize(segments[index]) < size:
+            return None
+        return (position.get("records", 0) + self._count_records(segments[index], size)
+                + sum(self._count_records(path) for path in segments[index + 1:]))
+
+    def position(self) -> Dict:
+        """
+        Where the journal ends on disk, after flushing the buffer: the last
+        segment's name and size and the records up to there. Passing it
+        back as `resume` lets a later open skip recounting the history.
+        """
+        self.flush()
+        if self.file is not None:
+            path = self.file.name
+        else:
+            segments = self.segments()
+            path = segments[-1] if segments else None
+        return {"segment": os.path.basename(path) if path else None,
+                "size": os.path.getsize(path) if path else 0,
+                "records": self.record_count}
+
+    @staticmethod
+    def _repair_tail(path: str):
+        """Drop a partial last record (or block) written by a crash mid-append"""
+        with open(path, "rb+") as f:
+            f.seek(0, os.SEEK_END)
+            end = f.tell()
+            if not end:
+                return
+            if path.endswith(COMPRESSED_SUFFIX):
+                position = 0
+                while position + BLOCK_HEADER.size <= end:
+                    f.seek(position)
+                    length, _ = BLOCK_HEADER.unpack(f.read(BLOCK_HEADER.size))
+                    if position + BLOCK_HEADER.size + length > end:
+                        break
+                    position += BLOCK_HEADER.size + length
+                if position != end:
+                    f.truncate(position)
+                return
+            f.seek(end - 1)
+            if f.read(1) == b"\n":
+                return
+            # Walk back to the last complete line
+            position = end
+            while position > 0:
+                step = min(4096, position)
+                position -= step
+                f.seek(position)
+                newline = f.read(step).rfind(b"\n")
+                if newline >= 0:
+                    f.truncate(position + newline + 1)
+                    return
+            f.truncate(0)
+
+    def _open_segment(self):
+        if self.file is not None:
+            self._sync()
+            self.file.close()
+        self.segment_index += 1
+        self.file = open(self._segment_path(self.segment_index), "ab")
+        self.segment_size = self.file.tell()
+        self.compressor = zlib.compressobj()
+        # A new segment has to decode on its own
+        self.base = None
+
+    def _queue(self, record: Dict) -> bool:
+        if self.skip_unchanged and self.previous is not None and unchanged(self.previous, record):
+            self.skipped += 1
+            return False
+        self.buffer.append(record)
+        self.previous = record
+        self.record_count += 1
+        return True
+
+    def append(self, record: Dict) -> bool:
+        """
+        Queue one record; it reaches disk on the next batch flush. Returns
+        False when it repeats the last record and was skipped.
+        """
+        queued = self._queue(record)
+        if len(self.buffer) >= self.flush_every or time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+        return queued
+
+    def flush(self):
+        """Write buffered records as one block, rotating segments as they fill up"""
+        self.last_flush = time.monotonic()
+        if not self.buffer:
+            return
+        if self.file is None or self.segment_size >= self.segment_bytes:
+            self._open_segment()
+        lines = []
+        for record in self.buffer:
+            if self.base is None or self.since_keyframe >= self.keyframe_every:
+                entry = {"keyframe": record}
+                self.since_keyframe = 0
+            else:
+                entry = {"delta": encode_delta(self.base, record)}
+            self.since_keyframe += 1
+            self.base = record
+            lines.append(json.dumps(entry, separators=(",", ":")).encode() + b"\n")
+        data = self.compressor.compress(b"".join(lines)) + self.compressor.flush(zlib.Z_SYNC_FLUSH)
+        block = BLOCK_HEADER.pack(len(data), len(lines)) + data
+        self.file.write(block)
+        self.segment_size += len(block)
+        self.bytes_written += len(block)
+        self.buffer = []
+        self._sync()
+
+    def _sync(self):
+        self.file.flush()
+        if self.fsync:
+            os.fsync(self.file.fileno())
+
+    def close(self):
+        self.flush()
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def __enter__(self) -> "HistoryJournal":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __iter__(self) -> Iterator[Dict]:
+        return iter_records(self.directory)
+
+
+def _segment_paths(directory: str) -> List[str]:
+    names = [n for n in os.listdir(directory)
+             if n.startswith(SEGMENT_PREFIX) and (n.endswith(SEGMENT_SUFFIX) or n.endswith(COMPRESSED_SUFFIX))]
+    return [os.path.join(directory, n) for n in sorted(names)]
+
+
+def _iter_segment(path: str) -> Iterator[Dict]:
+    with open(path, "rb") as f:
+        if path.endswith(SEGMENT_SUFFIX):
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # torn write from a crash; the writer trims it on reopen
+                yield json.loads(line)
+            return
+        decompressor = zlib.decompressobj()
+        record = None
+        while True:
+            header = f.read(BLOCK_HEADER.size)
+            if len(header) < BLOCK_HEADER.size:
+                return
+            length, _ = BLOCK_HEADER.unpack(header)
+            data = f.read(length)
+            if len(data) < length:
+                return  # torn block from a crash
+            try:
+                lines = decompressor.decompress(data).splitlines()
+            except zlib.error:
+                return
+            for line in lines:
+                entry = json.loads(line)
+                record = entry["keyframe"] if "keyframe" in entry else apply_delta(record, entry["delta"])
+                yield record
+
+
+def iter_records(directory: str = DEFAULT_JOURNAL_DIR) -> Iterator[Dict]:
+    """
+    Stream every record in the journal as a full record, oldest first.
+    Consecutive records share the nested values that didn't change, so
+    copy a record before modifying it.
+    """
+    if not os.path.isdir(directory):
+        return
+    for path in _segment_paths(directory):
+        yield from _iter_segment(path)
+
+
+def state_signature(record: Dict) -> Tuple:
+    """Fields that change when a round is played; repeated polls of one round share them"""
+    return (
+        record.get("enemy_id"),
+        (record.get("enemy_stats") or {}).get("name"),
+        record.get("player_health"),
+        record.get("player_shield"),
+        record.get("enemy_health"),
+        record.get("last_player_move"),
+        record.get("last_enemy_move"),
+        json.dumps(record.get("player_move_charges"), sort_keys=True),
+    )
+
+
+def iter_history(path: str) -> Iterator[Dict]:
+    """Stream records from a journal directory or a legacy game_history.json file"""
+    if os.path.isdir(path):
+        yield from iter_records(path)
+    else:
+        with open(path, "r") as f:
+            yield from json.load(f)
+
+
+def migrate_json_history(json_path: str = "game_history.json",
+                         journal: Optional[HistoryJournal] = None) -> int:
+    """
+    Copy a legacy game_history.json array into the journal
+
+    Returns the number of records written; repeats of the same round are
+    stored once, as appended records are. Only runs into an empty journal,
+    so calling it again after a successful migration does nothing.
+    """
+    journal = journal or HistoryJournal()
+    if journal.record_count or not os.path.exists(json_path):
+        return 0
+    try:
+        with open(json_path, "r") as f:
+            history = json.load(f)
+    except json.JSONDecodeError:
+        return 0
+    written = sum(journal._queue(record) for record in history)
+    journal.flush()
+    return written
+
+
+def compact_journal(directory: str = DEFAULT_JOURNAL_DIR) -> Tuple[int, int, int]:
+    """
+    Rewrite a journal as one run of delta-encoded, compressed segments,
+    dropping repeated polls. Returns (records read, records kept, bytes
+    written). The old segments are only removed once the new ones are in place.
+    """
+    old_segments = _segment_paths(directory)
+    staging = os.path.join(directory, ".compact")
+    if os.path.isdir(staging):
+        for name in os.listdir(staging):
+            os.remove(os.path.join(staging, name))
+    read = 0
+    with HistoryJournal(staging, flush_every=1000) as journal:
+        # Numbered after the old segments so both can sit side by side
+        journal.segment_index = HistoryJournal._segment_number(old_segments[-1]) if old_segments else 0
+        for record in iter_records(directory):
+            journal._queue(record)
+            read += 1
+            if len(journal.buffer) >= journal.flush_every:
+                journal.flush()
+    for name in sorted(os.listdir(staging)):
+        os.replace(os.path.join(staging, name), os.path.join(directory, name))
+    os.rmdir(staging)
+    for path in old_segments:
+        os.remove(path)
+    return read, journal.record_count, journal.bytes_written
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Migrate game_history.json into the history journal")
+    parser.add_argument("source", nargs="?", default="game_history.json")
+    parser.add_argument("--journal", default=DEFAULT_JOURNAL_DIR)
+    parser.add_argument("--compact", action="store_true",
+                        help="rewrite the journal's existing segments delta-encoded and compressed instead")
+    args = parser.parse_args()
+    if args.compact:
+        read, kept, written = compact_journal(args.journal)
+        print(f"Compacted {read} records into {kept} ({written} bytes) in {args.journal}/")
+    else:
+        with HistoryJournal(args.journal) as target:
+            print(f"Migrated {migrate_json_history(args.source, target)} records into {args.journal}/")
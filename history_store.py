@@ -0,0 +1,211 @@
+import json
+import math
+import os
+from array import array
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from gigaverse_calculator import MOVES
+
+DEFAULT_STORE_DIR = "history_store"
+SKILLS = ("sword_atk", "sword_def", "shield_atk", "shield_def", "spell_atk", "spell_def")
+
+# (column name, dtype, record path). Paths index into FightState.to_dict()
+NUMERIC_COLUMNS: List[Tuple[str, str, Tuple]] = (
+    [
+        ("round_number", "i4", ("round_number",)),
+        ("player_health", "i2", ("player_health",)),
+        ("player_shield", "i2", ("player_shield",)),
+        ("enemy_health", "i2", ("enemy_health",)),
+    ]
+    + [(f"player_{skill}", "i2", ("player_skills", skill)) for skill in SKILLS]
+    + [("player_base_hp", "i2", ("player_skills", "base_hp")),
+       ("player_base_armor", "i2", ("player_skills", "base_armor"))]
+    + [(f"enemy_{skill}", "i2", ("enemy_stats", skill)) for skill in SKILLS]
+    + [(f"{side}_{kind}_{move.lower()}", "i1", (f"{side}_move_{kind}", move))
+       for side in ("player", "enemy") for kind in ("charges", "cooldowns") for move in MOVES]
+)
+# Interned string columns: (column name, record path)
+STRING_COLUMNS: List[Tuple[str, Tuple]] = [
+    ("enemy_id", ("enemy_id",)),
+    ("enemy_name", ("enemy_stats", "name")),
+    ("last_player_move", ("last_player_move",)),
+    ("last_enemy_move", ("last_enemy_move",)),
+]
+
+
+def missing_value(dtype: str) -> int:
+    """Stored for a missing number: the dtype's minimum, which no real value reaches (-1 is a spent charge)"""
+    return int(np.iinfo(dtype).min)
+
+
+def _lookup(record: Dict, path: Tuple):
+    for key in path:
+        if not isinstance(record, dict):
+            return None
+        record = record.get(key)
+    return record
+
+
+def build_history_store(records: Iterable[Dict], directory: str = DEFAULT_STORE_DIR) -> "HistoryStore":
+    """
+    Convert FightState.to_dict() records into one .npy file per column
+
+    Strings (enemy IDs/names, moves) are interned into int32 codes with the
+    values listed in strings.json. Each enemy_id is one dungeon run, and
+    run_round counts the rows within it. Missing numbers are stored as
+    missing_value() of their column's dtype, missing timestamps as NaN.
+    """
+    numeric = {name: array("l") for name, _, _ in NUMERIC_COLUMNS}
+    codes = {name: array("l") for name, _ in STRING_COLUMNS}
+    interned: Dict[str, Dict] = {name: {} for name, _ in STRING_COLUMNS}
+    run_round = array("l")
+    timestamps = array("d")
+    run_lengths: Dict[int, int] = {}
+
+    for record in records:
+        for name, dtype, path in NUMERIC_COLUMNS:
+            value = _lookup(record, path)
+            numeric[name].append(missing_value(dtype) if value is None else int(value))
+        for name, path in STRING_COLUMNS:
+            table = interned[name]
+            value = _lookup(record, path)
+            code = table.get(value)
+            if code is None:
+                code = table[value] = len(table)
+            codes[name].append(code)
+        run = codes["enemy_id"][-1]
+        run_round.append(run_lengths.get(run, 0))
+        run_lengths[run] = run_round[-1] + 1
+        timestamp = record.get("timestamp")
+        timestamps.append(math.nan if timestamp is None else float(timestamp))
+
+    os.makedirs(directory, exist_ok=True)
+    for name, dtype, _ in NUMERIC_COLUMNS:
+        np.save(os.path.join(directory, f"{name}.npy"), np.array(numeric[name], dtype=dtype))
+    for name, _ in STRING_COLUMNS:
+        np.save(os.path.join(directory, f"{name}.npy"), np.array(codes[name], dtype="i4"))
+    np.save(os.path.join(directory, "run_round.npy"), np.array(run_round, dtype="i4"))
+    np.save(os.path.join(directory, "timestamp.npy"), np.array(timestamps, dtype="f8"))
+
+    # Indexes: rows grouped by run and by enemy name (CSR offsets), rows sorted by round
+    for name in ("enemy_id", "enemy_name"):
+        column = np.array(codes[name], dtype="i4")
+        np.save(os.path.join(directory, f"index_{name}_rows.npy"), np.argsort(column, kind="stable").astype("i4"))
+        offsets = np.zeros(len(interned[name]) + 1, dtype="i8")
+        np.cumsum(np.bincount(column, minlength=len(interned[name])), out=offsets[1:])
+        np.save(os.path.join(directory, f"index_{name}_offsets.npy"), offsets)
+    rounds = np.array(numeric["round_number"], dtype="i4")
+    order = np.argsort(rounds, kind="stable").astype("i4")
+    np.save(os.path.join(directory, "index_round_rows.npy"), order)
+    np.save(os.path.join(directory, "index_round_sorted.npy"), rounds[order])
+
+    with open(os.path.join(directory, "strings.json"), "w") as f:
+        json.dump({name: list(table) for name, table in interned.items()}, f)
+    return HistoryStore(directory)
+
+
+class HistoryStore:
+    """
+    Read side of the columnar store. Columns are memory-mapped, so opening
+    the store and filtering it only touches the pages a query needs.
+    """
+
+    def __init__(self, directory: str = DEFAULT_STORE_DIR):
+        self.directory = directory
+        with open(os.path.join(directory, "strings.json"), "r") as f:
+            self.strings: Dict[str, List] = json.load(f)
+        self.codes = {name: {value: code for code, value in enumerate(values)}
+                      for name, values in self.strings.items()}
+        self._columns: Dict[str, np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return len(self.column("round_number"))
+
+    def column(self, name: str, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """A whole column, or just the given rows of it"""
+        values = self._columns.get(name)
+        if values is None:
+            values = np.load(os.path.join(self.directory, f"{name}.npy"), mmap_mode="r")
+            self._columns[name] = values
+        return values if rows is None else values[rows]
+
+    def decode(self, name: str, codes: np.ndarray) -> List:
+        """Turn interned codes from a string column back into values"""
+        values = self.strings[name]
+        return [values[code] for code in codes]
+
+    def _group_rows(self, name: str, value) -> np.ndarray:
+        code = self.codes[name].get(value)
+        if code is None:
+            return np.empty(0, dtype="i4")
+        offsets = self.column(f"index_{name}_offsets")
+        return self.column(f"index_{name}_rows")[offsets[code]:offsets[code + 1]]
+
+    def select(self,
+               enemy_id: Optional[str] = None,
+               enemy_name: Optional[str] = None,
+               round_range: Optional[Tuple[int, int]] = None) -> np.ndarray:
+        """
+        Sorted row numbers matching every given filter
+
+        round_range is inclusive on both ends and filters on round_number.
+        """
+        selections = []
+        if enemy_id is not None:
+            selections.append(self._group_rows("enemy_id", enemy_id))
+        if enemy_name is not None:
+            selections.append(self._group_rows("enemy_name", enemy_name))
+        if round_range is not None:
+            sorted_rounds = self.column("index_round_sorted")
+            start = np.searchsorted(sorted_rounds, round_range[0], side="left")
+            stop = np.searchsorted(sorted_rounds, round_range[1], side="right")
+            selections.append(self.column("index_round_rows")[start:stop])
+        if not selections:
+            return np.arange(len(self))
+
+        # Intersect from the smallest selection outwards
+        selections.sort(key=len)
+        rows = np.sort(selections[0])
+        for other in selections[1:]:
+            rows = rows[np.isin(rows, other, assume_unique=True)]
+        return rows
+
+    def summary_by(self, group: str, columns: Iterable[str], rows: Optional[np.ndarray] = None) -> Dict:
+        """
+        Per-group row counts and column means in one pass, e.g.
+        summary_by("enemy_name", ["enemy_health", "player_health"])
+
+        Missing values (missing_value(), or NaN timestamps) are left out of
+        the means; a group with none of a column present gets None for it.
+        """
+        groups = self.column(group, rows)
+        size = len(self.strings[group])
+        counts = np.bincount(groups, minlength=size)
+        summary = {}
+        for code in np.flatnonzero(counts):
+            summary[self.strings[group][code]] = {"rows": int(counts[code])}
+        for name in columns:
+            values = self.column(name, rows)
+            present = ~np.isnan(values) if values.dtype.kind == "f" else values != missing_value(values.dtype)
+            totals = np.bincount(groups[present], weights=values[present], minlength=size)
+            found = np.bincount(groups[present], minlength=size)
+            for code in np.flatnonzero(counts):
+                mean = float(totals[code] / found[code]) if found[code] else None
+                summary[self.strings[group][code]][f"mean_{name}"] = mean
+        return summary
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from history_journal import iter_history
+
+    parser = argparse.ArgumentParser(description="Build the columnar history store")
+    parser.add_argument("source", nargs="?", default="game_history",
+                        help="history journal directory or legacy game_history.json")
+    parser.add_argument("--out", default=DEFAULT_STORE_DIR)
+    args = parser.parse_args()
+    store = build_history_store(iter_history(args.source), args.out)
+    print(f"Stored {len(store)} rows in {args.out}/")
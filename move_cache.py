@@ -0,0 +1,130 @@
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional, Sequence
+
+from gigaverse_calculator import MOVES, FightState
+
+DEFAULT_CACHE_PATH = "move_cache.json"
+# Bump when the scoring, the digest or the file format changes so older saved caches are ignored
+CACHE_VERSION = 3
+
+
+def state_digest(fight_state: FightState, enemy_odds: Sequence[float] = (), mode: Hashable = "one-turn") -> str:
+    """
+    Canonical digest of everything a move score depends on: HP, shield,
+    both fighters' stats, charges, cooldowns and last moves, the enemy move
+    odds the scorer will use (so learning in the enemy model changes the
+    digest), and the scoring mode. Round number, history and timestamps
+    are left out, so repeated polls of a round share a digest. Last moves
+    are hashed as labels: move_code()s differ between processes, and the
+    cache is saved across them.
+    """
+    skills = fight_state.player_skills
+    fields = (
+        mode,
+        fight_state.player_health, fight_state.player_shield, fight_state.enemy_health,
+        (skills.sword_atk, skills.sword_def, skills.shield_atk, skills.shield_def, skills.spell_atk, skills.spell_def),
+        tuple(fight_state.enemy_stats.move_pattern),
+        fight_state.last_player_move, fight_state.last_enemy_move,
+        tuple(fight_state.player_move_charges[m] for m in MOVES),
+        tuple(fight_state.player_move_cooldowns[m] for m in MOVES),
+        tuple(fight_state.enemy_move_charges[m] for m in MOVES),
+        tuple(fight_state.enemy_move_cooldowns[m] for m in MOVES),
+        tuple(float(p) for p in enemy_odds),
+    )
+    return hashlib.blake2b(repr(fields).encode(), digest_size=16).hexdigest()
+
+
+class MoveCache:
+    """
+    Bounded LRU map from state_digest() digests to move values, with hit,
+    miss and eviction counts. Saved to and loaded from a JSON file so it
+    survives restarts.
+
+    Search values are stored with the depth the search actually reached
+    (None when it solved the fight outright, and for one-turn values), so a
+    search cut short by its time budget doesn't answer a deeper request.
+    """
+
+    def __init__(self, max_entries: int = 20_000):
+        self.max_entries = max_entries
+        # digest -> (values in MOVES order, depth)
+        self.entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.dirty = False
+
+    @staticmethod
+    def _covers(depth: Optional[int], min_depth: Optional[int]) -> bool:
+        return depth is None or min_depth is None or depth >= min_depth
+
+    def get(self, digest: str, min_depth: Optional[int] = None) -> Optional[Dict[str, float]]:
+        """The values stored for digest, or None if there are none searched at least min_depth deep"""
+        entry = self.entries.get(digest)
+        if entry is None or not self._covers(entry[1], min_depth):
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(digest)
+        return dict(zip(MOVES, entry[0]))
+
+    def put(self, digest: str, move_values: Dict[str, float], depth: Optional[int] = None):
+        """Store values searched `depth` rounds deep; a deeper entry already stored is kept"""
+        entry = self.entries.get(digest)
+        if entry is None or self._covers(depth, entry[1]):
+            self.entries[digest] = (tuple(move_values[m] for m in MOVES), depth)
+        self.entries.move_to_end(digest)
+        self.dirty = True
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self) -> Dict:
+        return {"entries": len(self.entries), "max_entries": self.max_entries, "hits": self.hits,
+                "misses": self.misses, "evictions": self.evictions, "hit_rate": self.hit_rate}
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.dirty = True
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def save(self, path: str = DEFAULT_CACHE_PATH):
+        """Write the entries, least recently used first, atomically"""
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump({"version": CACHE_VERSION, "moves": list(MOVES),
+                       "entries": [[digest, list(values), depth]
+                                   for digest, (values, depth) in self.entries.items()]}, f)
+        os.replace(temp_path, path)
+        self.dirty = False
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_CACHE_PATH, max_entries: int = 20_000) -> "MoveCache":
+        """The cache saved at path, or an empty one if it is missing, unreadable or from another version"""
+        cache = cls(max_entries)
+        if not os.path.exists(path):
+            return cache
+        try:
+            with open(path, "r") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Ignoring move cache {path}: {e}")
+            return cache
+        if data.get("version") != CACHE_VERSION or data.get("moves") != list(MOVES):
+            return cache
+        for digest, values, depth in data.get("entries", [])[-max_entries:]:
+            cache.entries[digest] = (tuple(values), depth)
+        return cache
@@ -0,0 +1,227 @@
+import asyncio
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+from gigaverse_calculator import DungeonSnapshot, GigaverseCalculator, auth_headers
+from history_journal import DEFAULT_JOURNAL_DIR, HistoryJournal
+from state_pipeline import StatePipeline
+
+# Per-account journals live apart from the single-account journal
+ACCOUNTS_JOURNAL_DIR = "game_history_accounts"
+
+
+def load_accounts(path: Optional[str] = None) -> List[Tuple[str, str]]:
+    """
+    (name, bearer token) for every account to monitor
+
+    Read from `path`, one `name=token` or bare token per line (blank lines
+    and # comments are skipped), or else from GIGAVERSE_BEARERS as a
+    comma-separated list in the same form. The text before the first "=" is
+    a name only if it is a Python identifier followed by more than "="
+    padding, so base64 padded tokens are kept whole; unnamed accounts are
+    numbered.
+    """
+    if path:
+        with open(path, "r") as f:
+            entries = [line.strip() for line in f]
+    else:
+        from dotenv import load_dotenv
+        load_dotenv()
+        entries = [entry.strip() for entry in os.getenv("GIGAVERSE_BEARERS", "").split(",")]
+    accounts = []
+    for entry in entries:
+        if not entry or entry.startswith("#"):
+            continue
+        name, _, token = entry.partition("=")
+        # Names become journal directories, so nothing like "." or "../x" gets through
+        if not (token.strip("=") and name.strip().isidentifier()):
+            name, token = "", entry
+        accounts.append((name.strip() or f"account-{len(accounts) + 1}", token.strip()))
+    return accounts
+
+
+class AccountSession:
+    """
+    One account in a multi-account run: its own calculator view (sharing
+    the client, catalog and caches), StatePipeline, history journal and
+    status panel.
+    """
+
+    def __init__(self,
+                 name: str,
+                 calculator: GigaverseCalculator,
+                 journal: Optional[HistoryJournal] = None,
+                 search: bool = False,
+                 depth: int = 12):
+        self.name = name
+        self.calculator = calculator
+        self.journal = journal
+        self.search = search
+        self.depth = depth
+        self.pipeline = StatePipeline(calculator, round_number=journal.record_count if journal else 0)
+        self.snapshot: Optional[DungeonSnapshot] = None
+        self.move_values: Dict[str, float] = {}
+        self.best_move: Optional[Tuple[str, float]] = None
+        self.status = "starting"
+        self.errors = 0
+        self.updated_at: Optional[float] = None
+        self.room = None
+        self.finished = False
+        for subscriber in (self.record_history, self.learn_enemy_moves, self.score):
+            self.pipeline.subscribe(subscriber)
+
+    def record_history(self, snapshot: DungeonSnapshot):
+        with self.calculator.metrics.stage("history"):
+            if self.journal and snapshot.changed:
+                self.journal.append(snapshot.fight_state.to_dict())
+            self.calculator.remember_enemy(snapshot)
+
+    def learn_enemy_moves(self, snapshot: DungeonSnapshot):
+        enemy_model = self.calculator.enemy_model
+        if enemy_model is None:
+            return
+        fight_state = snapshot.fight_state
+        name = fight_state.enemy_stats.name
+        room = (fight_state.enemy_id, name)
+        if room != self.room:
+            enemy_model.reset_sequence(name, stream=self.name)
+            self.room = room
+        if snapshot.changed and fight_state.last_enemy_move:
+            enemy_model.observe(name, fight_state.last_enemy_move, stream=self.name)
+
+    def score(self, snapshot: DungeonSnapshot):
+        self.snapshot = snapshot
+        self.updated_at = time.monotonic()
+        self.status = "fighting"
+        if not snapshot.changed and self.move_values:
+            return  # same round as the last poll
+        fight_state = snapshot.fight_state
+        with self.calculator.metrics.stage("score"):
+            self.move_values = self.calculator.move_values(fight_state, self.search, self.depth)
+            self.best_move = max(self.move_values.items(), key=lambda x: x[1])
+
+    def panel(self) -> List[str]:
+        """Status lines for this account"""
+        lines = [f"== {self.name} ({self.status}) =="]
+        if self.snapshot is not None:
+            fight_state = self.snapshot.fight_state
+            lines.append(f"  Round {fight_state.round_number}  HP {fight_state.player_health}  "
+                         f"Shield {fight_state.player_shield}  |  {fight_state.enemy_stats.name} "
+                         f"HP {fight_state.enemy_health}  Shield {self.snapshot.enemy_shield}")
+            values = "  ".join("cooldown" if v == float("-inf") else f"{m} {v:.2f}"
+                               for m, v in self.move_values.items())
+            lines.append(f"  Best: {self.best_move[0]} ({self.best_move[1]:.2f})   {values}")
+        age = f"{time.monotonic() - self.updated_at:.1f}s ago" if self.updated_at else "never"
+        lines.append(f"  Updated {age}, errors {self.errors}")
+        return lines
+
+    async def poll(self, fast_interval: float, slow_interval: float, on_update):
+        """Poll until the run ends, calling on_update() after every tick"""
+        from api_client import AdaptiveInterval, backoff_delay
+
+        interval = AdaptiveInterval(fast_interval, slow_interval)
+        failures = 0
+        while True:
+            try:
+                snapshot = await self.pipeline.tick()
+            except Exception as e:
+                failures += 1
+                self.errors += 1
+                delay = backoff_delay(failures, base=1.0, cap=60.0)
+                self.status = f"error: {e} (retrying in {delay:.1f}s)"
+                on_update()
+                await asyncio.sleep(delay)
+                continue
+            failures = 0
+            if snapshot is None:
+                self.status = "run ended"
+                self.finished = True
+                on_update()
+                return
+            on_update()
+            await asyncio.sleep(interval.update(snapshot.changed))
+
+
+def run_accounts(accounts: List[Tuple[str, str]],
+                 api_url: Optional[str] = None,
+                 fast_interval: float = 0.5,
+                 slow_interval: float = 5.0,
+                 enemy_model_path: str = "enemy_model.json",
+                 search: bool = False,
+                 depth: int = 12,
+                 policy_tables: Optional[str] = None,
+                 move_cache_path: Optional[str] = "move_cache.json",
+                 move_cache_size: int = 20_000,
+                 refresh: float = 0.25):
+    """
+    Monitor several accounts from one process
+
+    Every account is polled concurrently over one pooled HTTP client, with
+    its bearer token sent per request. The enemy catalog, enemy model,
+    policy tables and move cache are shared, so adding an account only adds
+    a pipeline, a journal and, with search, its own solver. Each account's
+    history goes to game_history_accounts/<name>/. The panels are redrawn
+    at most every `refresh` seconds however many accounts update.
+    """
+    from api_client import GigaverseClient
+    from enemy_model import load_or_bootstrap
+
+    client = GigaverseClient(base_url=api_url, pool_size=max(4, len(accounts)))
+    calculator = GigaverseCalculator(client=client)
+    # Catalog refreshes go out with the first account's token
+    calculator.request_headers = auth_headers(accounts[0][1])
+    if policy_tables:
+        calculator.use_policy_tables(policy_tables)
+    enemy_model = load_or_bootstrap(enemy_model_path, [DEFAULT_JOURNAL_DIR, "game_history_enhanced.json"])
+    calculator.enemy_model = enemy_model
+    move_cache = None
+    if move_cache_path and move_cache_size > 0:
+        from move_cache import MoveCache
+        move_cache = calculator.move_cache = MoveCache.load(move_cache_path, move_cache_size)
+
+    sessions = [
+        AccountSession(name, calculator.for_account(name, auth_headers(token)),
+                       HistoryJournal(os.path.join(ACCOUNTS_JOURNAL_DIR, name)), search, depth)
+        for name, token in accounts
+    ]
+    state = {"dirty": True, "saved": time.monotonic()}
+
+    def mark_dirty():
+        state["dirty"] = True
+
+    async def render():
+        while True:
+            if state["dirty"]:
+                state["dirty"] = False
+                lines = ["\033[H\033[J", f"Monitoring {len(sessions)} accounts"]
+                for session in sessions:
+                    lines.extend(session.panel())
+                lines.append("\nPress Ctrl+C to exit")
+                print("\n".join(lines))
+            if time.monotonic() - state["saved"] >= 30:
+                if enemy_model.dirty:
+                    enemy_model.save(enemy_model_path)
+                if move_cache is not None and move_cache.dirty:
+                    move_cache.save(move_cache_path)
+                state["saved"] = time.monotonic()
+            if all(session.finished for session in sessions):
+                return
+            await asyncio.sleep(refresh)
+
+    async def monitor():
+        await asyncio.gather(render(), *(session.poll(fast_interval, slow_interval, mark_dirty)
+                                          for session in sessions))
+
+    try:
+        asyncio.run(monitor())
+    except KeyboardInterrupt:
+        print("\nExiting...")
+    finally:
+        for session in sessions:
+            session.journal.close()
+        if enemy_model.dirty:
+            enemy_model.save(enemy_model_path)
+        if move_cache is not None and move_cache.dirty:
+            move_cache.save(move_cache_path)
+        client.close()
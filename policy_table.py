@@ -0,0 +1,274 @@
+import argparse
+import hashlib
+import json
+import os
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from fight_solver import ExpectimaxSolver, encode_fight_state, enemy_odds_table
+from gigaverse_calculator import MOVES, NO_MOVE
+
+# Bump when _calculate_damage/_advance_charges change so stale tables are rebuilt
+RULES_VERSION = 2
+DEFAULT_TABLE_DIR = "policy_tables"
+# A table is stale once the live enemy odds drift further than this from the ones it was built with
+ODDS_TOLERANCE = 0.05
+
+
+def policy_table_key(player_skills, enemy_stats, max_charges: int = 3) -> str:
+    """Hash of everything a table's values depend on"""
+    stats = {
+        "rules": RULES_VERSION,
+        "max_charges": max_charges,
+        "player": [
+            player_skills.sword_atk, player_skills.sword_def,
+            player_skills.shield_atk, player_skills.shield_def,
+            player_skills.spell_atk, player_skills.spell_def,
+        ],
+        "enemy": list(enemy_stats.move_pattern),
+    }
+    return hashlib.sha1(json.dumps(stats, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def default_seed_contexts(max_charges: int = 3) -> List[Tuple]:
+    """
+    Contexts the live loop actually produces: any player charge counts, the
+    enemy at full charges, no cooldowns and no recognised last moves
+    """
+    counts = range(-1, max_charges + 1)
+    idle = (0,) * len(MOVES)
+    full = (max_charges,) * len(MOVES)
+    return [
+        ((a, b, c), idle, full, idle, NO_MOVE, NO_MOVE)
+        for a in counts for b in counts for c in counts
+    ]
+
+
+def build_policy_table(calculator,
+                       fight_state,
+                       max_player_health: int,
+                       max_enemy_health: int,
+                       directory: str = DEFAULT_TABLE_DIR,
+                       seed_contexts: Optional[Iterable[Tuple]] = None,
+                       tolerance: float = 1e-7,
+                       max_sweeps: int = 500) -> str:
+    """
+    Solve every reachable state for fight_state's enemy/loadout pair and save it
+
+    States are (player HP, enemy HP, context), where a context is charges,
+    cooldowns and last moves as in ExpectimaxSolver. Contexts are enumerated
+    from seed_contexts (default_seed_contexts() plus fight_state's own) and
+    every HP pair up to the given maxima is solved by value iteration, so the
+    stored value is the probability of eventually winning under best play.
+    Damage never heals, so HP pairs are solved in order of increasing
+    player + enemy HP; only zero-damage rounds loop within a pair.
+
+    The player's shield is not a table dimension: the current damage rules
+    never read or change it. Enemy moves follow the calculator's enemy odds,
+    which are saved with the table so PolicyTableStore can tell when the
+    enemy model has moved away from them.
+
+    Returns the table's directory.
+    """
+    solver = ExpectimaxSolver(calculator, time_budget=None)
+    solver._prepare(fight_state)
+
+    # Enumerate reachable contexts breadth-first
+    seeds = list(seed_contexts or default_seed_contexts())
+    seeds.append(encode_fight_state(fight_state)[2:])
+    queue = deque(solver._context_id(seed) for seed in seeds)
+    seen = set(queue)
+    while queue:
+        for _, outcomes in solver._expand(queue.popleft()):
+            for _, _, _, child in outcomes:
+                if child not in seen:
+                    seen.add(child)
+                    queue.append(child)
+
+    contexts = len(solver._contexts)
+    moves = len(MOVES)
+    prob = np.zeros((contexts, moves, moves))
+    dealt = np.zeros((contexts, moves, moves), dtype=np.int64)
+    taken = np.zeros((contexts, moves, moves), dtype=np.int64)
+    child = np.zeros((contexts, moves, moves), dtype=np.int64)
+    legal = np.zeros((contexts, moves), dtype=bool)
+    for context_id in range(contexts):
+        for player_move, outcomes in solver._expand(context_id):
+            legal[context_id, player_move] = True
+            for slot, (p, d, t, c) in enumerate(outcomes):
+                prob[context_id, player_move, slot] = p
+                dealt[context_id, player_move, slot] = d
+                taken[context_id, player_move, slot] = t
+                child[context_id, player_move, slot] = c
+
+    # value[ph, eh, context]; row 0 is "dead" for either side
+    value = np.zeros((max_player_health + 1, max_enemy_health + 1, contexts))
+    value[1:, 0, :] = 1.0
+    best = np.full(value.shape, -1, dtype=np.int8)
+    flat = value.reshape(-1)
+    row = (max_enemy_health + 1) * contexts
+    context_index = np.arange(contexts)
+    no_move = ~legal.any(axis=1)
+
+    for total in range(2, max_player_health + max_enemy_health + 1):
+        player_hp = np.arange(max(1, total - max_enemy_health), min(max_player_health, total - 1) + 1)
+        if not len(player_hp):
+            continue
+        enemy_hp = total - player_hp
+        next_player = np.maximum(player_hp[:, None, None, None] - taken[None], 0)
+        next_enemy = np.maximum(enemy_hp[:, None, None, None] - dealt[None], 0)
+        targets = next_player * row + next_enemy * contexts + child[None]
+        cells = player_hp[:, None] * row + enemy_hp[:, None] * contexts + context_index[None]
+
+        for _ in range(max_sweeps):
+            q = (flat[targets] * prob[None]).sum(axis=3)
+            q[:, ~legal] = -np.inf
+            updated = q.max(axis=2)
+            updated[:, no_move] = 0.0
+            change = np.abs(updated - flat[cells]).max()
+            flat[cells] = updated
+            if change < tolerance:
+                break
+        moves_here = q.argmax(axis=2).astype(np.int8)
+        moves_here[:, no_move] = -1
+        best[player_hp, enemy_hp, :] = moves_here
+
+    key = policy_table_key(fight_state.player_skills, fight_state.enemy_stats)
+    path = os.path.join(directory, key)
+    os.makedirs(path, exist_ok=True)
+    context_rows = np.array(
+        [pc + pcd + ec + ecd + (lp, le) for pc, pcd, ec, ecd, lp, le in solver._contexts],
+        dtype=np.int8,
+    )
+    np.save(os.path.join(path, "best_move.npy"), best)
+    np.save(os.path.join(path, "value.npy"), value.astype(np.float16))
+    np.save(os.path.join(path, "contexts.npy"), context_rows)
+    with open(os.path.join(path, "meta.json"), "w") as f:
+        json.dump({
+            "key": key,
+            "enemy": fight_state.enemy_stats.name,
+            "move_pattern": list(fight_state.enemy_stats.move_pattern),
+            "enemy_odds": [list(row) for row in solver._odds],
+            "max_player_health": max_player_health,
+            "max_enemy_health": max_enemy_health,
+            "contexts": contexts,
+            "rules_version": RULES_VERSION
+        }, f, indent=2)
+    return path
+
+
+class PolicyTable:
+    """A built table, memory-mapped from disk"""
+
+    def __init__(self, path: str):
+        with open(os.path.join(path, "meta.json"), "r") as f:
+            self.meta = json.load(f)
+        self.best_move = np.load(os.path.join(path, "best_move.npy"), mmap_mode="r")
+        self.value = np.load(os.path.join(path, "value.npy"), mmap_mode="r")
+        rows = np.load(os.path.join(path, "contexts.npy"))
+        self.context_ids: Dict[Tuple, int] = {}
+        for context_id, r in enumerate(rows.tolist()):
+            context = (tuple(r[0:3]), tuple(r[3:6]), tuple(r[6:9]), tuple(r[9:12]), r[12], r[13])
+            self.context_ids[context] = context_id
+
+    def lookup(self, fight_state) -> Optional[Tuple[str, float]]:
+        """(best move, win probability), or None if the state is outside the table"""
+        encoded = encode_fight_state(fight_state)
+        player_health, enemy_health = encoded[0], encoded[1]
+        if not (0 < player_health < self.best_move.shape[0] and 0 < enemy_health < self.best_move.shape[1]):
+            return None
+        context_id = self.context_ids.get(encoded[2:])
+        if context_id is None:
+            return None
+        move = int(self.best_move[player_health, enemy_health, context_id])
+        if move < 0:
+            return None
+        return MOVES[move], float(self.value[player_health, enemy_health, context_id])
+
+
+class PolicyTableStore:
+    """
+    Opens tables on demand from a directory, keyed by policy_table_key.
+    With a calculator, a table whose enemy odds are more than ODDS_TOLERANCE
+    away from the calculator's current ones is treated as missing.
+    """
+
+    def __init__(self, directory: str = DEFAULT_TABLE_DIR, calculator=None):
+        self.directory = directory
+        self.calculator = calculator
+        self.tables: Dict[Tuple, Optional[PolicyTable]] = {}
+
+    def _current(self, table: "PolicyTable", enemy_stats) -> bool:
+        if self.calculator is None:
+            return True
+        built = table.meta.get("enemy_odds")
+        if not built:
+            return False
+        odds = enemy_odds_table(self.calculator, enemy_stats)
+        return max(abs(a - b) for row, built_row in zip(odds, built) for a, b in zip(row, built_row)) <= ODDS_TOLERANCE
+
+    def get(self, player_skills, enemy_stats) -> Optional[PolicyTable]:
+        # Cache by raw stats so the hash is only computed once per pair
+        stats = (
+            player_skills.sword_atk, player_skills.sword_def,
+            player_skills.shield_atk, player_skills.shield_def,
+            player_skills.spell_atk, player_skills.spell_def,
+            tuple(enemy_stats.move_pattern),
+        )
+        if stats not in self.tables:
+            path = os.path.join(self.directory, policy_table_key(player_skills, enemy_stats))
+            self.tables[stats] = PolicyTable(path) if os.path.exists(os.path.join(path, "meta.json")) else None
+        table = self.tables[stats]
+        return table if table is not None and self._current(table, enemy_stats) else None
+
+    def lookup(self, fight_state) -> Optional[Tuple[str, float]]:
+        if not fight_state.enemy_stats:
+            return None
+        table = self.get(fight_state.player_skills, fight_state.enemy_stats)
+        return table.lookup(fight_state) if table else None
+
+
+def main():
+    """Build a table for every enemy/loadout pair found in a history file"""
+    from enemy_model import EnemyModel
+    from gigaverse_calculator import FightState, GigaverseCalculator
+    from history_journal import iter_history
+
+    parser = argparse.ArgumentParser(description="Precompute policy tables from recorded fights")
+    parser.add_argument("history", nargs="?", default="game_history",
+                        help="history journal directory or legacy game_history.json")
+    parser.add_argument("--out", default=DEFAULT_TABLE_DIR)
+    parser.add_argument("--player-hp", type=int, default=None,
+                        help="largest player HP to cover (default: highest seen for the pair)")
+    parser.add_argument("--enemy-hp", type=int, default=None,
+                        help="largest enemy HP to cover (default: highest seen for the pair)")
+    parser.add_argument("--enemy-model", default="enemy_model.json", metavar="PATH",
+                        help="enemy move model to build the tables' odds from, if it exists")
+    args = parser.parse_args()
+
+    pairs = {}
+    for record in iter_history(args.history):
+        recorded = FightState.from_dict(record)
+        if not recorded.enemy_stats:
+            continue
+        skills, enemy_stats = recorded.player_skills, recorded.enemy_stats
+        key = policy_table_key(skills, enemy_stats)
+        _, _, player_hp, enemy_hp = pairs.get(key, (skills, enemy_stats, 0, 0))
+        pairs[key] = (skills, enemy_stats,
+                      max(player_hp, record["player_health"]), max(enemy_hp, record["enemy_health"]))
+
+    calculator = GigaverseCalculator(enemies={"entities": []})
+    if os.path.exists(args.enemy_model):
+        calculator.enemy_model = EnemyModel.load(args.enemy_model)
+    for key, (skills, enemy_stats, player_hp, enemy_hp) in pairs.items():
+        fight_state = FightState(enemy_id=None, enemy_health=enemy_hp, player_health=player_hp,
+                                 player_shield=0, player_skills=skills, enemy_stats=enemy_stats)
+        path = build_policy_table(calculator, fight_state,
+                                  args.player_hp or player_hp, args.enemy_hp or enemy_hp, args.out)
+        print(f"{enemy_stats.name}: {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,308 @@
+import argparse
+import functools
+import json
+import queue
+import threading
+import time
+from typing import Dict, List, Optional
+
+from batch_evaluator import best_moves, empty_columns, fill_row, move_value_matrix
+from gigaverse_calculator import DungeonSnapshot, FightState, GigaverseCalculator
+
+DEFAULT_PORT = 8780
+MAX_BODY = 16 * 1024 * 1024
+
+
+class RecommendationService:
+    """
+    Long-lived local HTTP service that keeps a calculator warm for bots and
+    overlays, instead of each of them importing or running the calculator.
+
+        POST /evaluate  one FightState.to_dict() record, a list of them, or
+                        {"states": [...]}; every state is scored in one
+                        batch_evaluator pass
+        GET  /state     the latest recommendation for the polled game
+        GET  /stream    Server-Sent Events: a "state" event every time the
+                        polled state changes
+        GET  /health    counters
+
+    Values are the calculator's one-turn move values (_calculate_move_value),
+    including the learned enemy model when one is set. Records without
+    enemy_stats are looked up in the enemy catalog by enemy_id.
+    """
+
+    def __init__(self,
+                 calculator: GigaverseCalculator,
+                 host: str = "127.0.0.1",
+                 port: int = DEFAULT_PORT,
+                 keepalive: float = 15.0):
+        from http.server import ThreadingHTTPServer
+
+        self.calculator = calculator
+        self.keepalive = keepalive
+        # Evaluation reads the enemy model that polling updates
+        self.lock = threading.RLock()
+        self.subscribers: List[queue.Queue] = []
+        self.subscribers_lock = threading.Lock()
+        self.latest: Optional[Dict] = None
+        self.requests = 0
+        self.states_evaluated = 0
+        self.events = 0
+        self.started_at = time.time()
+        self.httpd = ThreadingHTTPServer((host, port), self._handler())
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def evaluate(self, records: List[Dict]) -> List[Dict]:
+        """Best move and per-move values for each record, or {"error": ...} for records that can't be scored"""
+        results: List[Optional[Dict]] = [None] * len(records)
+        columns, odds, positions = empty_columns(len(records)), {}, []
+        with self.lock:
+            for i, record in enumerate(records):
+                try:
+                    fight_state = FightState.from_dict(record)
+                    if fight_state.enemy_stats is None:
+                        enemy_stats = self.calculator.get_enemy_stats(fight_state.enemy_id)
+                        if enemy_stats is None:
+                            raise Exception(f"unknown enemy {fight_state.enemy_id!r}")
+                        fight_state = fight_state.replace(enemy_stats=enemy_stats)
+                    # A record that fails here leaves its row to the next one
+                    fill_row(self.calculator, columns, len(positions), fight_state, odds)
+                except Exception as e:
+                    results[i] = {"error": str(e) if not isinstance(e, KeyError) else f"missing field {e}"}
+                    continue
+                positions.append(i)
+        values = move_value_matrix({name: array[:len(positions)] for name, array in columns.items()})
+        for i, result in zip(positions, best_moves(values)):
+            results[i] = result
+        self.states_evaluated += len(positions)
+        return results
+
+    def publish(self, event: Dict):
+        """Send an event to every /stream subscriber; a subscriber that has fallen behind loses its oldest event"""
+        self.latest = event
+        self.events += 1
+        with self.subscribers_lock:
+            subscribers = list(self.subscribers)
+        for subscriber in subscribers:
+            while True:
+                try:
+                    subscriber.put_nowait(event)
+                    break
+                except queue.Full:
+                    try:
+                        subscriber.get_nowait()
+                    except queue.Empty:
+                        pass
+
+    def push_snapshot(self, snapshot: DungeonSnapshot):
+        """Pipeline subscriber: score a changed round and publish it"""
+        if not snapshot.changed:
+            return
+        fight_state = snapshot.fight_state
+        event = self.evaluate([fight_state.to_dict()])[0]
+        event.update(round=fight_state.round_number, enemy_shield=snapshot.enemy_shield,
+                     state=fight_state.to_dict(), timestamp=time.time())
+        self.publish(event)
+
+    def serialized(self, subscriber):
+        """Wrap a pipeline subscriber so it never runs while a request is being evaluated"""
+        @functools.wraps(subscriber)
+        def locked(snapshot: DungeonSnapshot):
+            with self.lock:
+                subscriber(snapshot)
+        return locked
+
+    def health(self) -> Dict:
+        with self.subscribers_lock:
+            subscribers = len(self.subscribers)
+        return {"status": "ok", "uptime": time.time() - self.started_at, "requests": self.requests,
+                "states_evaluated": self.states_evaluated, "events": self.events, "subscribers": subscribers}
+
+    def _handler(self):
+        from http.server import BaseHTTPRequestHandler
+
+        service = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def send_json(self, status: int, body):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                service.requests += 1
+                path = self.path.split("?")[0]
+                if path == "/health":
+                    self.send_json(200, service.health())
+                elif path == "/state":
+                    self.send_json(200 if service.latest else 404, service.latest or {"error": "no state polled yet"})
+                elif path == "/stream":
+                    self.stream()
+                else:
+                    self.send_json(404, {"error": "not found"})
+
+            def do_POST(self):
+                service.requests += 1
+                if self.path.split("?")[0] != "/evaluate":
+                    self.send_json(404, {"error": "not found"})
+                    return
+                length = int(self.headers.get("Content-Length") or 0)
+                if length > MAX_BODY:
+                    self.send_json(413, {"error": f"body larger than {MAX_BODY} bytes"})
+                    self.close_connection = True
+                    return
+                try:
+                    body = json.loads(self.rfile.read(length) or b"null")
+                except ValueError as e:
+                    self.send_json(400, {"error": f"invalid JSON: {e}"})
+                    return
+                started = time.perf_counter()
+                if isinstance(body, dict) and "states" in body:
+                    body = body["states"]
+                if isinstance(body, dict):
+                    self.send_json(200, service.evaluate([body])[0])
+                elif isinstance(body, list) and all(isinstance(record, dict) for record in body):
+                    results = service.evaluate(body)
+                    self.send_json(200, {"results": results, "seconds": time.perf_counter() - started})
+                else:
+                    self.send_json(400, {"error": "expected a state object, a list of them, or {\"states\": [...]}"})
+
+            def stream(self):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Cache-Control", "no-cache")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                self.close_connection = True
+                events = queue.Queue(maxsize=64)
+                if service.latest:
+                    events.put(service.latest)
+                with service.subscribers_lock:
+                    service.subscribers.append(events)
+                try:
+                    while True:
+                        try:
+                            event = events.get(timeout=service.keepalive)
+                        except queue.Empty:
+                            self.wfile.write(b": keepalive\n\n")
+                        else:
+                            if event is None:
+                                break
+                            self.wfile.write(f"event: state\ndata: {json.dumps(event)}\n\n".encode())
+                        self.wfile.flush()
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+                finally:
+                    with service.subscribers_lock:
+                        service.subscribers.remove(events)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self) -> "RecommendationService":
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        with self.subscribers_lock:
+            subscribers = list(self.subscribers)
+        for subscriber in subscribers:
+            subscriber.put(None)
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self) -> "RecommendationService":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def poll_into(service: RecommendationService,
+              fast_interval: float = 0.5,
+              slow_interval: float = 5.0,
+              fetch=None):
+    """
+    Poll dungeon/state with an AccountSession (enemy catalog and model kept
+    up to date) and publish every changed round to the service, until the
+    run ends
+    """
+    import asyncio
+    from multi_session import AccountSession
+
+    session = AccountSession("local", service.calculator)
+    if fetch is not None:
+        session.pipeline.fetch = fetch
+    session.pipeline.subscribe(service.push_snapshot)
+    session.pipeline.subscribers = [service.serialized(s) for s in session.pipeline.subscribers]
+    asyncio.run(session.poll(fast_interval, slow_interval, lambda: None))
+    return session
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve move recommendations over local HTTP")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--poll", action="store_true",
+                        help="poll dungeon/state and push each new round to /stream subscribers")
+    parser.add_argument("--api-url", default=None, help="API base URL to poll, e.g. a local stub_server.py")
+    parser.add_argument("--offline", metavar="SOURCE",
+                        help="replay a history journal or payload file instead of polling the API")
+    parser.add_argument("--fast-interval", type=float, default=0.5)
+    parser.add_argument("--slow-interval", type=float, default=5.0)
+    parser.add_argument("--enemy-model", default="enemy_model.json", metavar="PATH")
+    args = parser.parse_args()
+
+    from enemy_model import load_or_bootstrap
+    from history_journal import DEFAULT_JOURNAL_DIR
+
+    client = None
+    if args.poll and not args.offline:
+        from api_client import GigaverseClient
+        from gigaverse_calculator import auth_headers
+        client = GigaverseClient(base_url=args.api_url, headers=auth_headers())
+    calculator = GigaverseCalculator(client=client, offline=bool(args.offline) or not args.poll)
+    calculator.enemy_model = load_or_bootstrap(args.enemy_model, [DEFAULT_JOURNAL_DIR, "game_history_enhanced.json"])
+    calculator.enemy_catalog()
+
+    service = RecommendationService(calculator, args.host, args.port).start()
+    print(f"Serving recommendations at {service.url}/evaluate (stream: {service.url}/stream). Ctrl+C to stop")
+    try:
+        if args.poll or args.offline:
+            fetch = None
+            if args.offline:
+                from stub_server import load_payloads
+                payloads = iter(load_payloads(args.offline))
+
+                async def fetch():
+                    return next(payloads, None)
+            poll_into(service, args.fast_interval, args.slow_interval, fetch)
+            print("Run ended; still serving /evaluate")
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        print("\nExiting...")
+    finally:
+        service.stop()
+        if calculator.enemy_model.dirty and not args.offline:
+            calculator.enemy_model.save(args.enemy_model)
+        if client is not None:
+            client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+import json
+import os
+import time
+from typing import Dict, Optional, Tuple
+
+from gigaverse_calculator import DungeonSnapshot
+
+DEFAULT_CHECKPOINT_PATH = "session_checkpoint.json"
+CHECKPOINT_VERSION = 2
+# Fight context older than this is from another sitting and isn't restored
+FIGHT_MAX_AGE = 6 * 3600
+
+
+def _tuples(values) -> Tuple:
+    """JSON turns the tuples in a signature into lists; turn them back"""
+    return tuple(_tuples(v) if isinstance(v, list) else v for v in values)
+
+
+class SessionCheckpoint:
+    """
+    A few hundred bytes of live session state, written every few seconds
+    so a session that dies without a clean exit resumes where it was:
+
+        round_number  the pipeline's round count (distinct rounds, as in
+                      the journal)
+        journal       HistoryJournal.position(), so reopening the journal
+                      only counts records written after the checkpoint
+        fight         the fight in progress: room, last snapshot signature,
+                      the enemy's recent moves and the last polled state
+
+    Nothing here is the only copy of anything; the journal and enemy model
+    are flushed before each checkpoint is written. A missing or unreadable
+    checkpoint just means a normal start.
+    """
+
+    def __init__(self,
+                 round_number: int = 0,
+                 journal: Optional[Dict] = None,
+                 fight: Optional[Dict] = None,
+                 saved_at: Optional[float] = None):
+        self.round_number = round_number
+        self.journal = journal
+        self.fight = fight
+        self.saved_at = saved_at if saved_at is not None else time.time()
+
+    @classmethod
+    def capture(cls, pipeline, journal, snapshot: Optional[DungeonSnapshot], enemy_model) -> "SessionCheckpoint":
+        """
+        Checkpoint a live session; snapshot is the latest poll, or None once
+        the run has ended. Flushes the journal.
+        """
+        fight = None
+        if snapshot is not None:
+            fight_state = snapshot.fight_state
+            name = fight_state.enemy_stats.name
+            fight = {"room": [fight_state.enemy_id, name],
+                     "signature": list(snapshot.signature),
+                     "recent": enemy_model.sequence(name),
+                     "state": fight_state.to_dict()}
+        return cls(pipeline.round_number, journal.position() if journal else None, fight)
+
+    def save(self, path: str = DEFAULT_CHECKPOINT_PATH):
+        """Write the checkpoint atomically"""
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump({"version": CHECKPOINT_VERSION, "saved_at": self.saved_at, "round_number": self.round_number,
+                       "journal": self.journal, "fight": self.fight}, f)
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_CHECKPOINT_PATH) -> Optional["SessionCheckpoint"]:
+        """The checkpoint saved at path, or None if there is no usable one"""
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Ignoring session checkpoint {path}: {e}")
+            return None
+        if data.get("version") != CHECKPOINT_VERSION:
+            return None
+        return cls(data.get("round_number", 0), data.get("journal"), data.get("fight"), data.get("saved_at"))
+
+    @property
+    def age(self) -> float:
+        return time.time() - self.saved_at
+
+    def resume(self, pipeline, journal, enemy_model, max_age: float = FIGHT_MAX_AGE) -> Optional[Tuple]:
+        """
+        Seed a new session's pipeline and enemy model from the checkpoint
+
+        The round number carries on from the checkpoint, plus any records
+        the journal gained after it; both count distinct rounds. When the fight context is recent, the
+        pipeline's last signature and the enemy's recent moves are restored
+        and its room is returned; the first poll then reconciles them
+        (see reconcile()).
+        """
+        if journal is not None and self.journal:
+            pipeline.round_number = self.round_number + max(0, journal.record_count - self.journal.get("records", 0))
+        else:
+            pipeline.round_number = max(pipeline.round_number, self.round_number)
+        if not self.fight or self.age > max_age:
+            return None
+        room = _tuples(self.fight["room"])
+        pipeline.last_signature = _tuples(self.fight["signature"])
+        enemy_model.restore_sequence(room[1], self.fight.get("recent", ()))
+        return room
+
+    def reconcile(self, snapshot: DungeonSnapshot) -> Optional[str]:
+        """
+        Compare the first fresh poll with the checkpointed fight, or None
+        if there was no fight to resume. The pipeline has already marked
+        the poll changed or not against the restored signature, so this
+        only describes what happened.
+        """
+        if not self.fight or self.age > FIGHT_MAX_AGE:
+            return None
+        fight_state = snapshot.fight_state
+        room = (fight_state.enemy_id, fight_state.enemy_stats.name)
+        if room != _tuples(self.fight["room"]):
+            return f"Resumed the session; the checkpointed fight is over, now facing {room[1]}"
+        if snapshot.changed:
+            return f"Resumed the fight with {room[1]}; it has moved on since the checkpoint"
+        return f"Resumed the fight with {room[1]} at the checkpointed round"
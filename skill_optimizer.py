@@ -0,0 +1,280 @@
+import argparse
+import json
+import math
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from fight_simulator import FightSimulator, priority_policy, uniform_policy
+from gigaverse_calculator import MOVES, EnemyStats, FightState, GigaverseCalculator, PlayerSkills
+
+SKILLS = ("sword_atk", "sword_def", "shield_atk", "shield_def", "spell_atk", "spell_def")
+Allocation = Tuple[int, ...]
+
+# Per-process state set up by _init_worker
+_worker = {}
+
+
+def count_allocations(budget: int, minimum: int = 0) -> int:
+    """Ways to spend exactly `budget` points over the six skills, at least `minimum` each"""
+    free = budget - minimum * len(SKILLS)
+    return math.comb(free + len(SKILLS) - 1, len(SKILLS) - 1) if free >= 0 else 0
+
+
+def allocations(budget: int,
+                minimum: int = 0,
+                limit: Optional[int] = None,
+                seed: Optional[int] = None,
+                include: Iterable[Allocation] = ()) -> List[Allocation]:
+    """
+    Candidate builds spending exactly `budget` points
+
+    Every allocation is listed when there are at most `limit`; otherwise
+    `limit` distinct ones are drawn uniformly (stars and bars), plus any
+    valid builds in `include` such as the current one.
+    """
+    free = budget - minimum * len(SKILLS)
+    if free < 0:
+        return []
+    slots = len(SKILLS)
+    valid = [tuple(a) for a in include if sum(a) == budget and min(a) >= minimum]
+    if limit is None or count_allocations(budget, minimum) <= limit:
+        def spread(points: int, parts: int):
+            if parts == 1:
+                yield (points,)
+                return
+            for first in range(points + 1):
+                for rest in spread(points - first, parts - 1):
+                    yield (first,) + rest
+        return [tuple(minimum + p for p in a) for a in spread(free, slots)]
+
+    rng = random.Random(seed)
+    chosen = dict.fromkeys(valid)
+    while len(chosen) < limit + len(valid):
+        cuts = sorted(rng.sample(range(free + slots - 1), slots - 1))
+        bounds = [-1] + cuts + [free + slots - 1]
+        chosen.setdefault(tuple(minimum + bounds[i + 1] - bounds[i] - 1 for i in range(slots)))
+    return list(chosen)
+
+
+def load_roster(sources: Sequence[str], catalog_path: Optional[str] = None) -> List[Tuple[EnemyStats, int]]:
+    """(EnemyStats, starting HP) for every enemy in the catalog and the given history files"""
+    from enemy_catalog import EnemyCatalog
+
+    catalog = EnemyCatalog(catalog_path)
+    catalog.observe_history(sources)
+    return [(catalog.stats(enemy["name"]), enemy["max_health"])
+            for enemy in catalog.roster() if enemy["max_health"]]
+
+
+def _init_worker(roster: List[Tuple[EnemyStats, int]], health: int, policy: str):
+    _worker["calculator"] = GigaverseCalculator(enemies={"entities": []})
+    _worker["roster"] = roster
+    _worker["health"] = health
+    _worker["policy"] = policy
+
+
+def _policy_for(allocation: Allocation, policy: str):
+    if policy == "uniform":
+        return uniform_policy
+    # Lead with the move whose attack stat is highest
+    attack = {move: allocation[2 * i] for i, move in enumerate(MOVES)}
+    return priority_policy(sorted(MOVES, key=lambda m: -attack[m]))
+
+
+def _evaluate_shard(tasks: List[Tuple[Allocation, int, int]]) -> List[Dict]:
+    """Simulate each (allocation, fights per enemy, seed) against the whole roster"""
+    calculator = _worker["calculator"]
+    health = _worker["health"]
+    results = []
+    for allocation, fights, seed in tasks:
+        skills = PlayerSkills(**dict(zip(SKILLS, allocation)), base_hp=health)
+        simulator = FightSimulator(calculator, seed=seed)
+        policy = _policy_for(allocation, _worker["policy"])
+        totals = {"allocation": allocation, "fights": 0, "wins": 0, "hp_loss": 0.0, "hp_loss_sq": 0.0}
+        for enemy_stats, enemy_health in _worker["roster"]:
+            fight_state = FightState(enemy_id=enemy_stats.name, enemy_health=enemy_health,
+                                     player_health=health, player_shield=0,
+                                     player_skills=skills, enemy_stats=enemy_stats)
+            result = simulator.simulate(fight_state, policy, fights)
+            loss = health - result.expected_player_health
+            totals["fights"] += fights
+            totals["wins"] += result.wins
+            totals["hp_loss"] += loss * fights
+            totals["hp_loss_sq"] += (result.player_health_std ** 2 + loss ** 2) * fights
+        results.append(totals)
+    return results
+
+
+class BuildScore:
+    """Simulation totals for one allocation, pooled over every rung it survived"""
+
+    def __init__(self, allocation: Allocation):
+        self.allocation = allocation
+        self.fights = 0
+        self.wins = 0
+        self.hp_loss = 0.0
+        self.hp_loss_sq = 0.0
+
+    def add(self, totals: Dict):
+        self.fights += totals["fights"]
+        self.wins += totals["wins"]
+        self.hp_loss += totals["hp_loss"]
+        self.hp_loss_sq += totals["hp_loss_sq"]
+
+    @property
+    def win_rate(self) -> float:
+        return self.wins / self.fights if self.fights else 0.0
+
+    @property
+    def win_rate_error(self) -> float:
+        """Half-width of the 95% confidence interval on win_rate"""
+        p = self.win_rate
+        return 1.96 * math.sqrt(p * (1 - p) / self.fights) if self.fights else 0.0
+
+    @property
+    def mean_hp_loss(self) -> float:
+        return self.hp_loss / self.fights if self.fights else 0.0
+
+    @property
+    def hp_loss_error(self) -> float:
+        """Half-width of the 95% confidence interval on mean_hp_loss"""
+        if not self.fights:
+            return 0.0
+        variance = max(0.0, self.hp_loss_sq / self.fights - self.mean_hp_loss ** 2)
+        return 1.96 * math.sqrt(variance / self.fights)
+
+    def score(self, health: int, hp_weight: float) -> float:
+        return self.win_rate - hp_weight * self.mean_hp_loss / max(1, health)
+
+    def to_dict(self) -> Dict:
+        return {
+            "skills": dict(zip(SKILLS, self.allocation)),
+            "fights": self.fights,
+            "win_rate": self.win_rate,
+            "win_rate_error": self.win_rate_error,
+            "mean_hp_loss": self.mean_hp_loss,
+            "hp_loss_error": self.hp_loss_error,
+        }
+
+
+def optimize(candidates: List[Allocation],
+             roster: List[Tuple[EnemyStats, int]],
+             health: int,
+             fights: int = 64,
+             eta: int = 2,
+             top: int = 10,
+             hp_weight: float = 0.25,
+             policy: str = "greedy",
+             workers: Optional[int] = None,
+             seed: int = 0) -> Dict:
+    """
+    Rank builds by simulated win rate and HP lost against the roster
+
+    Successive halving: every surviving build is simulated against each
+    enemy, the best 1/eta (by win rate minus hp_weight times the share of
+    HP lost) go on, and each rung gives the survivors eta times more fights
+    than the last, pooled with what they already played. It stops once
+    `top` builds remain, after one more rung to tighten their intervals.
+    Rungs are spread across a process pool.
+    """
+    started = time.perf_counter()
+    scores = {allocation: BuildScore(allocation) for allocation in candidates}
+    survivors = list(candidates)
+    rung_fights = fights
+    rungs = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(roster, health, policy)) as pool:
+        while survivors:
+            tasks = [(allocation, rung_fights, hash((seed, len(rungs), allocation)) & 0xFFFFFFFF)
+                     for allocation in survivors]
+            shard_size = max(1, len(tasks) // (4 * (workers or os.cpu_count() or 1)))
+            shards = [tasks[i:i + shard_size] for i in range(0, len(tasks), shard_size)]
+            for shard in pool.map(_evaluate_shard, shards):
+                for totals in shard:
+                    scores[totals["allocation"]].add(totals)
+            rungs.append({"builds": len(survivors), "fights_per_enemy": rung_fights})
+            survivors.sort(key=lambda a: scores[a].score(health, hp_weight), reverse=True)
+            if len(survivors) <= top:
+                break
+            survivors = survivors[:max(top, len(survivors) // eta)]
+            rung_fights *= eta
+
+    return {
+        "health": health,
+        "enemies": [stats.name for stats, _ in roster],
+        "candidates": len(candidates),
+        "rungs": rungs,
+        "seconds": time.perf_counter() - started,
+        "builds": [scores[a].to_dict() for a in survivors[:top]],
+    }
+
+
+def print_report(report: Dict):
+    print(f"\n{report['candidates']} builds against {len(report['enemies'])} enemies "
+          f"({report['health']} HP) in {report['seconds']:.1f}s")
+    for rung in report["rungs"]:
+        print(f"  {rung['builds']:>6} builds x {rung['fights_per_enemy']} fights per enemy")
+    header = " ".join(f"{skill:>10}" for skill in SKILLS)
+    print(f"\n{'Rank':>4} {header} {'Win rate':>16} {'HP lost':>14}")
+    for rank, build in enumerate(report["builds"], 1):
+        stats = " ".join(f"{build['skills'][skill]:>10}" for skill in SKILLS)
+        print(f"{rank:>4} {stats} {build['win_rate']:>8.1%} +/-{build['win_rate_error']:>5.1%} "
+              f"{build['mean_hp_loss']:>6.1f} +/-{build['hp_loss_error']:>4.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Find the best way to spend skill points by simulating fights")
+    parser.add_argument("--history", nargs="+", default=["game_history", "game_history.json",
+                                                          "game_history_enhanced.json"],
+                        help="history journal directories or JSON files to take enemies and the current build from")
+    parser.add_argument("--catalog", default="enemy_catalog.json", help="enemy catalog to add to the roster")
+    parser.add_argument("--budget", type=int, help="skill points to spend (default: the current build's total)")
+    parser.add_argument("--min-stat", type=int, default=0, help="lowest value allowed for any skill")
+    parser.add_argument("--health", type=int, help="starting HP (default: the highest seen in history)")
+    parser.add_argument("--candidates", type=int, default=256, help="builds to sample when there are more")
+    parser.add_argument("--fights", type=int, default=64, help="fights per enemy per build in the first rung")
+    parser.add_argument("--eta", type=int, default=2, help="keep 1/eta of the builds after each rung")
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--hp-weight", type=float, default=0.25,
+                        help="how much HP lost counts against a build's win rate when ranking")
+    parser.add_argument("--policy", choices=["greedy", "uniform"], default="greedy",
+                        help="greedy leads with the highest-attack move; uniform plays at random")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    from history_journal import iter_history
+
+    current, best_health = None, 0
+    for source in args.history:
+        if not os.path.exists(source):
+            continue
+        for record in iter_history(source):
+            skills = record.get("player_skills")
+            if skills:
+                current = tuple(skills.get(skill, 0) for skill in SKILLS)
+                best_health = max(best_health, record.get("player_health") or 0)
+    budget = args.budget if args.budget is not None else sum(current or ())
+    health = args.health or best_health or 20
+    roster = load_roster(args.history, args.catalog)
+    if not roster or not budget:
+        print("Need enemies and a point budget: record some fights or pass --budget")
+        return
+
+    candidates = allocations(budget, args.min_stat, args.candidates, args.seed, [current] if current else [])
+    print(f"Searching {len(candidates)} of {count_allocations(budget, args.min_stat)} builds "
+          f"with {budget} points" + (f" (current: {current})" if current else ""))
+    report = optimize(candidates, roster, health, args.fights, args.eta, args.top,
+                      args.hp_weight, args.policy, args.workers, args.seed)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
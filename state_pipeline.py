@@ -0,0 +1,67 @@
+from typing import Awaitable, Callable, List, Optional
+
+from gigaverse_calculator import DungeonSnapshot, GigaverseCalculator, parse_dungeon_state
+
+Subscriber = Callable[[DungeonSnapshot], None]
+
+
+class StatePipeline:
+    """
+    Ingestion stage for the live loop: fetches dungeon/state once per tick,
+    parses it once with parse_dungeon_state, and hands the same
+    DungeonSnapshot to every subscriber (history journal, enemy model,
+    display, ...). A failing subscriber is reported, counted in the
+    calculator's metrics and skipped so it can't stop the others.
+
+    round_number counts distinct rounds, as the history journal does:
+    repeated polls of a round share its number, so a pipeline started at
+    journal.record_count keeps numbering where the journal left off.
+
+    `fetch` replaces the API request, e.g. to replay recorded payloads offline.
+    """
+
+    def __init__(self,
+                 calculator: GigaverseCalculator,
+                 round_number: int = 0,
+                 fetch: Optional[Callable[[], Awaitable[Optional[dict]]]] = None):
+        self.calculator = calculator
+        self.fetch = fetch or calculator.fetch_game_state_async
+        self.round_number = round_number
+        self.subscribers: List[Subscriber] = []
+        self.last_signature = None
+
+    def subscribe(self, subscriber: Subscriber) -> Subscriber:
+        """Register a callback for every parsed snapshot; usable as a decorator"""
+        self.subscribers.append(subscriber)
+        return subscriber
+
+    def publish(self, snapshot: DungeonSnapshot):
+        for subscriber in self.subscribers:
+            try:
+                subscriber(snapshot)
+            except Exception as e:
+                name = getattr(subscriber, "__name__", str(subscriber))
+                self.calculator.metrics.count("errors", name)
+                print(f"Error in {name}: {e}")
+
+    def ingest(self, game_state: Optional[dict]) -> Optional[DungeonSnapshot]:
+        """Parse one response and publish it; None once the run has ended"""
+        with self.calculator.metrics.stage("parse"):
+            snapshot = parse_dungeon_state(game_state, self.round_number)
+        if snapshot is None:
+            return None
+        signature = snapshot.signature
+        snapshot.changed = signature != self.last_signature
+        self.last_signature = signature
+        if snapshot.changed:
+            self.round_number += 1
+        elif self.round_number:
+            # Another poll of the round already numbered
+            snapshot.fight_state = snapshot.fight_state.replace(round_number=self.round_number - 1)
+        self.publish(snapshot)
+        return snapshot
+
+    async def tick(self) -> Optional[DungeonSnapshot]:
+        """Fetch, parse and publish the current state"""
+        with self.calculator.metrics.stage("tick"):
+            return self.ingest(await self.fetch())
@@ -0,0 +1,166 @@
+import json
+import threading
+from typing import Dict, Iterable, List, Optional
+
+# Game move names back to the API's rock/paper/scissor slots
+API_SLOTS = {"Sword": "rock", "Shield": "paper", "Spell": "scissor"}
+
+
+def payload_from_record(record: Dict) -> Dict:
+    """Rebuild a dungeon/state response from a FightState.to_dict() record"""
+    skills = record.get("player_skills") or {}
+    enemy = record.get("enemy_stats") or {}
+    pattern = list(enemy.get("move_pattern") or [0] * 6)
+
+    def slots(stats, charges, max_charges=3):
+        return {
+            slot: {
+                "currentATK": stats[2 * i],
+                "currentDEF": stats[2 * i + 1],
+                "currentCharges": (charges or {}).get(move, max_charges),
+                "maxCharges": max_charges,
+            }
+            for i, (move, slot) in enumerate(API_SLOTS.items())
+        }
+
+    player_stats = [skills.get(k, 0) for k in ("sword_atk", "sword_def", "shield_atk",
+                                               "shield_def", "spell_atk", "spell_def")]
+    player = {
+        "id": "0x0000000000000000000000000000000000000000",
+        "health": {"current": record.get("player_health", 0)},
+        "shield": {"current": record.get("player_shield", 0)},
+        "lastMove": record.get("last_player_move") or "",
+        **slots(player_stats, record.get("player_move_charges")),
+    }
+    opponent = {
+        "id": enemy.get("name", "Enemy"),
+        "health": {"current": record.get("enemy_health", 0)},
+        "shield": {"current": 0},
+        "lastMove": record.get("last_enemy_move") or "",
+        **slots(pattern, record.get("enemy_move_charges")),
+    }
+    return {"data": {"run": {"_id": record.get("enemy_id"), "players": [player, opponent]}}}
+
+
+class StubGigaverseServer:
+    """
+    Local stand-in for the Gigaverse API, serving recorded dungeon/state payloads.
+
+    Each payload is served `repeat` times in order (as if polled while the
+    round was still in progress), then the run ends with {"data": {"run": null}}.
+    Every `fail_every`-th request gets a 503 to exercise retries. Keep-alive
+    is supported, and `connections` counts the TCP connections clients made.
+
+        with StubGigaverseServer(payloads) as server:
+            GigaverseClient(base_url=server.url)
+    """
+
+    def __init__(self,
+                 payloads: Iterable[Dict],
+                 repeat: int = 1,
+                 fail_every: int = 0,
+                 player: Optional[Dict] = None,
+                 host: str = "127.0.0.1",
+                 port: int = 0):
+        from http.server import ThreadingHTTPServer
+
+        self.payloads: List[Dict] = list(payloads)
+        self.repeat = repeat
+        self.fail_every = fail_every
+        self.player = player or {}
+        self.position = 0
+        self.requests = 0
+        self.connections = 0
+        self.lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), self._handler())
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/api"
+
+    def next_payload(self) -> Dict:
+        index = self.position // self.repeat
+        self.position += 1
+        return self.payloads[index] if index < len(self.payloads) else {"data": {"run": None}}
+
+    def _handler(self):
+        from http.server import BaseHTTPRequestHandler
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                with server.lock:
+                    server.connections += 1
+
+            def do_GET(self):
+                with server.lock:
+                    server.requests += 1
+                    failing = server.fail_every and server.requests % server.fail_every == 0
+                    if failing:
+                        status, body = 503, {"error": "stub failure"}
+                    elif self.path.endswith("/game/dungeon/state"):
+                        status, body = 200, server.next_payload()
+                    elif self.path.endswith("/user/me"):
+                        status, body = 200, server.player
+                    else:
+                        status, body = 404, {"error": "not found"}
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self) -> "StubGigaverseServer":
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self) -> "StubGigaverseServer":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def load_payloads(path: str) -> List[Dict]:
+    """Raw dungeon/state payloads, or history records converted into payloads"""
+    from history_journal import iter_history
+
+    return [record if "data" in record else payload_from_record(record) for record in iter_history(path)]
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Serve recorded dungeon/state payloads locally")
+    parser.add_argument("source", nargs="?", default="game_history",
+                        help="history journal directory, history JSON file, or JSON list of raw payloads")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--repeat", type=int, default=3, help="polls each payload is served for")
+    parser.add_argument("--fail-every", type=int, default=0, help="answer every Nth request with a 503")
+    args = parser.parse_args()
+
+    stub = StubGigaverseServer(load_payloads(args.source), args.repeat, args.fail_every, port=args.port)
+    print(f"Serving {len(stub.payloads)} payloads at {stub.url} (Ctrl+C to stop)")
+    print(f"Run: python gigaverse_calculator.py --api-url {stub.url}")
+    try:
+        stub.httpd.serve_forever()
+    except KeyboardInterrupt:
+        stub.httpd.server_close()
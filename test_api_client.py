@@ -0,0 +1,104 @@
+import asyncio
+import json
+
+import pytest
+
+from api_client import AdaptiveInterval, GigaverseClient, backoff_delay
+from gigaverse_calculator import GigaverseCalculator, parse_dungeon_state
+from multi_session import AccountSession
+from stub_server import StubGigaverseServer, payload_from_record
+
+STATE_PATH = "game/dungeon/state"
+
+
+def _payloads(count: int = 4):
+    """dungeon/state payloads for the first distinct rounds of the bundled history"""
+    with open("game_history.json", "r") as f:
+        records = json.load(f)
+    payloads, signatures = [], set()
+    for record in records:
+        payload = payload_from_record(record)
+        signature = parse_dungeon_state(payload).signature
+        if signature not in signatures:
+            signatures.add(signature)
+            payloads.append(payload)
+            if len(payloads) == count:
+                break
+    return payloads
+
+
+@pytest.fixture(autouse=True)
+def _repo_dir(monkeypatch, request):
+    monkeypatch.chdir(request.config.rootpath)
+
+
+def test_backoff_delay_is_capped_and_jittered():
+    for attempt in range(1, 10):
+        delays = [backoff_delay(attempt, base=0.5, cap=4.0) for _ in range(50)]
+        assert all(0 <= d <= min(4.0, 0.5 * 2 ** (attempt - 1)) for d in delays)
+    assert len(set(backoff_delay(3) for _ in range(20))) > 1
+
+
+def test_adaptive_interval_grows_until_the_state_changes():
+    interval = AdaptiveInterval(fast=0.5, slow=2.0, growth=2.0)
+    assert [interval.update(False) for _ in range(4)] == [1.0, 2.0, 2.0, 2.0]
+    assert interval.update(True) == 0.5
+    assert interval.update(False) == 1.0
+
+
+def test_client_retries_stub_failures():
+    with StubGigaverseServer(_payloads(), fail_every=2) as server:
+        client = GigaverseClient(base_url=server.url, backoff_base=0)
+        responses = [client.get(STATE_PATH) for _ in range(3)]
+        client.close()
+    assert [r.status_code for r in responses] == [200, 200, 200]
+    # Requests 2 and 4 fail and are retried
+    assert client.retries == 2
+    assert client.requests == server.requests == 5
+
+
+def test_client_returns_the_last_failure_once_retries_run_out():
+    with StubGigaverseServer(_payloads(), fail_every=1) as server:
+        client = GigaverseClient(base_url=server.url, max_retries=2, backoff_base=0)
+        response = client.get(STATE_PATH)
+        client.close()
+    assert response.status_code == 503
+    assert server.requests == 3
+    assert client.retries == 2
+
+
+def test_client_reuses_one_keep_alive_connection():
+    with StubGigaverseServer(_payloads(), fail_every=3) as server:
+        client = GigaverseClient(base_url=server.url, backoff_base=0)
+        for _ in range(6):
+            assert client.get(STATE_PATH).status_code == 200
+        assert asyncio.run(client.aget(STATE_PATH)).status_code == 200
+        client.close()
+    assert server.connections == 1
+
+
+def test_poll_loop_backs_off_while_unchanged(monkeypatch):
+    payloads = _payloads(3)
+    delays = []
+    sleep = asyncio.sleep
+
+    async def record_sleep(delay, *args):
+        delays.append(delay)
+        await sleep(0)
+
+    with StubGigaverseServer(payloads, repeat=3, fail_every=4) as server:
+        client = GigaverseClient(base_url=server.url, backoff_base=0)
+        calculator = GigaverseCalculator(enemies={"entities": []}, client=client)
+        session = AccountSession("stub", calculator)
+        updates = []
+        monkeypatch.setattr(asyncio, "sleep", record_sleep)
+        asyncio.run(session.poll(0.1, 0.2, lambda: updates.append(session.status)))
+        client.close()
+
+    assert session.finished and session.errors == 0
+    assert client.retries > 0
+    assert server.connections == 1
+    # Retries wait backoff_delay() = 0; each payload is polled three times:
+    # fast, then growing, then capped at slow
+    assert [d for d in delays if d] == pytest.approx([0.1, 0.15, 0.2] * len(payloads))
+    assert updates[-1] == "run ended"
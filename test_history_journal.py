@@ -0,0 +1,69 @@
+import json
+
+import pytest
+
+from history_journal import HistoryJournal, compact_journal, iter_records, migrate_json_history, unchanged
+
+
+@pytest.fixture
+def history(request):
+    with open(request.config.rootpath / "game_history.json", "r") as f:
+        return json.load(f)[:300]
+
+
+def _distinct(records):
+    """The records a journal keeps: each one that doesn't repeat the last kept"""
+    kept = []
+    for record in records:
+        if not kept or not unchanged(kept[-1], record):
+            kept.append(record)
+    return kept
+
+
+def test_appended_records_round_trip(tmp_path, history):
+    directory = str(tmp_path / "journal")
+    with HistoryJournal(directory, segment_bytes=4096, flush_every=7, keyframe_every=16) as journal:
+        stored = [journal.append(record) for record in history]
+    kept = _distinct(history)
+    assert stored.count(True) == journal.record_count == len(kept) < len(history)
+    assert list(iter_records(directory)) == kept
+    assert HistoryJournal(directory).record_count == len(kept)
+
+
+def test_reopening_from_a_position_counts_only_later_records(tmp_path, history):
+    directory = str(tmp_path / "journal")
+    with HistoryJournal(directory, segment_bytes=4096) as journal:
+        for record in history[:150]:
+            journal.append(record)
+        journal.flush()
+        position = journal.position()
+        for record in history[150:]:
+            journal.append(record)
+    reopened = HistoryJournal(directory, resume=position)
+    assert reopened.record_count == journal.record_count
+    reopened.close()
+
+
+def test_migration_reports_the_records_written(tmp_path, history):
+    json_path = tmp_path / "game_history.json"
+    json_path.write_text(json.dumps(history))
+    directory = str(tmp_path / "journal")
+    with HistoryJournal(directory) as journal:
+        migrated = migrate_json_history(str(json_path), journal)
+        assert migrated == journal.record_count == len(_distinct(history)) < len(history)
+        # Only ever migrates into an empty journal
+        assert migrate_json_history(str(json_path), journal) == 0
+    assert list(iter_records(directory)) == _distinct(history)
+
+
+def test_compaction_drops_repeats_and_keeps_the_rest(tmp_path, history):
+    directory = str(tmp_path / "journal")
+    with HistoryJournal(directory, segment_bytes=4096, skip_unchanged=False) as journal:
+        for record in history:
+            journal.append(record)
+    read, kept, written = compact_journal(directory)
+    assert read == len(history)
+    assert kept == len(_distinct(history)) < read
+    assert written > 0
+    assert list(iter_records(directory)) == _distinct(history)
+    assert HistoryJournal(directory).record_count == kept
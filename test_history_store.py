@@ -0,0 +1,39 @@
+import json
+
+import numpy as np
+import pytest
+
+from history_store import build_history_store, missing_value
+
+
+def _record(charges, health=10, skills=True):
+    record = {"enemy_id": "run", "enemy_health": 5, "player_health": health, "player_shield": 0,
+              "round_number": 0, "enemy_stats": {"name": "Enemy Room 3"},
+              "player_move_charges": {"Sword": charges, "Shield": 3, "Spell": 3}}
+    if skills:
+        record["player_skills"] = {"sword_atk": 2}
+    return record
+
+
+def test_summary_by_keeps_spent_charges_and_skips_missing_values(tmp_path):
+    records = [_record(-1), _record(2), _record(3, skills=False)]
+    store = build_history_store(records, str(tmp_path))
+    assert store.column("player_charges_sword").tolist() == [-1, 2, 3]
+    assert store.column("player_sword_atk").tolist() == [2, 2, missing_value("i2")]
+
+    summary = store.summary_by("enemy_name", ["player_charges_sword", "player_sword_atk", "player_spell_def"])
+    room = summary["Enemy Room 3"]
+    assert room["rows"] == 3
+    assert room["mean_player_charges_sword"] == pytest.approx(np.mean([-1, 2, 3]))
+    assert room["mean_player_sword_atk"] == 2
+    assert room["mean_player_spell_def"] is None
+
+
+def test_summary_by_matches_the_bundled_history(tmp_path, request):
+    with open(request.config.rootpath / "game_history.json", "r") as f:
+        records = json.load(f)
+    store = build_history_store(records, str(tmp_path))
+    charges = [r["player_move_charges"]["Sword"] for r in records
+               if r.get("enemy_stats") and r["enemy_stats"]["name"] == "Enemy Room 3"]
+    summary = store.summary_by("enemy_name", ["player_charges_sword"])
+    assert summary["Enemy Room 3"]["mean_player_charges_sword"] == pytest.approx(np.mean(charges))
@@ -0,0 +1,89 @@
+import json
+import subprocess
+import sys
+
+import pytest
+
+from gigaverse_calculator import MOVES, FightState
+from move_cache import CACHE_VERSION, MoveCache, state_digest
+
+VALUES = {"Sword": 1.5, "Shield": -0.5, "Spell": float("-inf")}
+
+
+@pytest.fixture
+def fight_state(request):
+    with open(request.config.rootpath / "game_history.json", "r") as f:
+        record = json.load(f)[0]
+    record.update(last_player_move="paper", last_enemy_move="rock")
+    return FightState.from_dict(record)
+
+
+def test_digest_ignores_round_and_timestamp_but_not_last_moves(fight_state):
+    digest = state_digest(fight_state, [0.2, 0.3, 0.5])
+    assert state_digest(fight_state.replace(round_number=7, timestamp=1.0), [0.2, 0.3, 0.5]) == digest
+    assert state_digest(fight_state.replace(last_player_move="rock"), [0.2, 0.3, 0.5]) != digest
+    assert state_digest(fight_state, [0.3, 0.3, 0.4]) != digest
+    assert state_digest(fight_state, [0.2, 0.3, 0.5], mode="search") != digest
+
+
+def test_digest_is_the_same_in_another_process(fight_state, request):
+    # A fresh process interns the move labels in another order
+    script = (
+        "import json\n"
+        "from gigaverse_calculator import FightState, move_code\n"
+        "from move_cache import state_digest\n"
+        "for label in ('scissor', 'rock', 'paper'): move_code(label)\n"
+        "record = json.load(open('game_history.json'))[0]\n"
+        "record.update(last_player_move='paper', last_enemy_move='rock')\n"
+        "print(state_digest(FightState.from_dict(record), [0.2, 0.3, 0.5]))\n"
+    )
+    root = str(request.config.rootpath)
+    output = subprocess.run([sys.executable, "-c", script], cwd=root, capture_output=True, text=True, check=True,
+                            env={"PYTHONPATH": root})
+    assert output.stdout.strip() == state_digest(fight_state, [0.2, 0.3, 0.5])
+
+
+def test_lru_eviction_and_counts():
+    cache = MoveCache(max_entries=2)
+    for digest in "abc":
+        cache.put(digest, VALUES)
+    assert list(cache.entries) == ["b", "c"]
+    assert cache.get("a") is None
+    assert cache.get("b") == VALUES
+    cache.put("d", VALUES)
+    assert list(cache.entries) == ["b", "d"]
+    assert cache.stats()["evictions"] == 2
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_search_depth_must_cover_the_request():
+    cache = MoveCache()
+    cache.put("cut-short", VALUES, depth=4)
+    assert cache.get("cut-short", min_depth=4) == VALUES
+    assert cache.get("cut-short", min_depth=12) is None
+    cache.put("cut-short", {move: 0.0 for move in MOVES}, depth=2)
+    assert cache.get("cut-short", min_depth=4) == VALUES
+    cache.put("solved", VALUES, depth=None)
+    assert cache.get("solved", min_depth=50) == VALUES
+
+
+def test_save_and_load_round_trip(tmp_path):
+    path = str(tmp_path / "move_cache.json")
+    cache = MoveCache()
+    cache.put("one-turn", VALUES)
+    cache.put("search", VALUES, depth=6)
+    cache.save(path)
+    assert not cache.dirty
+
+    loaded = MoveCache.load(path)
+    assert loaded.entries == cache.entries
+    assert loaded.get("search", min_depth=6) == VALUES
+    assert loaded.get("search", min_depth=7) is None
+
+    assert len(MoveCache.load(path, max_entries=1)) == 1
+    with open(path, "r") as f:
+        data = json.load(f)
+    data["version"] = CACHE_VERSION - 1
+    with open(path, "w") as f:
+        json.dump(data, f)
+    assert len(MoveCache.load(path)) == 0
@@ -0,0 +1,17 @@
+from multi_session import load_accounts
+
+
+def test_load_accounts_names_and_padded_tokens(tmp_path):
+    path = tmp_path / "accounts.txt"
+    path.write_text("# accounts\n"
+                    "main=eyJhbGciOi==\n"
+                    "\n"
+                    "eyJzdWIiOiIx==\n"
+                    "../escape=eyJ4\n"
+                    "..=eyJ5\n")
+    assert load_accounts(str(path)) == [
+        ("main", "eyJhbGciOi=="),
+        ("account-2", "eyJzdWIiOiIx=="),
+        ("account-3", "../escape=eyJ4"),
+        ("account-4", "..=eyJ5"),
+    ]
@@ -0,0 +1,56 @@
+import json
+
+import pytest
+import requests
+
+from batch_evaluator import best_moves, evaluate_states
+from gigaverse_calculator import FightState, GigaverseCalculator
+from recommend_service import RecommendationService
+
+
+@pytest.fixture(autouse=True)
+def _repo_dir(monkeypatch, request):
+    monkeypatch.chdir(request.config.rootpath)
+
+
+@pytest.fixture
+def service():
+    calculator = GigaverseCalculator(enemies={"entities": []}, offline=True)
+    with RecommendationService(calculator, port=0) as service:
+        yield service
+
+
+def _records(count: int = 3):
+    with open("game_history.json", "r") as f:
+        return json.load(f)[:count]
+
+
+def _bad_records(record):
+    malformed_pattern = json.loads(json.dumps(record))
+    malformed_pattern["enemy_stats"]["move_pattern"] = ["x"] * 6
+    return [dict(record, player_health="lots"), malformed_pattern, {"player_health": 10}]
+
+
+def test_bad_records_are_reported_without_failing_the_batch(service):
+    good = _records()
+    bad = _bad_records(good[0])
+    # Each bad record comes before a good one, which reuses its row
+    results = service.evaluate([bad[0], good[0], bad[1], good[1], bad[2], good[2]])
+
+    expected = best_moves(evaluate_states(service.calculator, [FightState.from_dict(r) for r in good]))
+    assert results[1::2] == expected
+    assert [r["error"] for r in results[0::2]] == [
+        "invalid literal for int() with base 10: 'lots'",
+        "invalid literal for int() with base 10: 'x'",
+        "missing field 'enemy_health'",
+    ]
+    assert service.states_evaluated == len(good)
+
+
+def test_evaluate_endpoint_answers_a_batch_with_a_bad_record(service):
+    good = _records(1)
+    response = requests.post(f"{service.url}/evaluate", json={"states": good + _bad_records(good[0])[:1]})
+    assert response.status_code == 200
+    first, second = response.json()["results"]
+    assert first["best_move"] in ("Sword", "Shield", "Spell")
+    assert "error" in second
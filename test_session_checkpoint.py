@@ -0,0 +1,82 @@
+import json
+
+import pytest
+
+import gigaverse_calculator
+from enemy_model import EnemyModel
+from gigaverse_calculator import MOVES, GigaverseCalculator
+from history_journal import HistoryJournal
+from session_checkpoint import SessionCheckpoint
+from state_pipeline import StatePipeline
+from stub_server import payload_from_record
+
+
+@pytest.fixture(autouse=True)
+def _repo_dir(monkeypatch, request):
+    monkeypatch.chdir(request.config.rootpath)
+
+
+def _payload(last_player_move: str = "rock", last_enemy_move: str = "paper"):
+    with open("game_history.json", "r") as f:
+        record = json.load(f)[0]
+    record.update(last_player_move=last_player_move, last_enemy_move=last_enemy_move)
+    return payload_from_record(record)
+
+
+def _fresh_move_codes(monkeypatch):
+    """Stand in for a new process, where labels are interned in another order"""
+    names = list(MOVES) + [None, "scissor", "paper", "rock"]
+    monkeypatch.setattr(gigaverse_calculator, "_move_names", names)
+    monkeypatch.setattr(gigaverse_calculator, "_move_codes", {name: code for code, name in enumerate(names)})
+
+
+def _pipeline(journal=None):
+    calculator = GigaverseCalculator(enemies={"entities": []})
+    return StatePipeline(calculator, round_number=journal.record_count if journal else 0)
+
+
+def test_resumed_fight_matches_the_checkpointed_poll(tmp_path, monkeypatch):
+    path = str(tmp_path / "checkpoint.json")
+    payload = _payload()
+    pipeline = _pipeline()
+    snapshot = pipeline.ingest(payload)
+    SessionCheckpoint.capture(pipeline, None, snapshot, EnemyModel()).save(path)
+
+    _fresh_move_codes(monkeypatch)
+    checkpoint = SessionCheckpoint.load(path)
+    resumed = _pipeline()
+    room = checkpoint.resume(resumed, None, EnemyModel())
+    snapshot = resumed.ingest(payload)
+
+    assert room == (snapshot.fight_state.enemy_id, snapshot.fight_state.enemy_stats.name)
+    assert not snapshot.changed
+    assert checkpoint.reconcile(snapshot).endswith("at the checkpointed round")
+    assert resumed.round_number == 1
+
+
+def test_resume_counts_rounds_like_the_journal(tmp_path):
+    journal_dir = str(tmp_path / "journal")
+    path = str(tmp_path / "checkpoint.json")
+    journal = HistoryJournal(journal_dir)
+    pipeline = _pipeline(journal)
+    pipeline.subscribe(lambda s: journal.append(s.fight_state.to_dict()) if s.changed else None)
+    for payload in (_payload("rock"), _payload("rock"), _payload("paper")):
+        snapshot = pipeline.ingest(payload)
+    SessionCheckpoint.capture(pipeline, journal, snapshot, EnemyModel()).save(path)
+    # Written after the checkpoint, e.g. by a session that died before the next one
+    journal.append(pipeline.ingest(_payload("scissor")).fight_state.to_dict())
+    journal.close()
+    assert pipeline.round_number == 3
+
+    checkpoint = SessionCheckpoint.load(path)
+    journal = HistoryJournal(journal_dir, resume=checkpoint.journal)
+    resumed = _pipeline(journal)
+    checkpoint.resume(resumed, journal, EnemyModel())
+    journal.close()
+    assert resumed.round_number == journal.record_count == 3
+
+
+def test_checkpoint_from_another_version_is_ignored(tmp_path):
+    path = tmp_path / "checkpoint.json"
+    path.write_text(json.dumps({"version": 1, "round_number": 5}))
+    assert SessionCheckpoint.load(str(path)) is None
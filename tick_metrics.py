@@ -0,0 +1,196 @@
+import os
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional, Tuple
+
+QUANTILES = (0.5, 0.95, 0.99)
+PREFIX = "gigaverse"
+
+
+class RollingHistogram:
+    """
+    Durations of the last `window` observations, for rolling quantiles.
+
+    count and total cover every observation since start, as Prometheus
+    summaries expect.
+    """
+
+    def __init__(self, window: int = 1024):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, seconds: float):
+        self.samples.append(seconds)
+        self.count += 1
+        self.total += seconds
+
+    def quantiles(self, quantiles=QUANTILES) -> Dict[float, float]:
+        ordered = sorted(self.samples)
+        if not ordered:
+            return {q: 0.0 for q in quantiles}
+        return {q: ordered[min(len(ordered) - 1, int(q * len(ordered)))] for q in quantiles}
+
+
+class _Stage:
+    """Times one stage; an exception escaping it counts as an error for the stage"""
+    __slots__ = ("metrics", "name", "started")
+
+    def __init__(self, metrics: "TickMetrics", name: str):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.metrics.observe(self.name, time.perf_counter() - self.started)
+        if exc_type is not None:
+            self.metrics.count("errors", self.name)
+        return False
+
+
+class _NullStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class TickMetrics:
+    """
+    Per-stage timings and counters for the polling loop.
+
+    Wrap each stage of a tick in `with metrics.stage("http"):` to keep a
+    rolling histogram of its duration; an exception leaving the block also
+    bumps that stage's error counter. External counters (e.g. the HTTP
+    client's retries) are read at export time via track().
+
+    A disabled instance hands out one shared no-op context manager and
+    records nothing, so the instrumentation can stay in place for free.
+    Metrics are exported in Prometheus text format by render(), from a
+    local /metrics endpoint (serve()) and to a snapshot file (write_snapshot()).
+    """
+
+    def __init__(self, enabled: bool = True, window: int = 1024):
+        self.enabled = enabled
+        self.window = window
+        self.histograms: Dict[str, RollingHistogram] = {}
+        self.counters: Dict[Tuple[str, str], float] = {}
+        self.tracked: List[Tuple[str, str, Callable[[], float]]] = []
+        self.lock = threading.Lock()
+        self.server = None
+        self.snapshot_path: Optional[str] = None
+        self.snapshot_interval = 15.0
+        self.last_snapshot = 0.0
+
+    def stage(self, name: str):
+        """Context manager timing one stage"""
+        if not self.enabled:
+            return _NULL_STAGE
+        return _Stage(self, name)
+
+    def observe(self, name: str, seconds: float):
+        if not self.enabled:
+            return
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = RollingHistogram(self.window)
+            histogram.observe(seconds)
+
+    def count(self, counter: str, stage: str = "", amount: float = 1):
+        """Add to a counter such as "errors", optionally per stage"""
+        if not self.enabled:
+            return
+        with self.lock:
+            key = (counter, stage)
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def track(self, name: str, description: str, getter: Callable[[], float]):
+        """Export getter()'s value as the counter gigaverse_<name>_total"""
+        self.tracked.append((name, description, getter))
+
+    def render(self) -> str:
+        """Everything recorded, in Prometheus text exposition format"""
+        lines = []
+        with self.lock:
+            histograms = {name: (h.quantiles(), h.count, h.total) for name, h in self.histograms.items()}
+            counters = dict(self.counters)
+        lines.append(f"# HELP {PREFIX}_stage_seconds Duration of each stage of a poll, over a rolling window")
+        lines.append(f"# TYPE {PREFIX}_stage_seconds summary")
+        for name, (quantiles, count, total) in sorted(histograms.items()):
+            for q, value in quantiles.items():
+                lines.append(f'{PREFIX}_stage_seconds{{stage="{name}",quantile="{q}"}} {value:.9f}')
+            lines.append(f'{PREFIX}_stage_seconds_sum{{stage="{name}"}} {total:.9f}')
+            lines.append(f'{PREFIX}_stage_seconds_count{{stage="{name}"}} {count}')
+        for counter in sorted({counter for counter, _ in counters}):
+            lines.append(f"# TYPE {PREFIX}_{counter}_total counter")
+            for (name, stage), value in sorted(counters.items()):
+                if name != counter:
+                    continue
+                labels = f'{{stage="{stage}"}}' if stage else ""
+                lines.append(f"{PREFIX}_{counter}_total{labels} {value:g}")
+        for name, description, getter in self.tracked:
+            lines.append(f"# HELP {PREFIX}_{name}_total {description}")
+            lines.append(f"# TYPE {PREFIX}_{name}_total counter")
+            lines.append(f"{PREFIX}_{name}_total {getter():g}")
+        return "\n".join(lines) + "\n"
+
+    def write_snapshot(self, path: Optional[str] = None):
+        """Write render() atomically, e.g. for node_exporter's textfile collector"""
+        path = path or self.snapshot_path
+        if not path:
+            return
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w") as f:
+            f.write(self.render())
+        os.replace(temp_path, path)
+        self.last_snapshot = time.monotonic()
+
+    def maybe_write_snapshot(self):
+        """write_snapshot() once snapshot_interval seconds have passed since the last one"""
+        if self.snapshot_path and time.monotonic() - self.last_snapshot >= self.snapshot_interval:
+            self.write_snapshot()
+
+    def serve(self, port: int, host: str = "127.0.0.1"):
+        """Serve render() at http://host:port/metrics from a background thread"""
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                data = metrics.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self.server
+
+    def close(self):
+        """Stop the endpoint and write a final snapshot"""
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+        self.write_snapshot()